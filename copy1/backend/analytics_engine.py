@@ -0,0 +1,151 @@
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+try:
+    import duckdb
+    DUCKDB_AVAILABLE = True
+except ImportError:
+    duckdb = None
+    DUCKDB_AVAILABLE = False
+
+# Columns copied into the snapshot. Only what the analytics queries need is
+# copied (no password hashes, no question text).
+SNAPSHOT_TABLES = {
+    'subject': ("SELECT id, name FROM subject", []),
+    'chapters': ("SELECT id, subject_id FROM chapters", []),
+    'quizzes': ("SELECT id, chapter_id, quiz_name FROM quizzes", []),
+    'performance': ("SELECT id, RegistrationUser_id, Quizzes_id, score FROM performance", []),
+}
+
+# Named analytics queries in DuckDB SQL. Each returns the same column names as
+# the SQLAlchemy query it replaces, so endpoints format both the same way.
+ANALYTICS_QUERIES = {
+    'subject_performance': """
+        SELECT s.id, s.name,
+               count(DISTINCT q.id) AS quizzes,
+               avg(p.score) AS average_score
+        FROM subject s
+        JOIN chapters c ON c.subject_id = s.id
+        JOIN quizzes q ON q.chapter_id = c.id
+        LEFT JOIN performance p ON p.Quizzes_id = q.id
+        WHERE EXISTS (SELECT 1 FROM performance)
+        GROUP BY s.id, s.name
+        ORDER BY average_score DESC NULLS LAST
+    """,
+    'subject_popularity': """
+        SELECT s.id, s.name,
+               count(DISTINCT q.id) AS quiz_count,
+               count(DISTINCT p.RegistrationUser_id) AS user_count
+        FROM subject s
+        JOIN chapters c ON c.subject_id = s.id
+        JOIN quizzes q ON q.chapter_id = c.id
+        JOIN performance p ON p.Quizzes_id = q.id
+        GROUP BY s.id, s.name
+        ORDER BY user_count DESC
+    """,
+}
+
+
+class DuckDBAnalytics:
+    """
+    In-process DuckDB copy of the SQLite data for the admin analytics queries.
+
+    The snapshot is read from SQLite in a single read transaction (so it is
+    consistent), loaded into an in-memory DuckDB database and swapped in
+    whole. Once it is older than `max_age` seconds the next query starts a
+    rebuild in a background thread and keeps answering from the old copy, so
+    requests never wait on it after the first build. fetch() returns None
+    whenever DuckDB is not installed or a snapshot cannot be built, and the
+    caller then runs its regular SQLAlchemy query.
+    """
+
+    def __init__(self, max_age=60):
+        self.max_age = max_age
+        self.database_path = None
+        self._connection = None
+        self._built_at = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._failed = False
+
+    @property
+    def available(self):
+        return duckdb is not None and self.database_path is not None and not self._failed
+
+    def configure(self, database_path, max_age=None):
+        self.database_path = database_path
+        if max_age is not None:
+            self.max_age = max_age
+
+    @property
+    def age(self):
+        return time.monotonic() - self._built_at if self._connection is not None else None
+
+    def refresh(self):
+        """Build a new snapshot and swap it in; returns the number of attempts loaded"""
+        source = sqlite3.connect(f"file:{self.database_path}?mode=ro", uri=True)
+        try:
+            source.execute("BEGIN")
+            frames = {
+                table: pd.read_sql_query(sql, source, parse_dates=parse_dates)
+                for table, (sql, parse_dates) in SNAPSHOT_TABLES.items()
+            }
+        finally:
+            source.close()
+
+        connection = duckdb.connect(':memory:')
+        for table, frame in frames.items():
+            connection.register('frame', frame)
+            connection.execute(f"CREATE TABLE {table} AS SELECT * FROM frame")
+            connection.unregister('frame')
+
+        # Readers still holding a cursor on the old snapshot keep it alive
+        self._connection = connection
+        self._built_at = time.monotonic()
+        return len(frames['performance'])
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Analytics snapshot refresh failed: {e}")
+        finally:
+            self._refreshing = False
+
+    def _snapshot(self):
+        if self._connection is None:
+            with self._lock:
+                if self._connection is None:
+                    try:
+                        self.refresh()
+                    except Exception as e:
+                        # Stay on SQLAlchemy for the rest of this process
+                        print(f"WARNING: DuckDB analytics disabled, snapshot build failed: {e}")
+                        self._failed = True
+                        return None
+        elif self.age > self.max_age and not self._refreshing:
+            with self._lock:
+                if not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._refresh_in_background, name='analytics-snapshot', daemon=True).start()
+        return self._connection
+
+    def fetch(self, name, params=()):
+        """Run a named query against the snapshot; returns row tuples with named fields, or None"""
+        if not self.available:
+            return None
+        connection = self._snapshot()
+        if connection is None:
+            return None
+        # A cursor is DuckDB's per-thread handle on the shared database
+        cursor = connection.cursor()
+        try:
+            cursor.execute(ANALYTICS_QUERIES[name], list(params))
+            Row = namedtuple(name, [column[0] for column in cursor.description])
+            return [Row(*row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
@@ -1,6 +1,6 @@
 # Import guard - try imports one by one with helpful error messages
 try:
-    from flask import Flask, request, jsonify
+    from flask import Flask, request, jsonify, has_app_context
     print("Successfully imported Flask")
 except ImportError as e:
     print(f"ERROR importing Flask: {e}")
@@ -33,30 +33,50 @@ except ImportError as e:
     celery = None
 
 # Continue with your other imports...
+from caching import LRUCache
+from group_commit import GroupCommitWriter, WriterBusy
+from db_engine import configure_sqlite, retry_on_locked, ReadOnlySessions
+from analytics_engine import DuckDBAnalytics, DUCKDB_AVAILABLE
+from leaderboard import Leaderboards, SCOPES as LEADERBOARD_SCOPES
+from report_data import load_report_frame, load_period_frame, add_percentiles, summarize_report_frame, user_reports
+from report_charts import ReportCharts
+from report_html import build_report_html
+from pdf_renderer import PdfRenderer, RendererBusy, render_report
+from mail_transport import SmtpPool, is_transient
+from outbox import OutboxDrainer
+from rate_limit import RateLimiter
+from migrations import MigrationRunner, StatementRecorder, explain_query_plan, full_table_scans, has_foreign_key, rebuild_table
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_cors import CORS
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required
 from flask_security import RoleMixin
-from sqlalchemy import or_
+from sqlalchemy import or_, event, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import re
+import calendar
 from flask_mail import Mail, Message
 from io import BytesIO
 import pandas as pd
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
-import base64
-from weasyprint import HTML
-import tempfile
+import threading
+import atexit
+import gzip
+import hashlib
+import json
+import uuid
+import time
+from types import MappingProxyType
+from bisect import bisect_left, insort
+from concurrent.futures import TimeoutError as FutureTimeout, FIRST_COMPLETED, wait as wait_futures
+from contextlib import nullcontext
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///quiz2.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = '7ce2afd1bf4a1e4eecbfbdf'
 
-CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True, allow_headers=["Content-Type", "Authorization"])
+CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True, allow_headers=["Content-Type", "Authorization", "If-None-Match"], expose_headers=["X-Next-Cursor", "ETag"])
 
 # Configure JWT settings
 app.config['JWT_SECRET_KEY'] = app.config['SECRET_KEY']
@@ -77,6 +97,63 @@ app.config['MAIL_DEFAULT_SENDER'] = ('Quiz Master', 'your-email@example.com')
 app.config['EMAIL_NOTIFICATIONS_ENABLED'] = True  # Can be toggled in production
 app.config['MONTHLY_REPORTS_ENABLED'] = True      # Can be toggled in production
 
+# Score histogram kept in the quiz_stats rollup: QUIZ_STATS_BINS bins of
+# QUIZ_STATS_BIN_WIDTH points each, higher scores fall into the last bin
+app.config['QUIZ_STATS_BINS'] = 10
+app.config['QUIZ_STATS_BIN_WIDTH'] = 10
+
+# Seconds a quiz's in-memory percentile array may go without checking the
+# database for attempts committed by other processes
+app.config['PERCENTILE_SYNC_SECONDS'] = 5
+
+# In-process Subject -> Chapter -> Quiz snapshot used by the browse endpoints.
+# It is rebuilt when the persisted 'catalog' content version changes; the TTL
+# bounds staleness for changes made outside the app, and catalogues larger
+# than the entry limit are not cached at all.
+app.config['CATALOG_CACHE_TTL'] = 300
+app.config['CATALOG_CACHE_MAX_ENTRIES'] = 50000
+
+# Number of quizzes whose gzip-compressed question payload is kept in memory
+app.config['QUESTION_PAYLOAD_CACHE_SIZE'] = 256
+
+# Rendered report charts (base64 PNGs) kept in memory, keyed by a hash of the plotted data
+app.config['REPORT_CHART_CACHE_SIZE'] = 256
+app.config['REPORT_CHART_CACHE_BYTES'] = 32 * 1024 * 1024
+
+# Report PDFs are rendered by a pool of worker processes (0 renders in the
+# calling thread). Renders beyond PDF_RENDER_MAX_PENDING are refused with a 503.
+app.config['PDF_RENDER_PROCESSES'] = 2
+app.config['PDF_RENDER_MAX_PENDING'] = 16
+app.config['PDF_RENDER_TIMEOUT'] = 120
+
+# Memory for generated reports (HTML + PDF) reused by download and email
+app.config['REPORT_STORE_MAX_BYTES'] = 64 * 1024 * 1024
+
+# Users with a report per shard of the monthly report run (one Celery task each)
+app.config['MONTHLY_REPORT_SHARD_SIZE'] = 2000
+
+# Notification emails are queued in notification_outbox (one row per
+# recipient) and sent by delivery workers in batches of
+# NOTIFICATION_BATCH_SIZE. A failed row is retried after
+# NOTIFICATION_RETRY_DELAY seconds times its attempt count, up to
+# NOTIFICATION_MAX_ATTEMPTS. Rows claimed by a worker that has not finished
+# within NOTIFICATION_CLAIM_TIMEOUT seconds are claimed again. Without Celery
+# a background thread drains the outbox, at least every
+# NOTIFICATION_POLL_INTERVAL seconds.
+app.config['NOTIFICATION_BATCH_SIZE'] = 100
+app.config['NOTIFICATION_MAX_ATTEMPTS'] = 5
+app.config['NOTIFICATION_RETRY_DELAY'] = 60
+app.config['NOTIFICATION_CLAIM_TIMEOUT'] = 600
+app.config['NOTIFICATION_POLL_INTERVAL'] = 30
+
+# Quiz submissions are queued and committed in groups by one writer thread.
+# A request is acknowledged only after its attempt row is committed.
+app.config['SUBMIT_GROUP_COMMIT'] = True
+app.config['SUBMIT_BATCH_WINDOW_MS'] = 5
+app.config['SUBMIT_MAX_BATCH'] = 200
+app.config['SUBMIT_QUEUE_SIZE'] = 2000
+app.config['SUBMIT_ACK_TIMEOUT'] = 10
+
 # Update the Flask-Mail configuration with the correct credentials
 app.config['MAIL_SERVER'] = 'smtp.gmail.com'
 app.config['MAIL_PORT'] = 587
@@ -87,9 +164,93 @@ app.config['MAIL_PASSWORD'] = 'qgweuohlttivtoyj'  # Using the provided app passw
 app.config['MAIL_DEFAULT_SENDER'] = ('Quiz Master', '23f3001886@ds.study.iitm.ac.in')  # Replace with your actual Gmail address
 app.config['MAIL_DEBUG'] = True  # Set to False in production
 
+# Outbound mail reuses a few open SMTP connections per process instead of
+# connecting and logging in for every message (mail_transport.SmtpPool).
+# Idle connections older than MAIL_POOL_MAX_IDLE seconds are not reused.
+app.config['MAIL_POOL_SIZE'] = 2
+app.config['MAIL_POOL_MAX_IDLE'] = 60
+app.config['MAIL_SEND_RETRIES'] = 3
+app.config['MAIL_RETRY_DELAY'] = 1.0
+
+# Outbound mail is paced by a token bucket in recipients per second, with
+# bursts of MAIL_RATE_BURST. 'redis' shares one bucket between all workers,
+# 'memory' gives each process its own, 'auto' uses Redis when it is reachable
+# at startup. A 4xx reply cuts the rate by 30% (down to MAIL_RATE_MIN) and
+# successful sends gradually win it back.
+app.config['MAIL_RATE_LIMIT_BACKEND'] = 'auto'
+app.config['MAIL_RATE_LIMIT_REDIS_URL'] = 'redis://localhost:6379/2'
+app.config['MAIL_RATE_PER_SECOND'] = 10
+app.config['MAIL_RATE_BURST'] = 20
+app.config['MAIL_RATE_MIN'] = 0.5
+
 mail = Mail(app)
+mail_rate_limiter = RateLimiter(
+    max_rate=app.config['MAIL_RATE_PER_SECOND'],
+    burst=app.config['MAIL_RATE_BURST'],
+    min_rate=app.config['MAIL_RATE_MIN']
+)
+print(f"Mail rate limit backend: {mail_rate_limiter.configure(app.config['MAIL_RATE_LIMIT_BACKEND'], app.config['MAIL_RATE_LIMIT_REDIS_URL'])}")
+mail_pool = SmtpPool(
+    mail,
+    size=app.config['MAIL_POOL_SIZE'],
+    max_idle=app.config['MAIL_POOL_MAX_IDLE'],
+    retries=app.config['MAIL_SEND_RETRIES'],
+    retry_delay=app.config['MAIL_RETRY_DELAY'],
+    limiter=mail_rate_limiter
+)
+atexit.register(mail_pool.close)
+
+# SQLite tuning: WAL journal, synchronous/cache_size/mmap_size pragmas and a
+# busy timeout on every connection, plus a separate read-only pool for the
+# admin analytics endpoints. See db_engine.SQLITE_DEFAULTS for the settings.
+app.config['SQLITE_TUNING_ENABLED'] = True
+app.config['SQLITE_READ_POOL_SIZE'] = 4
+configure_sqlite(app)
+
+# Admin analytics run on an in-process DuckDB snapshot of the database when
+# duckdb is installed ('sqlalchemy' turns it off). The snapshot is rebuilt in
+# the background once it is older than ANALYTICS_SNAPSHOT_MAX_AGE seconds.
+app.config['ANALYTICS_ENGINE'] = 'duckdb'
+app.config['ANALYTICS_SNAPSHOT_MAX_AGE'] = 60
+
+# Quiz/chapter/subject/global leaderboards: 'redis' keeps them in sorted sets
+# shared by all workers, 'memory' in per-process skiplists, 'auto' uses Redis
+# when it is reachable at startup. Per-process boards replay other processes'
+# attempts at most every LEADERBOARD_SYNC_SECONDS and are rebuilt every
+# LEADERBOARD_MAX_AGE seconds.
+app.config['LEADERBOARD_BACKEND'] = 'auto'
+app.config['LEADERBOARD_SYNC_SECONDS'] = 5
+app.config['LEADERBOARD_MAX_AGE'] = 300
+app.config['LEADERBOARD_REDIS_URL'] = 'redis://localhost:6379/1'
+app.config['LEADERBOARD_PAGE_SIZE'] = 20
+app.config['LEADERBOARD_MAX_PAGE_SIZE'] = 100
 
 db = SQLAlchemy(app)
+analytics_reads = ReadOnlySessions(db)
+app.teardown_appcontext(analytics_reads.remove)
+
+def analytics_session():
+    """Session for the /api/admin analytics reads (read-only pool when available)"""
+    return analytics_reads.session(app)
+
+analytics_engine = DuckDBAnalytics(max_age=app.config['ANALYTICS_SNAPSHOT_MAX_AGE'])
+if app.config['ANALYTICS_ENGINE'] == 'duckdb' and not DUCKDB_AVAILABLE:
+    print("WARNING: duckdb is not installed, admin analytics will query SQLite directly")
+
+def analytics_fetch(name, params=()):
+    """Run a named query on the DuckDB snapshot; None means use the SQLAlchemy query instead"""
+    if app.config['ANALYTICS_ENGINE'] != 'duckdb' or not DUCKDB_AVAILABLE:
+        return None
+    try:
+        if analytics_engine.database_path is None:
+            engine = db.get_engine(app)
+            if engine.dialect.name != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+                return None
+            analytics_engine.configure(engine.url.database)
+        return analytics_engine.fetch(name, params)
+    except Exception as e:
+        print(f"DuckDB analytics query {name} failed, using SQLAlchemy: {str(e)}")
+        return None
 login_manager = LoginManager()
 login_manager.init_app(app)
 jwt = JWTManager(app)
@@ -129,14 +290,14 @@ class Subject(db.Model):
 
 class Chapters(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False, index=True)
     chapter_name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.String(500), nullable=False)
     quizzes = db.relationship('Quizzes', backref='chapter', lazy=True)
 
 class Quizzes(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    chapter_id = db.Column(db.Integer, db.ForeignKey('chapters.id'), nullable=False)
+    chapter_id = db.Column(db.Integer, db.ForeignKey('chapters.id'), nullable=False, index=True)
     quiz_name = db.Column(db.String(100), nullable=False)
     date_of_quiz = db.Column(db.Date, nullable=False)
     timing = db.Column(db.Integer, nullable=False)
@@ -145,7 +306,7 @@ class Quizzes(db.Model):
 
 class Questions(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id'), nullable=False, index=True)
     question_statement = db.Column(db.String(500), nullable=False)
     option1 = db.Column(db.String(100), nullable=False)
     option2 = db.Column(db.String(100), nullable=False)
@@ -154,6 +315,8 @@ class Questions(db.Model):
     correct_option=db.Column(db.String(100),nullable=False)
     marks = db.Column(db.Integer, nullable=False)
 
+# Read-only compatibility view over Performance (see ensure_attempt_schema);
+# attempts are only ever written as Performance rows
 class Scores(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id'), nullable=False)
@@ -163,9 +326,16 @@ class Scores(db.Model):
     
 # new database 
 class Performance(db.Model):
+    # Per-quiz score reads, per-user history and date-range analytics; these
+    # also serve the Scores view. Existing databases get them from migration 5.
+    __table_args__ = (
+        db.Index('ix_performance_quiz_score', 'Quizzes_id', 'score'),
+        db.Index('ix_performance_user_attempted', 'RegistrationUser_id', 'attempted_at'),
+        db.Index('ix_performance_attempted_at', 'attempted_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     RegistrationUser_id = db.Column(db.Integer, db.ForeignKey('registration_user.id'), nullable=False)
-    Quizzes_id = db.Column(db.Integer, nullable=False)  # Should be `quiz_id` for consistency
+    Quizzes_id = db.Column(db.Integer, db.ForeignKey('quizzes.id'), nullable=False)  # Should be `quiz_id` for consistency
     score = db.Column(db.Float, nullable=False)
     attempted_at = db.Column(db.DateTime, nullable=False)
 
@@ -175,7 +345,304 @@ class Performance(db.Model):
     def __repr__(self):
         return f'<Performance {self.user.username} - Quiz {self.Quizzes_id} - Score {self.score}>'
 
+# Per-quiz rollup of attempts, maintained by submit_quiz in the same transaction
+class QuizStats(db.Model):
+    __tablename__ = 'quiz_stats'
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id'), primary_key=True)
+    attempt_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+    score_sum_sq = db.Column(db.Float, nullable=False, default=0)
+    min_score = db.Column(db.Float)
+    max_score = db.Column(db.Float)
+    last_attempt_at = db.Column(db.DateTime)
+    bins = db.relationship('QuizScoreBin', backref='quiz_stats', lazy=True,
+                           order_by='QuizScoreBin.bin_index')
+
+    @property
+    def average_score(self):
+        return self.score_sum / self.attempt_count if self.attempt_count else 0
+
+    @property
+    def score_stddev(self):
+        if not self.attempt_count:
+            return 0
+        variance = self.score_sum_sq / self.attempt_count - self.average_score ** 2
+        return max(variance, 0) ** 0.5
+
+    def histogram(self):
+        counts = [0] * app.config['QUIZ_STATS_BINS']
+        for score_bin in self.bins:
+            counts[score_bin.bin_index] = score_bin.attempts
+        return counts
+
+# Fixed-width score histogram bins belonging to a QuizStats row
+class QuizScoreBin(db.Model):
+    __tablename__ = 'quiz_score_bin'
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz_stats.quiz_id'), primary_key=True)
+    bin_index = db.Column(db.Integer, primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+# Attempt totals per day, ISO week (Monday start) and month, maintained on submit
+# so the timeline endpoints read one row per period instead of raw attempts
+class ActivityRollup(db.Model):
+    __tablename__ = 'activity_rollup'
+    granularity = db.Column(db.String(5), primary_key=True)  # 'day', 'week' or 'month'
+    period_start = db.Column(db.Date, primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    active_users = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+    score_count = db.Column(db.Integer, nullable=False, default=0)
+
+# Per-user attempt summary, maintained on submit and checked by repair_user_stats()
+class UserStats(db.Model):
+    __tablename__ = 'user_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('registration_user.id'), primary_key=True)
+    attempt_count = db.Column(db.Integer, nullable=False, default=0, index=True)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+    max_score = db.Column(db.Float)
+    total_timing = db.Column(db.Integer, nullable=False, default=0)  # minutes, summed over attempts
+    last_active_at = db.Column(db.DateTime)
+
+    @property
+    def average_score(self):
+        return self.score_sum / self.attempt_count if self.attempt_count else 0
+
+# Monthly report emails already sent, one row per user and month (YYYY-MM).
+# Written right after each send, so re-runs of the monthly job skip them.
+class ReportDelivery(db.Model):
+    __tablename__ = 'report_delivery'
+    period = db.Column(db.String(7), primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    sent_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+# A notification email for many users: its subject and body are stored once,
+# the recipients are its notification_outbox rows. A quiz has at most one
+# 'new_quiz' message.
+class NotificationMessage(db.Model):
+    __tablename__ = 'notification_message'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'new_quiz' or 'bulk'
+    ref_id = db.Column(db.Integer)  # the quiz of a 'new_quiz' message
+    subject = db.Column(db.String(200), nullable=False)
+    html = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'ref_id', name='uq_notification_message_kind_ref'),
+    )
+
+# One row per message and recipient; status goes pending -> sending -> sent,
+# or back to pending for a retry, or failed after the last attempt
+class NotificationOutbox(db.Model):
+    __tablename__ = 'notification_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    message_id = db.Column(db.Integer, db.ForeignKey('notification_message.id'), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    email = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_id = db.Column(db.String(36))
+    claimed_at = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    __table_args__ = (
+        db.UniqueConstraint('message_id', 'user_id', name='uq_notification_outbox_message_user'),
+        db.Index('ix_notification_outbox_due', 'status', 'next_attempt_at'),
+        db.Index('ix_notification_outbox_claim', 'claim_id'),
+    )
+
+# Users already counted in an open period's active_users; rows of closed
+# periods are pruned by compact_activity_rollups()
+class ActivityRollupUser(db.Model):
+    __tablename__ = 'activity_rollup_user'
+    granularity = db.Column(db.String(5), primary_key=True)
+    period_start = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+
+class CatalogSnapshot:
+    """Immutable view of the whole Subject -> Chapter -> Quiz hierarchy.
+
+    Payload dicts are shaped exactly as the browse endpoints return them and
+    must be treated as read-only; the lookup maps are read-only proxies.
+    """
+
+    def __init__(self, version, subjects, chapters, quizzes):
+        self.version = version  # the 'catalog' content version it was built at
+        self.subjects = tuple({
+            'id': s.id,
+            'name': s.name,
+            'description': s.description
+        } for s in subjects)
+        self.subjects_by_id = MappingProxyType({s['id']: s for s in self.subjects})
+        
+        self.chapters_by_id = MappingProxyType({c.id: {
+            'id': c.id,
+            'chapter_name': c.chapter_name,
+            'description': c.description,
+            'subject_id': c.subject_id
+        } for c in chapters})
+        
+        self.quizzes_by_id = MappingProxyType({q.id: {
+            'id': q.id,
+            'quiz_name': q.quiz_name,
+            'date_of_quiz': str(q.date_of_quiz),
+            'timing': q.timing,
+            'chapter_id': q.chapter_id
+        } for q in quizzes})
+        
+        chapters_by_subject = {}
+        for chapter in self.chapters_by_id.values():
+            chapters_by_subject.setdefault(chapter['subject_id'], []).append(chapter)
+        self.chapters_by_subject = MappingProxyType({k: tuple(v) for k, v in chapters_by_subject.items()})
+        
+        quizzes_by_chapter = {}
+        for quiz in self.quizzes_by_id.values():
+            quizzes_by_chapter.setdefault(quiz['chapter_id'], []).append(quiz)
+        self.quizzes_by_chapter = MappingProxyType({k: tuple(v) for k, v in quizzes_by_chapter.items()})
+        
+        # Same content, same digest, whichever worker built the snapshot
+        self.digest = hashlib.sha1(json.dumps(
+            [self.subjects, list(self.chapters_by_id.values()), list(self.quizzes_by_id.values())],
+            sort_keys=True
+        ).encode()).hexdigest()[:16]
+
+class CatalogCache:
+    """Holds the current CatalogSnapshot.
+
+    Admin write routes bump the persisted 'catalog' content version in their
+    transaction and call invalidate(). get() reads that version (one primary
+    key lookup) and rebuilds when it moved, so writes from other workers are
+    seen at once; the TTL only picks up changes made outside the app.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._oversized = False
+        self._built_at = 0
+        self._version = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self._version
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._oversized = False
+            self._built_at = 0
+
+    def _fresh(self, version):
+        return self._version == version and time.monotonic() - self._built_at < app.config['CATALOG_CACHE_TTL']
+
+    def get(self):
+        """Return the current snapshot, rebuilding it if needed; None if too large to cache"""
+        version = get_content_version(CATALOG_VERSION_KEY)
+        if self._fresh(version) and (self._snapshot is not None or self._oversized):
+            return self._snapshot
+        
+        with self._lock:
+            if self._fresh(version) and (self._snapshot is not None or self._oversized):
+                return self._snapshot
+            
+            # Check the size first so an oversized catalogue is never loaded
+            entries = Subject.query.count() + Chapters.query.count() + Quizzes.query.count()
+            self._oversized = entries > app.config['CATALOG_CACHE_MAX_ENTRIES']
+            self._snapshot = None if self._oversized else CatalogSnapshot(
+                version,
+                Subject.query.order_by(Subject.id).all(),
+                Chapters.query.order_by(Chapters.id).all(),
+                Quizzes.query.order_by(Quizzes.id).all()
+            )
+            self._version = version
+            self._built_at = time.monotonic()
+            return self._snapshot
+
+catalog_cache = CatalogCache()
+
+# Shared, persisted version counters for content that is cached or validated
+# with ETags across worker processes (e.g. 'quiz:<id>:questions')
+class ContentVersion(db.Model):
+    __tablename__ = 'content_version'
+    key = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+def bump_content_version(key):
+    """Increment a content version inside the caller's transaction"""
+    table = ContentVersion.__table__
+    stmt = sqlite_insert(table).values(key=key, version=1)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.key],
+        set_={'version': table.c.version + 1}
+    ))
+
+def get_content_version(key):
+    version = db.session.query(ContentVersion.version).filter_by(key=key).scalar()
+    return version or 0
+
+def questions_version_key(quiz_id):
+    return f'quiz:{quiz_id}:questions'
+
+CATALOG_VERSION_KEY = 'catalog'
+
+def catalog_etag(snapshot):
+    """Tag of the catalogue content; equal across workers and TTL rebuilds while nothing changes"""
+    if snapshot is not None:
+        return f'catalog-{snapshot.digest}'
+    # Too large to snapshot: fall back to the persisted version
+    return f'catalog-v{get_content_version(CATALOG_VERSION_KEY)}'
+
+def client_has_etag(etag):
+    return request.if_none_match.contains(etag)
+
+def client_accepts_gzip():
+    return 'gzip' in request.accept_encodings
+
+def representation_etag(etag):
+    """gzip and identity bodies are different representations, so tag them apart"""
+    return f'{etag}-gzip' if client_accepts_gzip() else etag
+
+def with_cache_headers(response, etag):
+    """Attach a strong ETag; clients may store the body but must revalidate"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def not_modified(etag):
+    """Empty 304 response; nothing is queried or serialized"""
+    return with_cache_headers(app.response_class(status=304), etag)
 
+class CompressedPayload:
+    """A JSON document serialized once and stored gzip-compressed"""
+
+    def __init__(self, version, payload):
+        self.version = version
+        self.body = gzip.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'), mtime=0)
+
+    def __len__(self):
+        return len(self.body)
+
+def compressed_json_response(entry, etag):
+    """Send the cached bytes as-is to gzip clients, inflate them for the rest"""
+    if client_accepts_gzip():
+        response = app.response_class(entry.body, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = app.response_class(gzip.decompress(entry.body), mimetype='application/json')
+    response.headers['Vary'] = 'Accept-Encoding'
+    return with_cache_headers(response, etag)
+
+question_payload_cache = LRUCache(max_entries=app.config['QUESTION_PAYLOAD_CACHE_SIZE'])
+quiz_bundle_cache = LRUCache(max_entries=app.config['QUESTION_PAYLOAD_CACHE_SIZE'])
+report_charts = ReportCharts(
+    max_entries=app.config['REPORT_CHART_CACHE_SIZE'],
+    max_bytes=app.config['REPORT_CHART_CACHE_BYTES']
+)
+pdf_renderer = PdfRenderer(
+    processes=app.config['PDF_RENDER_PROCESSES'],
+    max_pending=app.config['PDF_RENDER_MAX_PENDING']
+)
+atexit.register(pdf_renderer.stop)
 
 @app.route('/api/register', methods=['POST'])
 def register_user():
@@ -313,7 +780,9 @@ def update_subject(subject_id):
         subject.name = data.get('name', subject.name)
         subject.description = data.get('description', subject.description)
         
+        bump_content_version(CATALOG_VERSION_KEY)
         db.session.commit()
+        catalog_cache.invalidate()
         
         return jsonify({
             'message': 'Subject updated successfully',
@@ -356,7 +825,9 @@ def add_subject_from_admin():
         # Add the new subject to the database
         new_subject = Subject(name=name, description=description)
         db.session.add(new_subject)
+        bump_content_version(CATALOG_VERSION_KEY)
         db.session.commit()
+        catalog_cache.invalidate()
         print(f"Subject created with ID: {new_subject.id}")
         
         return jsonify({'message': 'Subject added successfully', 'subject': {
@@ -455,6 +926,24 @@ def get_subject_chapters(subject_id):
         auth_header = request.headers.get('Authorization')
         print(f"Auth header: {auth_header}")
         
+        snapshot = catalog_cache.get()
+        etag = catalog_etag(snapshot)
+        if client_has_etag(etag):
+            return not_modified(etag)
+        
+        if snapshot is not None:
+            # Served from the in-memory catalogue, no database round trip
+            subject = snapshot.subjects_by_id.get(subject_id)
+            if subject is None:
+                return jsonify({'message': 'Subject not found'}), 404
+            return with_cache_headers(jsonify({
+                'subject': {
+                    'id': subject['id'],
+                    'name': subject['name']
+                },
+                'chapters': snapshot.chapters_by_subject.get(subject_id, ())
+            }), etag), 200
+        
         subject = Subject.query.get_or_404(subject_id)
         chapters = Chapters.query.filter_by(subject_id=subject_id).all()
         
@@ -465,13 +954,13 @@ def get_subject_chapters(subject_id):
             'subject_id': chapter.subject_id
         } for chapter in chapters]
         
-        return jsonify({
+        return with_cache_headers(jsonify({
             'subject': {
                 'id': subject.id,
                 'name': subject.name
             },
             'chapters': chapters_data
-        }), 200
+        }), etag), 200
     except Exception as e:
         print(f"Error fetching chapters: {str(e)}")
         return jsonify({'message': 'Error fetching chapters', 'error': str(e)}), 500
@@ -511,7 +1000,9 @@ def add_chapter(subject_id):
         )
         
         db.session.add(new_chapter)
+        bump_content_version(CATALOG_VERSION_KEY)
         db.session.commit()
+        catalog_cache.invalidate()
         print(f"[DEBUG] Chapter created with ID: {new_chapter.id}")
         
         return jsonify({
@@ -539,7 +1030,10 @@ def delete_chapter(chapter_id):
         subject_id = chapter.subject_id
         
         db.session.delete(chapter)
+        bump_content_version(CATALOG_VERSION_KEY)
         db.session.commit()
+        catalog_cache.invalidate()
+        leaderboards.invalidate()
         
         return jsonify({
             'message': 'Chapter deleted successfully',
@@ -565,7 +1059,9 @@ def update_chapter(chapter_id):
         chapter.chapter_name = data.get('chapter_name', chapter.chapter_name)
         chapter.description = data.get('description', chapter.description)
         
+        bump_content_version(CATALOG_VERSION_KEY)
         db.session.commit()
+        catalog_cache.invalidate()
         
         return jsonify({
             'message': 'Chapter updated successfully',
@@ -626,29 +1122,23 @@ def add_quiz(chapter_id):
             )
             
             db.session.add(new_quiz)
+            db.session.flush()
+            # The notification emails are queued in the same transaction as the quiz
+            queued = queue_quiz_notification(new_quiz)
+            bump_content_version(CATALOG_VERSION_KEY)
             db.session.commit()
-            print(f"[DEBUG] Quiz created with ID: {new_quiz.id}")
+            catalog_cache.invalidate()
+            print(f"[DEBUG] Quiz created with ID: {new_quiz.id}, notification queued for {queued} users")
             
-            # Always send notifications about the new quiz - unconditionally
+            # Delivery happens outside the request
             try:
-                if celery and hasattr(celery.tasks.get('celery_worker.send_quiz_notification'), 'delay'):
-                    # Use Celery for asynchronous processing
-                    print(f"[DEBUG] Scheduling quiz notification task for quiz ID: {new_quiz.id}")
-                    task = celery.tasks.get('celery_worker.send_quiz_notification').delay(new_quiz.id)
-                    print(f"[DEBUG] Notification task scheduled with ID: {task.id if hasattr(task, 'id') else 'unknown'}")
-                else:
-                    # Fallback to synchronous processing
-                    print(f"[DEBUG] Celery not available. Sending quiz notifications synchronously for quiz ID: {new_quiz.id}")
-                    send_quiz_notification_emails(new_quiz.id)
-                    print(f"[DEBUG] Notifications sent synchronously for quiz ID: {new_quiz.id}")
+                print(f"[DEBUG] Quiz notifications dispatched to: {dispatch_notifications()}")
             except Exception as notification_error:
-                # Log error but don't fail the quiz creation
-                print(f"[ERROR] Failed to send quiz notifications: {str(notification_error)}")
-                import traceback
-                traceback.print_exc()
+                # The rows stay in the outbox for the next delivery run
+                print(f"[ERROR] Failed to dispatch quiz notifications: {str(notification_error)}")
             
             return jsonify({
-                'message': 'Quiz added successfully. Email notifications have been sent to users.',
+                'message': 'Quiz added successfully. Email notifications have been queued for users.',
                 'quiz': {
                     'id': new_quiz.id,
                     'quiz_name': new_quiz.quiz_name,
@@ -678,6 +1168,24 @@ def get_chapter_quizzes(chapter_id):
         auth_header = request.headers.get('Authorization')
         print(f"Auth header for quizzes: {auth_header}")
         
+        snapshot = catalog_cache.get()
+        etag = catalog_etag(snapshot)
+        if client_has_etag(etag):
+            return not_modified(etag)
+        
+        if snapshot is not None:
+            # Served from the in-memory catalogue, no database round trip
+            chapter = snapshot.chapters_by_id.get(chapter_id)
+            if chapter is None:
+                return jsonify({'message': 'Chapter not found'}), 404
+            return with_cache_headers(jsonify({
+                'chapter': {
+                    'id': chapter['id'],
+                    'chapter_name': chapter['chapter_name']
+                },
+                'quizzes': snapshot.quizzes_by_chapter.get(chapter_id, ())
+            }), etag), 200
+        
         chapter = Chapters.query.get_or_404(chapter_id)
         quizzes = Quizzes.query.filter_by(chapter_id=chapter_id).all()
         
@@ -689,13 +1197,13 @@ def get_chapter_quizzes(chapter_id):
             'chapter_id': quiz.chapter_id
         } for quiz in quizzes]
         
-        return jsonify({
+        return with_cache_headers(jsonify({
             'chapter': {
                 'id': chapter.id,
                 'chapter_name': chapter.chapter_name
             },
             'quizzes': quizzes_data
-        }), 200
+        }), etag), 200
     except Exception as e:
         print(f"Error fetching quizzes: {str(e)}")
         return jsonify({'message': 'Error fetching quizzes', 'error': str(e)}), 500
@@ -710,6 +1218,14 @@ def get_quiz(quiz_id):
         auth_header = request.headers.get('Authorization')
         print(f"Auth header for quiz details: {auth_header}")
         
+        snapshot = catalog_cache.get()
+        if snapshot is not None:
+            # Served from the in-memory catalogue, no database round trip
+            quiz = snapshot.quizzes_by_id.get(quiz_id)
+            if quiz is None:
+                return jsonify({'message': 'Quiz not found'}), 404
+            return jsonify(quiz), 200
+        
         quiz = Quizzes.query.get_or_404(quiz_id)
         
         return jsonify({
@@ -723,6 +1239,86 @@ def get_quiz(quiz_id):
         print(f"Error fetching quiz: {str(e)}")
         return jsonify({'message': 'Error fetching quiz', 'error': str(e)}), 500
 
+def load_questions_data(quiz_id):
+    """Questions of a quiz in the shape returned by the question endpoints"""
+    questions = Questions.query.filter_by(quiz_id=quiz_id).all()
+    return [{
+        'id': question.id,
+        'question_statement': question.question_statement,
+        'option1': question.option1,
+        'option2': question.option2,
+        'option3': question.option3,
+        'option4': question.option4,
+        'correct_option':question.correct_option,
+        'marks': question.marks
+    } for question in questions]
+
+def load_quiz_breadcrumb(quiz_id, snapshot):
+    """Return (quiz, chapter, subject) dicts for a quiz, or None if it does not exist"""
+    if snapshot is not None:
+        quiz = snapshot.quizzes_by_id.get(quiz_id)
+        if quiz is None:
+            return None
+        chapter = snapshot.chapters_by_id.get(quiz['chapter_id'])
+        subject = snapshot.subjects_by_id.get(chapter['subject_id']) if chapter else None
+        return (
+            quiz,
+            {'id': chapter['id'], 'chapter_name': chapter['chapter_name']} if chapter else None,
+            {'id': subject['id'], 'name': subject['name']} if subject else None
+        )
+    
+    row = db.session.query(Quizzes, Chapters, Subject).outerjoin(
+        Chapters, Chapters.id == Quizzes.chapter_id
+    ).outerjoin(
+        Subject, Subject.id == Chapters.subject_id
+    ).filter(Quizzes.id == quiz_id).first()
+    if row is None:
+        return None
+    quiz, chapter, subject = row
+    return (
+        {
+            'id': quiz.id,
+            'quiz_name': quiz.quiz_name,
+            'date_of_quiz': str(quiz.date_of_quiz),
+            'timing': quiz.timing,
+            'chapter_id': quiz.chapter_id
+        },
+        {'id': chapter.id, 'chapter_name': chapter.chapter_name} if chapter else None,
+        {'id': subject.id, 'name': subject.name} if subject else None
+    )
+
+# Everything the quiz attempt page needs in a single request
+@app.route('/api/quizzes/<int:quiz_id>/bundle', methods=['GET'])
+def get_quiz_bundle(quiz_id):
+    try:
+        # The bundle changes when either the catalogue or the questions change
+        snapshot = catalog_cache.get()
+        questions_version = get_content_version(questions_version_key(quiz_id))
+        version = (catalog_etag(snapshot), questions_version)
+        etag = representation_etag(f'bundle-{quiz_id}-{version[0]}-{questions_version}')
+        if client_has_etag(etag):
+            return not_modified(etag)
+        
+        entry = quiz_bundle_cache.get(quiz_id)
+        if entry is None or entry.version != version:
+            breadcrumb = load_quiz_breadcrumb(quiz_id, snapshot)
+            if breadcrumb is None:
+                return jsonify({'message': 'Quiz not found'}), 404
+            quiz, chapter, subject = breadcrumb
+            
+            entry = CompressedPayload(version, {
+                'quiz': quiz,
+                'chapter': chapter,
+                'subject': subject,
+                'questions': load_questions_data(quiz_id)
+            })
+            quiz_bundle_cache.put(quiz_id, entry)
+        
+        return compressed_json_response(entry, etag)
+    except Exception as e:
+        print(f"Error fetching quiz bundle: {str(e)}")
+        return jsonify({'message': 'Error fetching quiz bundle', 'error': str(e)}), 500
+
 # Add a new question to a quiz
 @app.route('/api/quizzes/<int:quiz_id>/questions', methods=['POST'])
 @jwt_required()
@@ -769,7 +1365,10 @@ def add_question(quiz_id):
         )
         
         db.session.add(new_question)
+        bump_content_version(questions_version_key(quiz_id))
         db.session.commit()
+        question_payload_cache.pop(quiz_id)
+        quiz_bundle_cache.pop(quiz_id)
         print(f"[DEBUG] Question added with ID: {new_question.id}")
         
         return jsonify({
@@ -802,27 +1401,30 @@ def get_quiz_questions(quiz_id):
         auth_header = request.headers.get('Authorization')
         print(f"Auth header for questions: {auth_header}")
         
-        quiz = Quizzes.query.get_or_404(quiz_id)
-        questions = Questions.query.filter_by(quiz_id=quiz_id).all()
-        
-        questions_data = [{
-            'id': question.id,
-            'question_statement': question.question_statement,
-            'option1': question.option1,
-            'option2': question.option2,
-            'option3': question.option3,
-            'option4': question.option4,
-            'correct_option':question.correct_option,
-            'marks': question.marks
-        } for question in questions]
+        # The version row is bumped with every question write, so a matching
+        # tag means the client's copy (and our cached payload) is current
+        version = get_content_version(questions_version_key(quiz_id))
+        etag = representation_etag(f'questions-{quiz_id}-{version}')
+        if client_has_etag(etag):
+            return not_modified(etag)
+        
+        entry = question_payload_cache.get(quiz_id)
+        if entry is None or entry.version != version:
+            quiz = Quizzes.query.get(quiz_id)
+            if quiz is None:
+                return jsonify({'message': 'Quiz not found'}), 404
+            
+            # Serialize and compress once; later requests reuse the bytes
+            entry = CompressedPayload(version, {
+                'quiz': {
+                    'id': quiz.id,
+                    'quiz_name': quiz.quiz_name
+                },
+                'questions': load_questions_data(quiz_id)
+            })
+            question_payload_cache.put(quiz_id, entry)
         
-        return jsonify({
-            'quiz': {
-                'id': quiz.id,
-                'quiz_name': quiz.quiz_name
-            },
-            'questions': questions_data
-        }), 200
+        return compressed_json_response(entry, etag)
     except Exception as e:
         print(f"Error fetching questions: {str(e)}")
         return jsonify({'message': 'Error fetching questions', 'error': str(e)}), 500
@@ -847,7 +1449,10 @@ def update_question(question_id):
         question.correct_option=data.get('correct_option',question.correct_option)
         question.marks = data.get('marks', question.marks)
         
+        bump_content_version(questions_version_key(question.quiz_id))
         db.session.commit()
+        question_payload_cache.pop(question.quiz_id)
+        quiz_bundle_cache.pop(question.quiz_id)
         
         return jsonify({
             'message': 'Question updated successfully',
@@ -875,7 +1480,10 @@ def delete_question(question_id):
         quiz_id = question.quiz_id
         
         db.session.delete(question)
+        bump_content_version(questions_version_key(quiz_id))
         db.session.commit()
+        question_payload_cache.pop(quiz_id)
+        quiz_bundle_cache.pop(quiz_id)
         
         return jsonify({
             'message': 'Question deleted successfully',
@@ -886,6 +1494,12 @@ def delete_question(question_id):
         print(f"Error deleting question: {str(e)}")
         return jsonify({'message': 'Error deleting question', 'error': str(e)}), 500
 
+@app.cli.command('rebuild-quiz-stats')
+def rebuild_quiz_stats_command():
+    """Backfill the quiz_stats rollup from existing attempts"""
+    quizzes = rebuild_quiz_stats()
+    print(f"Rebuilt quiz statistics for {quizzes} quizzes")
+
 # Add these routes before the if __name__ == '__main__': block
 
 # Get all subjects for quiz selection
@@ -898,6 +1512,15 @@ def get_all_subjects():
         auth_header = request.headers.get('Authorization')
         print(f"Auth header: {auth_header}")
         
+        snapshot = catalog_cache.get()
+        etag = catalog_etag(snapshot)
+        if client_has_etag(etag):
+            return not_modified(etag)
+        
+        if snapshot is not None:
+            # Served from the in-memory catalogue, no database round trip
+            return with_cache_headers(jsonify(snapshot.subjects), etag), 200
+        
         subjects = Subject.query.all()
         subjects_data = [{
             'id': subject.id,
@@ -905,7 +1528,7 @@ def get_all_subjects():
             'description': subject.description
         } for subject in subjects]
         
-        return jsonify(subjects_data), 200
+        return with_cache_headers(jsonify(subjects_data), etag), 200
     except Exception as e:
         print(f"Error fetching subjects: {str(e)}")
         return jsonify({'message': 'Error fetching subjects', 'error': str(e)}), 500
@@ -915,6 +1538,14 @@ def get_all_subjects():
 @jwt_required()
 def get_chapter_details(chapter_id):
     try:
+        snapshot = catalog_cache.get()
+        if snapshot is not None:
+            # Served from the in-memory catalogue, no database round trip
+            chapter = snapshot.chapters_by_id.get(chapter_id)
+            if chapter is None:
+                return jsonify({'message': 'Chapter not found'}), 404
+            return jsonify(chapter), 200
+        
         chapter = Chapters.query.get_or_404(chapter_id)
         
         return jsonify({
@@ -950,37 +1581,514 @@ def submit_quiz():
         
         if not all([quiz_id, user_id, score is not None]):
             return jsonify({'message': 'Quiz ID, user ID, and score are required'}), 400
-            
-        # Save to Scores table
-        new_score = Scores(
-            quiz_id=quiz_id,
-            user_id=user_id,
-            total_scored=score
-        )
         
-        # Also update the Performance table
-        new_performance = Performance(
-            RegistrationUser_id=user_id,
-            Quizzes_id=quiz_id,
-            score=float(score),
-            attempted_at=datetime.utcnow()
-        )
+        # The built-in admin login submits as 'admin'; its attempts are stored
+        # under that id as before but kept out of the per-user rollups
+        try:
+            quiz_id = int(quiz_id)
+            user_id = user_id if user_id == 'admin' else int(user_id)
+        except (TypeError, ValueError):
+            return jsonify({'message': "Quiz ID must be an integer and user ID an integer or 'admin'"}), 400
         
-        db.session.add(new_score)
-        db.session.add(new_performance)
-        db.session.commit()
+        submission = {
+            'quiz_id': quiz_id,
+            'user_id': user_id,
+            'score': float(score),
+            'attempted_at': datetime.utcnow()
+        }
+        
+        if app.config['SUBMIT_GROUP_COMMIT']:
+            # Wait until the writer thread has committed our attempt
+            try:
+                attempt_id = submission_writer.submit(submission, timeout=app.config['SUBMIT_ACK_TIMEOUT'])
+            except WriterBusy:
+                return jsonify({'message': 'Too many submissions right now, please retry'}), 503
+            except FutureTimeout:
+                # Still queued; it will be saved, so the client must not resubmit
+                return jsonify({'message': 'Submission accepted but not yet saved, check your progress page shortly'}), 202
+        else:
+            attempt_id = write_submission_batch([submission])[0]
         
         return jsonify({
             'message': 'Quiz submitted successfully',
+            'attempt_id': attempt_id,
             'score': score,
             'total_possible': total_possible,
             'percentage': round((score / total_possible * 100) if total_possible > 0 else 0, 2)
         }), 200
     except Exception as e:
-        db.session.rollback()
         print(f"Error submitting quiz: {str(e)}")
         return jsonify({'message': 'Error submitting quiz', 'error': str(e)}), 500
 
+@retry_on_locked(
+    attempts=app.config['SQLITE_LOCK_RETRIES'],
+    delay=app.config['SQLITE_LOCK_RETRY_DELAY_MS'] / 1000
+)
+def write_submission_batch(submissions):
+    """Write a group of quiz submissions in one transaction; returns their attempt ids.
+
+    Each submission becomes a single Performance row (the canonical attempt
+    record) plus its quiz_stats, activity and user_stats updates. Runs on the
+    group-commit writer thread, or inline when group commit is disabled.
+    """
+    with nullcontext() if has_app_context() else app.app_context():
+        try:
+            quiz_ids = {submission['quiz_id'] for submission in submissions}
+            quizzes = {row.id: row for row in db.session.query(
+                Quizzes.id, Quizzes.timing, Quizzes.chapter_id, Chapters.subject_id
+            ).outerjoin(Chapters, Quizzes.chapter_id == Chapters.id).filter(Quizzes.id.in_(quiz_ids))}
+            
+            performances = []
+            for submission in submissions:
+                performance = Performance(
+                    RegistrationUser_id=submission['user_id'],
+                    Quizzes_id=submission['quiz_id'],
+                    score=submission['score'],
+                    attempted_at=submission['attempted_at']
+                )
+                db.session.add(performance)
+                record_quiz_stats(submission['quiz_id'], submission['score'], submission['attempted_at'])
+                record_activity(submission['user_id'], submission['score'], submission['attempted_at'])
+                quiz = quizzes.get(submission['quiz_id'])
+                record_user_stats(submission['user_id'], submission['score'], quiz.timing if quiz else 0, submission['attempted_at'])
+                performances.append(performance)
+            
+            db.session.flush()
+            attempt_ids = [performance.id for performance in performances]
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        # Keep the in-memory percentile index in step with the committed attempts
+        for submission, attempt_id in zip(submissions, attempt_ids):
+            percentile_index.add_score(submission['quiz_id'], submission['score'], attempt_id)
+        
+        # Their stored reports no longer match the latest attempt
+        for user_id in {submission['user_id'] for submission in submissions}:
+            report_store.invalidate_user(user_id)
+        
+        # The attempts are saved; a leaderboard failure only leaves the boards
+        # behind until the next rebuild-leaderboards
+        try:
+            for submission in submissions:
+                quiz = quizzes.get(submission['quiz_id'])
+                if quiz is not None and isinstance(submission['user_id'], int):
+                    leaderboards.record(submission['user_id'], quiz.id, quiz.chapter_id, quiz.subject_id, submission['score'])
+        except Exception as e:
+            print(f"Error updating leaderboards: {str(e)}")
+        
+        return attempt_ids
+
+submission_writer = GroupCommitWriter(
+    write_submission_batch,
+    max_batch=app.config['SUBMIT_MAX_BATCH'],
+    max_wait=app.config['SUBMIT_BATCH_WINDOW_MS'] / 1000,
+    queue_size=app.config['SUBMIT_QUEUE_SIZE'],
+    name='submission-writer'
+)
+atexit.register(submission_writer.stop)
+
+def ensure_attempt_schema():
+    """Collapse the legacy Scores table into a view over Performance.
+
+    Scores rows that never got a Performance twin are copied over first, then
+    the table is kept as scores_legacy and replaced by a read-only `scores`
+    view, so existing Scores readers keep working on the single record. A
+    scores table that reappears next to an existing scores_legacy (a
+    create_all run) has its rows appended to scores_legacy instead.
+    """
+    object_types = dict(db.session.execute(text(
+        "SELECT name, type FROM sqlite_master WHERE name IN ('scores', 'scores_legacy')"
+    )).fetchall())
+    scores_type = object_types.get('scores')
+    copied = 0
+    
+    if scores_type == 'table':
+        # Copy the k-th and later Scores rows of a (user, quiz) pair when
+        # Performance holds fewer than k attempts for that pair
+        copied = db.session.execute(text("""
+            INSERT INTO performance (RegistrationUser_id, Quizzes_id, score, attempted_at)
+            SELECT s.user_id, s.quiz_id, s.total_scored, COALESCE(s.time_stamp_of_attempt, CURRENT_TIMESTAMP)
+            FROM scores s
+            WHERE (SELECT count(*) FROM scores s2
+                   WHERE s2.user_id = s.user_id AND s2.quiz_id = s.quiz_id AND s2.id <= s.id)
+                > (SELECT count(*) FROM performance p
+                   WHERE p.RegistrationUser_id = s.user_id AND p.Quizzes_id = s.quiz_id)
+        """)).rowcount
+        if 'scores_legacy' in object_types:
+            db.session.execute(text("""
+                INSERT INTO scores_legacy (quiz_id, user_id, time_stamp_of_attempt, total_scored)
+                SELECT quiz_id, user_id, time_stamp_of_attempt, total_scored FROM scores
+            """))
+            db.session.execute(text("DROP TABLE scores"))
+        else:
+            db.session.execute(text("ALTER TABLE scores RENAME TO scores_legacy"))
+        scores_type = None
+        print(f"Moved legacy scores to scores_legacy ({copied} attempts copied into performance)")
+    
+    if scores_type is None:
+        db.session.execute(text("""
+            CREATE VIEW scores AS
+            SELECT id,
+                   Quizzes_id AS quiz_id,
+                   RegistrationUser_id AS user_id,
+                   attempted_at AS time_stamp_of_attempt,
+                   CAST(score AS INTEGER) AS total_scored
+            FROM performance
+        """))
+    db.session.commit()
+    
+    # Copied attempts were never folded into the rollup
+    if copied:
+        rebuild_quiz_stats()
+
+def score_bin_index(score):
+    """Map a score onto its fixed-width quiz_stats histogram bin"""
+    bins = app.config['QUIZ_STATS_BINS']
+    return min(max(int(score // app.config['QUIZ_STATS_BIN_WIDTH']), 0), bins - 1)
+
+def record_quiz_stats(quiz_id, score, attempted_at):
+    """Fold one attempt into the quiz_stats rollup (caller commits).
+
+    Both statements are single atomic upserts, so concurrent submissions
+    never lose updates to a read-modify-write race.
+    """
+    stats = QuizStats.__table__
+    stmt = sqlite_insert(stats).values(
+        quiz_id=quiz_id,
+        attempt_count=1,
+        score_sum=score,
+        score_sum_sq=score * score,
+        min_score=score,
+        max_score=score,
+        last_attempt_at=attempted_at
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[stats.c.quiz_id],
+        set_={
+            'attempt_count': stats.c.attempt_count + 1,
+            'score_sum': stats.c.score_sum + stmt.excluded.score_sum,
+            'score_sum_sq': stats.c.score_sum_sq + stmt.excluded.score_sum_sq,
+            'min_score': db.func.min(db.func.coalesce(stats.c.min_score, stmt.excluded.min_score), stmt.excluded.min_score),
+            'max_score': db.func.max(db.func.coalesce(stats.c.max_score, stmt.excluded.max_score), stmt.excluded.max_score),
+            'last_attempt_at': db.func.max(db.func.coalesce(stats.c.last_attempt_at, stmt.excluded.last_attempt_at), stmt.excluded.last_attempt_at)
+        }
+    ))
+    
+    bins = QuizScoreBin.__table__
+    stmt = sqlite_insert(bins).values(quiz_id=quiz_id, bin_index=score_bin_index(score), attempts=1)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[bins.c.quiz_id, bins.c.bin_index],
+        set_={'attempts': bins.c.attempts + 1}
+    ))
+
+def rebuild_quiz_stats():
+    """Recompute the quiz_stats rollup and histograms from the Performance history"""
+    QuizScoreBin.query.delete()
+    QuizStats.query.delete()
+    
+    totals = db.session.query(
+        Performance.Quizzes_id,
+        db.func.count(Performance.id),
+        db.func.sum(Performance.score),
+        db.func.sum(Performance.score * Performance.score),
+        db.func.min(Performance.score),
+        db.func.max(Performance.score),
+        db.func.max(Performance.attempted_at)
+    ).group_by(Performance.Quizzes_id).all()
+    
+    db.session.bulk_insert_mappings(QuizStats, [{
+        'quiz_id': quiz_id,
+        'attempt_count': count,
+        'score_sum': score_sum,
+        'score_sum_sq': score_sum_sq,
+        'min_score': min_score,
+        'max_score': max_score,
+        'last_attempt_at': last_attempt_at
+    } for quiz_id, count, score_sum, score_sum_sq, min_score, max_score, last_attempt_at in totals])
+    
+    # Same binning as score_bin_index, evaluated in SQL
+    bin_expr = db.func.min(
+        db.func.max(db.cast(Performance.score / app.config['QUIZ_STATS_BIN_WIDTH'], db.Integer), 0),
+        app.config['QUIZ_STATS_BINS'] - 1
+    ).label('bin_index')
+    histogram = db.session.query(
+        Performance.Quizzes_id,
+        bin_expr,
+        db.func.count(Performance.id)
+    ).group_by(Performance.Quizzes_id, bin_expr).all()
+    
+    db.session.bulk_insert_mappings(QuizScoreBin, [{
+        'quiz_id': quiz_id,
+        'bin_index': bin_index,
+        'attempts': count
+    } for quiz_id, bin_index, count in histogram])
+    
+    db.session.commit()
+    return len(totals)
+
+ACTIVITY_GRANULARITIES = ('day', 'week', 'month')
+
+def activity_period_start(granularity, day):
+    """First day of the rollup period containing `day`"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+def record_activity(user_id, score, attempted_at):
+    """Fold one attempt into the day/week/month activity rollups (caller commits).
+
+    The user is counted as active in a period only when their
+    activity_rollup_user row is new, so active_users stays a distinct count.
+    """
+    rollup = ActivityRollup.__table__
+    seen = ActivityRollupUser.__table__
+    for granularity in ACTIVITY_GRANULARITIES:
+        period_start = activity_period_start(granularity, attempted_at.date())
+        first_visit = db.session.execute(sqlite_insert(seen).values(
+            granularity=granularity,
+            period_start=period_start,
+            user_id=user_id
+        ).on_conflict_do_nothing()).rowcount
+        
+        stmt = sqlite_insert(rollup).values(
+            granularity=granularity,
+            period_start=period_start,
+            attempts=1,
+            active_users=first_visit,
+            score_sum=score,
+            score_count=1
+        )
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[rollup.c.granularity, rollup.c.period_start],
+            set_={
+                'attempts': rollup.c.attempts + 1,
+                'active_users': rollup.c.active_users + stmt.excluded.active_users,
+                'score_sum': rollup.c.score_sum + stmt.excluded.score_sum,
+                'score_count': rollup.c.score_count + 1
+            }
+        ))
+
+# Period start of attempted_at for each granularity, matching activity_period_start
+ACTIVITY_PERIOD_SQL = {
+    'day': "date(attempted_at)",
+    'week': "date(attempted_at, '-' || ((CAST(strftime('%w', attempted_at) AS INTEGER) + 6) % 7) || ' days')",
+    'month': "date(attempted_at, 'start of month')",
+}
+
+def rebuild_activity_rollups():
+    """Recompute the activity rollups from the Performance history"""
+    db.session.execute(text("DELETE FROM activity_rollup_user"))
+    db.session.execute(text("DELETE FROM activity_rollup"))
+    
+    today = datetime.utcnow().date()
+    for granularity, period_sql in ACTIVITY_PERIOD_SQL.items():
+        db.session.execute(text(f"""
+            INSERT INTO activity_rollup (granularity, period_start, attempts, active_users, score_sum, score_count)
+            SELECT :granularity, {period_sql}, count(*), count(DISTINCT RegistrationUser_id), sum(score), count(score)
+            FROM performance
+            GROUP BY {period_sql}
+        """), {'granularity': granularity})
+        # Only the open period still needs its member set
+        db.session.execute(text(f"""
+            INSERT INTO activity_rollup_user (granularity, period_start, user_id)
+            SELECT DISTINCT :granularity, {period_sql}, RegistrationUser_id
+            FROM performance
+            WHERE attempted_at >= :open_start
+        """), {'granularity': granularity, 'open_start': activity_period_start(granularity, today)})
+    
+    db.session.commit()
+    return db.session.query(ActivityRollup).filter_by(granularity='day').count()
+
+def compact_activity_rollups(grace_days=1):
+    """Drop the per-user rows of periods that ended more than grace_days ago.
+
+    Their active_users counts are final by then; the member set only exists
+    to keep counts distinct while a period can still receive attempts.
+    """
+    today = datetime.utcnow().date()
+    removed = 0
+    for granularity in ACTIVITY_GRANULARITIES:
+        cutoff = activity_period_start(granularity, today - timedelta(days=grace_days))
+        removed += ActivityRollupUser.query.filter(
+            ActivityRollupUser.granularity == granularity,
+            ActivityRollupUser.period_start < cutoff
+        ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+def record_user_stats(user_id, score, timing, attempted_at):
+    """Fold one attempt into the user's user_stats row (caller commits)"""
+    if not isinstance(user_id, int):
+        # The built-in 'admin' login has no registration_user row to summarize
+        return
+    stats = UserStats.__table__
+    stmt = sqlite_insert(stats).values(
+        user_id=user_id,
+        attempt_count=1,
+        score_sum=score,
+        max_score=score,
+        total_timing=timing or 0,
+        last_active_at=attempted_at
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[stats.c.user_id],
+        set_={
+            'attempt_count': stats.c.attempt_count + 1,
+            'score_sum': stats.c.score_sum + stmt.excluded.score_sum,
+            'max_score': db.func.max(db.func.coalesce(stats.c.max_score, stmt.excluded.max_score), stmt.excluded.max_score),
+            'total_timing': stats.c.total_timing + stmt.excluded.total_timing,
+            'last_active_at': db.func.max(db.func.coalesce(stats.c.last_active_at, stmt.excluded.last_active_at), stmt.excluded.last_active_at)
+        }
+    ))
+
+@retry_on_locked(
+    attempts=app.config['SQLITE_LOCK_RETRIES'],
+    delay=app.config['SQLITE_LOCK_RETRY_DELAY_MS'] / 1000
+)
+def repair_user_stats():
+    """Compare user_stats with the Performance history and rewrite drifted rows.
+
+    Returns the number of users whose summary was missing, stale or orphaned.
+    The recompute and the compare-and-write are a single INSERT ... SELECT ...
+    ON CONFLICT statement, which opens the write transaction: a submission
+    either committed before it (and is counted) or waits for the write lock
+    and adds itself to the repaired row. Orphans are removed in the same
+    transaction. Attempts stored under the text id 'admin' have no user to
+    summarize and are skipped, as in record_user_stats.
+    """
+    try:
+        upserted = db.session.execute(text("""
+            INSERT INTO user_stats (user_id, attempt_count, score_sum, max_score, total_timing, last_active_at)
+            SELECT p.RegistrationUser_id, count(p.id), sum(p.score), max(p.score),
+                   coalesce(sum(q.timing), 0), max(p.attempted_at)
+            FROM performance p
+            LEFT JOIN quizzes q ON q.id = p.Quizzes_id
+            WHERE typeof(p.RegistrationUser_id) = 'integer'
+            GROUP BY p.RegistrationUser_id
+            ON CONFLICT (user_id) DO UPDATE SET
+                attempt_count = excluded.attempt_count,
+                score_sum = excluded.score_sum,
+                max_score = excluded.max_score,
+                total_timing = excluded.total_timing,
+                last_active_at = excluded.last_active_at
+            WHERE user_stats.attempt_count != excluded.attempt_count
+               OR abs(user_stats.score_sum - excluded.score_sum) > 1e-6
+               OR user_stats.max_score IS NOT excluded.max_score
+               OR user_stats.total_timing != excluded.total_timing
+               OR user_stats.last_active_at IS NOT excluded.last_active_at
+        """)).rowcount
+        
+        # Summaries of users that no longer have any attempts
+        orphaned = db.session.execute(text("""
+            DELETE FROM user_stats
+            WHERE user_id NOT IN (SELECT RegistrationUser_id FROM performance)
+        """)).rowcount
+        
+        db.session.commit()
+        return upserted + orphaned
+    except Exception:
+        db.session.rollback()
+        raise
+
+def parse_timeline_granularity(days):
+    """Read ?granularity=day|week|month|auto; auto downsamples long windows. None if invalid"""
+    granularity = request.args.get('granularity', 'day')
+    if granularity == 'auto':
+        return 'day' if days <= 92 else 'week' if days <= 730 else 'month'
+    return granularity if granularity in ACTIVITY_GRANULARITIES else None
+
+def load_activity_timeline(session, start_date, end_date, granularity='day'):
+    """Rollup rows for the periods overlapping [start_date, end_date], oldest first"""
+    return session.query(ActivityRollup).filter(
+        ActivityRollup.granularity == granularity,
+        ActivityRollup.period_start >= activity_period_start(granularity, start_date.date()),
+        ActivityRollup.period_start <= end_date.date()
+    ).order_by(ActivityRollup.period_start).all()
+
+def load_attempt_history(user_id, start=None, end=None, cursor=None, limit=None, newest_first=False):
+    """Load a user's attempts with quiz, chapter and subject resolved by one joined query.
+
+    start/end bound attempted_at (end is exclusive). Pagination is keyset based
+    on the performance id: pass the last row's performance_id as `cursor` to
+    continue after it in the chosen order.
+    """
+    query = db.session.query(
+        Performance.id.label('performance_id'),
+        Performance.Quizzes_id.label('quiz_id'),
+        Performance.score,
+        Performance.attempted_at,
+        Quizzes.quiz_name,
+        Quizzes.chapter_id,
+        Chapters.chapter_name,
+        Chapters.subject_id,
+        Subject.name.label('subject_name')
+    ).join(
+        Quizzes, Quizzes.id == Performance.Quizzes_id
+    ).outerjoin(
+        Chapters, Chapters.id == Quizzes.chapter_id
+    ).outerjoin(
+        Subject, Subject.id == Chapters.subject_id
+    ).filter(Performance.RegistrationUser_id == user_id)
+    
+    if start is not None:
+        query = query.filter(Performance.attempted_at >= start)
+    if end is not None:
+        query = query.filter(Performance.attempted_at < end)
+    
+    if newest_first:
+        if cursor is not None:
+            query = query.filter(Performance.id < cursor)
+        query = query.order_by(Performance.id.desc())
+    else:
+        if cursor is not None:
+            query = query.filter(Performance.id > cursor)
+        query = query.order_by(Performance.id)
+    
+    if limit is not None:
+        query = query.limit(limit)
+    
+    return [{
+        'performance_id': row.performance_id,
+        'quiz_id': row.quiz_id,
+        'quiz_name': row.quiz_name,
+        'chapter_id': row.chapter_id,
+        'chapter_name': row.chapter_name or 'Unknown Chapter',
+        'subject_id': row.subject_id,
+        'subject_name': row.subject_name or 'Unknown Subject',
+        'score': row.score,
+        'attempted_at': row.attempted_at
+    } for row in query.all()]
+
+def parse_history_args():
+    """Read start_date/end_date (YYYY-MM-DD), cursor and limit from the query string"""
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    return {
+        'start': datetime.strptime(start_date, '%Y-%m-%d') if start_date else None,
+        # end_date is inclusive for callers, the loader bound is exclusive
+        'end': datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1) if end_date else None,
+        'cursor': request.args.get('cursor', type=int),
+        'limit': request.args.get('limit', type=int)
+    }
+
+def format_attempt_history(rows):
+    """Serialize loader rows for the progress endpoints"""
+    return [{
+        'performance_id': row['performance_id'],
+        'quiz_id': row['quiz_id'],
+        'quiz_name': row['quiz_name'],
+        'chapter_name': row['chapter_name'],
+        'subject_name': row['subject_name'],
+        'score': row['score'],
+        'attempted_at': row['attempted_at'].strftime('%Y-%m-%d %H:%M:%S'),
+        'subject_id': row['subject_id'],
+        'chapter_id': row['chapter_id']
+    } for row in rows]
+
 # Get user's quiz history for progress page
 @app.route('/api/user-progress/<int:user_id>', methods=['GET'])
 # @jwt_required()  # Temporarily comment out for debugging
@@ -990,32 +2098,19 @@ def get_user_progress(user_id):
         auth_header = request.headers.get('Authorization')
         print(f"Auth header for user progress: {auth_header}")
         
-        # Get all performances for this user
-        performances = Performance.query.filter_by(RegistrationUser_id=user_id).all()
-        
-        results = []
-        for perf in performances:
-            # Get quiz details
-            quiz = Quizzes.query.get(perf.Quizzes_id)
-            if quiz:
-                # Get chapter details
-                chapter = Chapters.query.get(quiz.chapter_id)
-                # Get subject details
-                subject = Subject.query.get(chapter.subject_id) if chapter else None
-                
-                results.append({
-                    'performance_id': perf.id,
-                    'quiz_id': perf.Quizzes_id,
-                    'quiz_name': quiz.quiz_name if quiz else 'Unknown Quiz',
-                    'chapter_name': chapter.chapter_name if chapter else 'Unknown Chapter',
-                    'subject_name': subject.name if subject else 'Unknown Subject',
-                    'score': perf.score,
-                    'attempted_at': perf.attempted_at.strftime('%Y-%m-%d %H:%M:%S'),
-                    'subject_id': chapter.subject_id if chapter else None,
-                    'chapter_id': quiz.chapter_id if quiz else None
-                })
-        
-        return jsonify(results), 200
+        try:
+            history_args = parse_history_args()
+        except ValueError:
+            return jsonify({'message': 'Dates must use the YYYY-MM-DD format'}), 400
+        
+        # Quiz, chapter and subject are resolved by the loader's single join
+        rows = load_attempt_history(user_id, **history_args)
+        results = format_attempt_history(rows)
+        
+        response = jsonify(results)
+        if history_args['limit'] and len(rows) == history_args['limit']:
+            response.headers['X-Next-Cursor'] = str(rows[-1]['performance_id'])
+        return response, 200
     except Exception as e:
         print(f"Error fetching user progress: {str(e)}")
         import traceback
@@ -1027,27 +2122,17 @@ def get_user_progress(user_id):
 @jwt_required()
 def get_user_recent_scores(user_id):
     try:
-        # Get the 5 most recent scores for this user
-        recent_scores = Scores.query.filter_by(user_id=user_id)\
-            .order_by(Scores.time_stamp_of_attempt.desc())\
-            .limit(5).all()
-        
-        results = []
-        for score in recent_scores:
-            # Get quiz details
-            quiz = Quizzes.query.get(score.quiz_id)
-            if quiz:
-                # Get chapter details
-                chapter = Chapters.query.get(quiz.chapter_id)
-                
-                results.append({
-                    'score_id': score.id,
-                    'quiz_id': score.quiz_id,
-                    'quiz_name': quiz.quiz_name,
-                    'chapter_name': chapter.chapter_name if chapter else 'Unknown Chapter',
-                    'score': score.total_scored,
-                    'attempted_at': score.time_stamp_of_attempt.strftime('%Y-%m-%d %H:%M:%S')
-                })
+        # Get the 5 most recent attempts for this user
+        recent_attempts = load_attempt_history(user_id, limit=5, newest_first=True)
+        
+        results = [{
+            'score_id': attempt['performance_id'],
+            'quiz_id': attempt['quiz_id'],
+            'quiz_name': attempt['quiz_name'],
+            'chapter_name': attempt['chapter_name'],
+            'score': attempt['score'],
+            'attempted_at': attempt['attempted_at'].strftime('%Y-%m-%d %H:%M:%S')
+        } for attempt in recent_attempts]
         
         return jsonify(results), 200
     except Exception as e:
@@ -1059,31 +2144,28 @@ def get_user_recent_scores(user_id):
 @jwt_required()
 def get_quiz_statistics(quiz_id):
     try:
-        # Get all scores for this quiz
-        scores = Scores.query.filter_by(quiz_id=quiz_id).all()
+        # One rollup row instead of scanning every score for this quiz
+        stats = QuizStats.query.get(quiz_id)
         
-        if not scores:
+        if not stats or not stats.attempt_count:
             return jsonify({
                 'quiz_id': quiz_id,
                 'total_attempts': 0,
                 'average_score': 0,
                 'highest_score': 0,
-                'lowest_score': 0
+                'lowest_score': 0,
+                'score_stddev': 0,
+                'score_distribution': [0] * app.config['QUIZ_STATS_BINS']
             }), 200
         
-        # Calculate statistics
-        total_attempts = len(scores)
-        score_values = [score.total_scored for score in scores]
-        average_score = sum(score_values) / total_attempts if total_attempts > 0 else 0
-        highest_score = max(score_values) if score_values else 0
-        lowest_score = min(score_values) if score_values else 0
-        
         return jsonify({
             'quiz_id': quiz_id,
-            'total_attempts': total_attempts,
-            'average_score': round(average_score, 2),
-            'highest_score': highest_score,
-            'lowest_score': lowest_score
+            'total_attempts': stats.attempt_count,
+            'average_score': round(stats.average_score, 2),
+            'highest_score': stats.max_score,
+            'lowest_score': stats.min_score,
+            'score_stddev': round(stats.score_stddev, 2),
+            'score_distribution': stats.histogram()
         }), 200
     except Exception as e:
         print(f"Error fetching quiz statistics: {str(e)}")
@@ -1146,35 +2228,23 @@ def search():
             # a separate endpoint to poll for results using task_id
             
             # Here we'll just execute it directly for simplicity
-            results = perform_search(query, user_type)
-            results['meta'] = {
-                'query': query,
-                'total': len(results['all']),
+            results = perform_search(query, user_type, page=page, per_page=per_page)
+            results['meta'].update({
                 'page': page,
                 'per_page': per_page,
                 'user_type': user_type,
                 'processed_by': 'celery-immediate',
                 'task_id': task_id
-            }
+            })
         else:
-            # Direct processing
-            results = perform_search(query, user_type)
-            results['meta'] = {
-                'query': query,
-                'total': len(results['all']),
+            # Direct processing; pagination happens inside the search itself
+            results = perform_search(query, user_type, page=page, per_page=per_page)
+            results['meta'].update({
                 'page': page,
                 'per_page': per_page,
                 'user_type': user_type,
                 'processed_by': 'direct'
-            }
-        
-        # Apply pagination to all result lists
-        start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-        
-        for key in ['subjects', 'chapters', 'quizzes', 'users', 'all']:
-            if key in results:
-                results[key] = results[key][start_idx:end_idx]
+            })
         
         return jsonify(results)
         
@@ -1202,8 +2272,220 @@ def search_task(query, user_type='user'):
         print(f"Error in search task: {str(e)}")
         return {"error": str(e)}
 
-def perform_search(query, user_type='user'):
-    """Core search functionality that searches across multiple entities"""
+# Full-text search index: one FTS5 row per subject, chapter, quiz and user.
+# Row ids are derived from (kind, entity id) so a single entity can be
+# replaced or removed without scanning the index.
+SEARCH_KINDS = {'subject': 'subjects', 'chapter': 'chapters', 'quiz': 'quizzes', 'user': 'users'}
+SEARCH_KIND_CODES = {'subject': 0, 'chapter': 1, 'quiz': 2, 'user': 3}
+search_index_state = {'ready': None}
+
+def search_rowid(kind, entity_id):
+    return int(entity_id) * len(SEARCH_KIND_CODES) + SEARCH_KIND_CODES[kind]
+
+def search_index_ready(connection=None):
+    """Whether the FTS5 search_index table exists (checked once per process)"""
+    if search_index_state['ready'] is None:
+        connection = connection or db.session
+        search_index_state['ready'] = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'"
+        )).first() is not None
+    return search_index_state['ready']
+
+def ensure_search_index():
+    """Create the FTS5 index if missing and fill it when it is empty"""
+    try:
+        db.session.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "kind UNINDEXED, entity_id UNINDEXED, title, body, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        ))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"WARNING: FTS5 search index unavailable, falling back to LIKE search: {e}")
+        search_index_state['ready'] = False
+        return False
+    
+    search_index_state['ready'] = True
+    if db.session.execute(text("SELECT count(*) FROM search_index")).scalar() == 0:
+        rebuild_search_index()
+    return True
+
+def rebuild_search_index():
+    """Repopulate search_index from the catalogue and user tables"""
+    kinds = len(SEARCH_KIND_CODES)
+    db.session.execute(text("DELETE FROM search_index"))
+    db.session.execute(text(f"""
+        INSERT INTO search_index (rowid, kind, entity_id, title, body)
+        SELECT id * {kinds} + {SEARCH_KIND_CODES['subject']}, 'subject', id, name, description FROM subject
+        UNION ALL
+        SELECT id * {kinds} + {SEARCH_KIND_CODES['chapter']}, 'chapter', id, chapter_name, description FROM chapters
+        UNION ALL
+        SELECT id * {kinds} + {SEARCH_KIND_CODES['quiz']}, 'quiz', id, quiz_name, '' FROM quizzes
+        UNION ALL
+        SELECT id * {kinds} + {SEARCH_KIND_CODES['user']}, 'user', id, username || ' ' || fullname, email || ' ' || qualification
+        FROM registration_user
+    """))
+    db.session.commit()
+
+def search_document(target):
+    """Return (kind, title, body) for an indexed model instance"""
+    if isinstance(target, Subject):
+        return 'subject', target.name, target.description
+    if isinstance(target, Chapters):
+        return 'chapter', target.chapter_name, target.description
+    if isinstance(target, Quizzes):
+        return 'quiz', target.quiz_name, ''
+    return 'user', f"{target.username} {target.fullname}", f"{target.email} {target.qualification}"
+
+# The listeners run inside the flush of every create/update/delete route, so
+# the index commits (or rolls back) together with the row it describes
+@event.listens_for(Subject, 'after_insert')
+@event.listens_for(Subject, 'after_update')
+@event.listens_for(Chapters, 'after_insert')
+@event.listens_for(Chapters, 'after_update')
+@event.listens_for(Quizzes, 'after_insert')
+@event.listens_for(Quizzes, 'after_update')
+@event.listens_for(RegistrationUser, 'after_insert')
+@event.listens_for(RegistrationUser, 'after_update')
+def index_search_document(mapper, connection, target):
+    if not search_index_ready(connection):
+        return
+    kind, title, body = search_document(target)
+    rowid = search_rowid(kind, target.id)
+    connection.execute(text("DELETE FROM search_index WHERE rowid = :rowid"), {'rowid': rowid})
+    connection.execute(text(
+        "INSERT INTO search_index (rowid, kind, entity_id, title, body) "
+        "VALUES (:rowid, :kind, :entity_id, :title, :body)"
+    ), {'rowid': rowid, 'kind': kind, 'entity_id': target.id, 'title': title or '', 'body': body or ''})
+
+@event.listens_for(Subject, 'after_delete')
+@event.listens_for(Chapters, 'after_delete')
+@event.listens_for(Quizzes, 'after_delete')
+@event.listens_for(RegistrationUser, 'after_delete')
+def remove_search_document(mapper, connection, target):
+    if not search_index_ready(connection):
+        return
+    kind = search_document(target)[0]
+    connection.execute(text("DELETE FROM search_index WHERE rowid = :rowid"),
+                       {'rowid': search_rowid(kind, target.id)})
+
+def build_fts_query(query):
+    """Turn free text into an FTS5 query: every word must match as a prefix"""
+    terms = re.findall(r'\w+', query.lower())
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def hydrate_search_hits(hits):
+    """Load the result dicts for [(kind, entity_id), ...] with one query per kind"""
+    ids = {kind: [entity_id for hit_kind, entity_id in hits if hit_kind == kind] for kind in SEARCH_KINDS}
+    found = {}
+    
+    if ids['subject']:
+        for s in Subject.query.filter(Subject.id.in_(ids['subject'])).all():
+            found[('subject', s.id)] = {
+                'id': s.id,
+                'name': s.name,
+                'description': s.description,
+                'type': 'subject'
+            }
+    if ids['chapter']:
+        rows = db.session.query(Chapters, Subject.name).outerjoin(
+            Subject, Subject.id == Chapters.subject_id
+        ).filter(Chapters.id.in_(ids['chapter'])).all()
+        for c, subject_name in rows:
+            found[('chapter', c.id)] = {
+                'id': c.id,
+                'chapter_name': c.chapter_name,
+                'description': c.description,
+                'subject_id': c.subject_id,
+                'subject_name': subject_name or 'Unknown',
+                'type': 'chapter'
+            }
+    if ids['quiz']:
+        rows = db.session.query(Quizzes, Chapters.chapter_name).outerjoin(
+            Chapters, Chapters.id == Quizzes.chapter_id
+        ).filter(Quizzes.id.in_(ids['quiz'])).all()
+        for q, chapter_name in rows:
+            found[('quiz', q.id)] = {
+                'id': q.id,
+                'quiz_name': q.quiz_name,
+                'timing': q.timing,
+                'chapter_id': q.chapter_id,
+                'chapter_name': chapter_name or 'Unknown',
+                'type': 'quiz'
+            }
+    if ids['user']:
+        for u in RegistrationUser.query.filter(RegistrationUser.id.in_(ids['user'])).all():
+            found[('user', u.id)] = {
+                'id': u.id,
+                'username': u.username,
+                'fullname': u.fullname,
+                'email': u.email,
+                'qualification': u.qualification,
+                'active': u.active,
+                'type': 'user'
+            }
+    
+    return [found[hit] for hit in hits if hit in found]
+
+def perform_search(query, user_type='user', page=1, per_page=None):
+    """Core search functionality that searches across multiple entities.
+
+    Matching, BM25 ranking (titles weigh more than descriptions), per-type
+    counts and pagination all run inside SQLite, so only the requested page
+    is loaded. Users are only searched for admins.
+    """
+    query = query.strip().lower()
+    fts_query = build_fts_query(query)
+    
+    if not search_index_ready() or not fts_query:
+        return perform_search_like(query, user_type, page, per_page)
+    
+    # Users are never visible to non-admins, even in the counts
+    visibility = "" if user_type == 'admin' else " AND kind != 'user'"
+    params = {'q': fts_query}
+    
+    counts = {kind: 0 for kind in SEARCH_KINDS}
+    for kind, count in db.session.execute(text(
+        f"SELECT kind, count(*) FROM search_index WHERE search_index MATCH :q{visibility} GROUP BY kind"
+    ), params):
+        counts[kind] = count
+    
+    page_sql = ""
+    if per_page:
+        page_sql = " LIMIT :limit OFFSET :offset"
+        params.update({'limit': per_page, 'offset': (page - 1) * per_page})
+    
+    def ranked_hits(kind_filter=""):
+        rows = db.session.execute(text(
+            "SELECT kind, entity_id FROM search_index "
+            f"WHERE search_index MATCH :q{visibility}{kind_filter} "
+            f"ORDER BY bm25(search_index, 0.0, 0.0, 10.0, 1.0){page_sql}"
+        ), params).fetchall()
+        return [(kind, int(entity_id)) for kind, entity_id in rows]
+    
+    hits = {'all': ranked_hits()}
+    for kind, key in SEARCH_KINDS.items():
+        if kind == 'user' and user_type != 'admin':
+            continue
+        hits[key] = ranked_hits(f" AND kind = '{kind}'") if counts[kind] else []
+    
+    # Hydrate every page in one pass so shared entities are loaded once
+    unique_hits = list(dict.fromkeys(hit for page_hits in hits.values() for hit in page_hits))
+    loaded = {(item['type'], item['id']): item for item in hydrate_search_hits(unique_hits)}
+    
+    results = {key: [loaded[hit] for hit in page_hits if hit in loaded] for key, page_hits in hits.items()}
+    results.setdefault('users', [])
+    results['meta'] = {
+        'query': query,
+        'total': sum(counts.values()),
+        'counts': {SEARCH_KINDS[kind]: count for kind, count in counts.items()},
+        'engine': 'fts5'
+    }
+    return results
+
+def perform_search_like(query, user_type='user', page=1, per_page=None):
+    """Fallback search using LIKE scans, for SQLite builds without FTS5"""
     # Normalize query
     query = query.strip().lower()
     
@@ -1300,6 +2582,19 @@ def perform_search(query, user_type='user'):
     all_results.sort(key=relevance_score)
     results['all'] = all_results
     
+    results['meta'] = {
+        'query': query,
+        'total': len(all_results),
+        'counts': {key: len(results[key]) for key in SEARCH_KINDS.values()},
+        'engine': 'like'
+    }
+    
+    # Paginate every result list the same way
+    if per_page:
+        start_idx = (page - 1) * per_page
+        for key in ['subjects', 'chapters', 'quizzes', 'users', 'all']:
+            results[key] = results[key][start_idx:start_idx + per_page]
+    
     return results
 
 # Add a new endpoint to check async search task status
@@ -1486,34 +2781,22 @@ def get_user_quiz_stats(user_id):
                 'total_time_spent': 0
             }), 200
         
-        # Get stats for regular users
-        performances = Performance.query.filter_by(RegistrationUser_id=user_id).all()
+        # Get stats for regular users from their summary row
+        stats = UserStats.query.get(int(user_id)) if user_id.isdigit() else None
         
-        if not performances:
+        if not stats or not stats.attempt_count:
             return jsonify({
                 'total_quizzes_attempted': 0,
                 'average_score': 0,
                 'highest_score': 0,
                 'total_time_spent': 0
             }), 200
-            
-        scores = [p.score for p in performances]
-        
-        # Calculate stats
-        total_quizzes = len(performances)
-        avg_score = sum(scores) / total_quizzes if total_quizzes > 0 else 0
-        highest_score = max(scores) if scores else 0
-        
-        # Get quizzes to calculate time spent
-        quiz_ids = [p.Quizzes_id for p in performances]
-        quizzes = Quizzes.query.filter(Quizzes.id.in_(quiz_ids)).all()
-        total_time = sum(q.timing for q in quizzes) if quizzes else 0
         
         return jsonify({
-            'total_quizzes_attempted': total_quizzes,
-            'average_score': round(avg_score, 2),
-            'highest_score': highest_score,
-            'total_time_spent': total_time
+            'total_quizzes_attempted': stats.attempt_count,
+            'average_score': round(stats.average_score, 2),
+            'highest_score': stats.max_score,
+            'total_time_spent': stats.total_timing
         }), 200
     except Exception as e:
         print(f"Error fetching user quiz stats: {str(e)}")
@@ -1551,24 +2834,29 @@ def get_user_performance_comparison(user_id):
                               .limit(limit)\
                               .all()
         
+        # The user's latest attempt on each listed quiz, in one query
+        latest_attempts = db.session.query(db.func.max(Performance.id)).filter(
+            Performance.RegistrationUser_id == user_id,
+            Performance.Quizzes_id.in_([row[0] for row in comparison_data])
+        ).group_by(Performance.Quizzes_id)
+        user_scores = dict(db.session.query(Performance.Quizzes_id, Performance.score).filter(
+            Performance.id.in_(latest_attempts.subquery().select())
+        ))
+        
+        # Percentiles of those scores from the index, in one bulk lookup
+        scored = [(quiz_id, user_scores[quiz_id]) for quiz_id, *_ in comparison_data if quiz_id in user_scores]
+        user_percentiles = dict(zip((quiz_id for quiz_id, _ in scored), percentile_index.percentiles(scored)))
+        
         # Format results
         results = []
         for quiz_id, quiz_name, avg_score, attempt_count in comparison_data:
-            # Get the user's performance on this quiz
-            user_perf = Performance.query.filter_by(
-                RegistrationUser_id=user_id,
-                Quizzes_id=quiz_id
-            ).first()
-            
-            user_score = user_perf.score if user_perf else None
-            
             results.append({
                 'quiz_id': quiz_id,
                 'quiz_name': quiz_name,
                 'average_score': round(avg_score, 2),
-                'user_score': user_score,
+                'user_score': user_scores.get(quiz_id),
                 'attempt_count': attempt_count,
-                'percentile': calculate_percentile(user_id, quiz_id) if user_score is not None else None
+                'percentile': user_percentiles.get(quiz_id)
             })
         
         return jsonify({
@@ -1582,260 +2870,608 @@ def get_user_performance_comparison(user_id):
         traceback.print_exc()
         return jsonify({'message': 'Error fetching performance comparison', 'error': str(e)}), 500
 
-def calculate_percentile(user_id, quiz_id):
-    """Calculate what percentile the user falls into for a given quiz"""
-    try:
-        # Get all scores for this quiz
-        all_scores = [p.score for p in Performance.query.filter_by(Quizzes_id=quiz_id).all()]
-        
-        if not all_scores:
-            return None
-            
-        # Get user's score
-        user_perf = Performance.query.filter_by(RegistrationUser_id=user_id, Quizzes_id=quiz_id).first()
-        if not user_perf:
+class QuizPercentileIndex:
+    """Per-quiz sorted score arrays answering percentile lookups with a binary search.
+
+    A quiz's scores are loaded from Performance the first time it is looked up
+    and then kept sorted in memory. write_submission_batch inserts each score
+    this process commits; attempts committed by other processes (web workers,
+    Celery) are picked up by a sync at most every `sync_interval` seconds per
+    quiz: one grouped count/max(id) query, plus the new rows of the quizzes
+    that moved on. A quiz whose count still disagrees afterwards (attempts
+    were deleted) is reloaded.
+
+    Each quiz remembers the highest Performance.id read from the database and
+    the ids inserted since, so an attempt is counted once whatever order the
+    inserts, loads and syncs arrive in. SQLite serializes writers, so every
+    attempt up to an id read from the database is committed and included.
+    """
+
+    def __init__(self, sync_interval=5):
+        self.sync_interval = sync_interval
+        self._scores = {}       # quiz_id -> sorted list of scores
+        self._synced_upto = {}  # quiz_id -> highest Performance.id read from the database
+        self._added = {}        # quiz_id -> ids above _synced_upto inserted by add_score
+        self._checked_at = {}   # quiz_id -> time.monotonic() of the last sync
+        self._loading = {}      # quiz_id -> [loads in progress, {id: score} added meanwhile]
+        self._lock = threading.Lock()
+
+    def _insert(self, quiz_id, performance_id, score):
+        # Caller holds the lock; the quiz is loaded
+        if performance_id <= self._synced_upto[quiz_id] or performance_id in self._added[quiz_id]:
+            return
+        insort(self._scores[quiz_id], score)
+        self._added[quiz_id].add(performance_id)
+
+    def _merge(self, quiz_id, rows, upto):
+        # Caller holds the lock; rows are all (id, score) of the quiz above its
+        # watermark up to `upto` (every row up to `upto` for an unloaded quiz)
+        if quiz_id not in self._scores:
+            self._scores[quiz_id] = sorted(score for _, score in rows)
+            self._synced_upto[quiz_id] = upto
+            self._added[quiz_id] = set()
+        else:
+            for performance_id, score in rows:
+                self._insert(quiz_id, performance_id, score)
+            upto = self._synced_upto[quiz_id] = max(upto, self._synced_upto[quiz_id])
+            self._added[quiz_id] = {i for i in self._added[quiz_id] if i > upto}
+        self._checked_at[quiz_id] = time.monotonic()
+
+    def _drop(self, quiz_id):
+        for state in (self._scores, self._synced_upto, self._added, self._checked_at):
+            state.pop(quiz_id, None)
+
+    def _load(self, quiz_ids, replace=False):
+        """Read every attempt of quiz_ids (one query); replace=True discards what was held"""
+        with self._lock:
+            for quiz_id in quiz_ids:
+                self._loading.setdefault(quiz_id, [0, {}])[0] += 1
+
+        loaded = {quiz_id: [] for quiz_id in quiz_ids}
+        loaded_upto = {quiz_id: 0 for quiz_id in quiz_ids}
+        completed = False
+        try:
+            rows = db.session.query(
+                Performance.Quizzes_id,
+                Performance.id,
+                Performance.score
+            ).filter(Performance.Quizzes_id.in_(quiz_ids)).all()
+            for quiz_id, perf_id, score in rows:
+                loaded[quiz_id].append((perf_id, score))
+                loaded_upto[quiz_id] = max(loaded_upto[quiz_id], perf_id)
+            completed = True
+        finally:
+            with self._lock:
+                for quiz_id in quiz_ids:
+                    loading = self._loading[quiz_id]
+                    if completed:
+                        if replace:
+                            self._drop(quiz_id)
+                        self._merge(quiz_id, loaded[quiz_id], loaded_upto[quiz_id])
+                        # Scores committed while the query ran may not be in its result
+                        for perf_id, score in loading[1].items():
+                            self._insert(quiz_id, perf_id, score)
+                    loading[0] -= 1
+                    if loading[0] == 0:
+                        del self._loading[quiz_id]
+
+    def _catch_up(self, quiz_ids):
+        """Merge the attempts other processes committed since the last sync"""
+        versions = {quiz_id: (count, upto) for quiz_id, count, upto in db.session.query(
+            Performance.Quizzes_id,
+            db.func.count(Performance.id),
+            db.func.max(Performance.id)
+        ).filter(Performance.Quizzes_id.in_(quiz_ids)).group_by(Performance.Quizzes_id)}
+
+        with self._lock:
+            watermarks = {q: self._synced_upto[q] for q in quiz_ids if q in self._scores}
+        moved = {q: versions[q][1] for q, watermark in watermarks.items()
+                 if q in versions and versions[q][1] > watermark}
+        rows = {quiz_id: [] for quiz_id in moved}
+        if moved:
+            # Bounded by the max(id)s above, so the counts describe the same rows
+            for quiz_id, perf_id, score in db.session.query(
+                Performance.Quizzes_id,
+                Performance.id,
+                Performance.score
+            ).filter(
+                Performance.Quizzes_id.in_(moved),
+                Performance.id > min(watermarks[q] for q in moved),
+                Performance.id <= max(moved.values())
+            ):
+                if watermarks[quiz_id] < perf_id <= moved[quiz_id]:
+                    rows[quiz_id].append((perf_id, score))
+
+        diverged = []
+        with self._lock:
+            for quiz_id in watermarks:
+                if quiz_id not in self._scores:
+                    continue  # invalidated meanwhile
+                count, upto = versions.get(quiz_id, (0, 0))
+                self._merge(quiz_id, rows.get(quiz_id, []), upto)
+                if len(self._scores[quiz_id]) - len(self._added[quiz_id]) != count:
+                    diverged.append(quiz_id)
+        if diverged:
+            self._load(diverged, replace=True)
+
+    def sync(self, quiz_ids):
+        """Load quizzes not yet in the index and catch up those not synced for sync_interval seconds"""
+        quiz_ids = {int(q) for q in quiz_ids if q is not None}
+        now = time.monotonic()
+        with self._lock:
+            missing = quiz_ids - set(self._scores)
+            due = {q for q in quiz_ids - missing if now - self._checked_at[q] >= self.sync_interval}
+        if missing:
+            self._load(sorted(missing))
+        if due:
+            self._catch_up(sorted(due))
+
+    def add_score(self, quiz_id, score, performance_id):
+        """Insert a newly committed attempt; unloaded quizzes pick it up on first load"""
+        quiz_id = int(quiz_id)
+        with self._lock:
+            if quiz_id in self._loading:
+                self._loading[quiz_id][1][performance_id] = score
+            if quiz_id in self._scores:
+                self._insert(quiz_id, performance_id, score)
+
+    def invalidate(self, quiz_id=None):
+        """Drop one quiz (or every quiz) so it is reloaded from the database"""
+        with self._lock:
+            if quiz_id is None:
+                for state in (self._scores, self._synced_upto, self._added, self._checked_at):
+                    state.clear()
+            else:
+                self._drop(int(quiz_id))
+
+    def _lookup(self, quiz_id, score):
+        scores = self._scores.get(int(quiz_id))
+        if not scores:
             return None
-            
-        # Calculate how many scores are lower than the user's
-        lower_scores = sum(1 for score in all_scores if score < user_perf.score)
-        
-        # Calculate percentile
-        percentile = (lower_scores / len(all_scores)) * 100
-        
-        return round(percentile, 1)
-    except Exception as e:
-        print(f"Error calculating percentile: {str(e)}")
+        # Share of attempts that scored strictly lower than `score`
+        lower_scores = bisect_left(scores, score)
+        return round(lower_scores / len(scores) * 100, 1)
+
+    def percentile(self, quiz_id, score):
+        """Percentile of `score` among all attempts of a quiz"""
+        self.sync([quiz_id])
+        with self._lock:
+            return self._lookup(quiz_id, score)
+
+    def percentiles(self, pairs):
+        """Bulk lookup: [(quiz_id, score), ...] -> [percentile, ...]"""
+        pairs = list(pairs)
+        self.sync(quiz_id for quiz_id, _ in pairs)
+        with self._lock:
+            return [self._lookup(quiz_id, score) for quiz_id, score in pairs]
+
+    def scores_for(self, quiz_id):
+        """Return a copy of the sorted score array for a quiz"""
+        self.sync([quiz_id])
+        with self._lock:
+            return list(self._scores.get(int(quiz_id), []))
+
+    def distributions(self, quiz_ids):
+        """Copies of the sorted score arrays of several quizzes: {quiz_id: [score, ...]}"""
+        quiz_ids = [int(q) for q in quiz_ids]
+        self.sync(quiz_ids)
+        with self._lock:
+            return {quiz_id: list(self._scores.get(quiz_id, [])) for quiz_id in quiz_ids}
+
+
+percentile_index = QuizPercentileIndex(sync_interval=app.config['PERCENTILE_SYNC_SECONDS'])
+
+def load_leaderboard_rows(after_id):
+    """Best score per (user, quiz) over attempts after `after_id`, for Leaderboards"""
+    upto = db.session.query(db.func.max(Performance.id)).scalar() or 0
+    rows = db.session.query(
+        Performance.RegistrationUser_id,
+        Performance.Quizzes_id,
+        Quizzes.chapter_id,
+        Chapters.subject_id,
+        db.func.max(Performance.score)
+    ).join(
+        Quizzes, Performance.Quizzes_id == Quizzes.id
+    ).outerjoin(
+        Chapters, Quizzes.chapter_id == Chapters.id
+    ).filter(
+        Performance.id > after_id,
+        Performance.id <= upto,
+        # Only registered users are ranked, not attempts stored as 'admin'
+        db.func.typeof(Performance.RegistrationUser_id) == 'integer'
+    ).group_by(
+        Performance.RegistrationUser_id,
+        Performance.Quizzes_id
+    ).all()
+    return [tuple(row) for row in rows], upto
+
+leaderboards = Leaderboards(
+    load_leaderboard_rows,
+    sync_interval=app.config['LEADERBOARD_SYNC_SECONDS'],
+    max_age=app.config['LEADERBOARD_MAX_AGE']
+)
+print(f"Leaderboard backend: {leaderboards.configure(app.config['LEADERBOARD_BACKEND'], app.config['LEADERBOARD_REDIS_URL'])}")
+
+def leaderboard_usernames(user_ids):
+    return dict(db.session.query(RegistrationUser.id, RegistrationUser.username).filter(RegistrationUser.id.in_(user_ids)))
+
+def parse_leaderboard(scope, scope_id):
+    """The board key for a URL, or None if it does not name a board"""
+    if scope not in LEADERBOARD_SCOPES or (scope == 'global') != (scope_id == 0):
         return None
+    return scope, scope_id
 
-# Add new functions for report generation
-def generate_performance_report_html(user_id, month=None, year=None):
-    """Generate an HTML report of user performance, optionally filtered by month"""
+@app.route('/api/leaderboards/global', defaults={'scope': 'global', 'scope_id': 0}, methods=['GET'])
+@app.route('/api/leaderboards/<scope>/<int:scope_id>', methods=['GET'])
+@jwt_required()
+def get_leaderboard(scope, scope_id):
+    """One page of a quiz, chapter, subject or the global leaderboard"""
     try:
-        # Get user info
-        user = RegistrationUser.query.get_or_404(user_id)
+        board = parse_leaderboard(scope, scope_id)
+        if board is None:
+            return jsonify({'message': f"Unknown leaderboard, scope must be one of {', '.join(LEADERBOARD_SCOPES)}"}), 404
         
-        # Apply time filtering if month is specified
-        if month and year:
-            # Convert month name to number
-            import calendar
-            if isinstance(month, str):
-                try:
-                    month_num = list(calendar.month_name).index(month.title())
-                except ValueError:
-                    # Try with month abbreviation
-                    month_num = list(calendar.month_abbr).index(month.title()[:3])
-            else:
-                month_num = month
-                
-            # Filter performances by month and year
-            from sqlalchemy import extract
-            performances = Performance.query.filter(
-                Performance.RegistrationUser_id == user_id,
-                extract('month', Performance.attempted_at) == month_num,
-                extract('year', Performance.attempted_at) == year
-            ).all()
-            
-            report_title = f"Monthly Performance Report - {calendar.month_name[month_num]} {year}"
-        else:
-            # Get all performances for this user
-            performances = Performance.query.filter_by(RegistrationUser_id=user_id).all()
-            report_title = "Performance Report"
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = request.args.get('per_page', app.config['LEADERBOARD_PAGE_SIZE'], type=int)
+        per_page = min(max(per_page, 1), app.config['LEADERBOARD_MAX_PAGE_SIZE'])
         
-        if not performances:
-            if month and year:
-                return f"<h1>No quiz data available for {calendar.month_name[month_num]} {year}</h1><p>You haven't taken any quizzes during this period.</p>"
-            else:
-                return "<h1>No quiz data available</h1><p>You haven't taken any quizzes yet.</p>"
+        total, entries = leaderboards.top(scope, scope_id, (page - 1) * per_page, per_page)
+        usernames = leaderboard_usernames([user_id for _, user_id, _ in entries])
         
-        # Convert to DataFrame for easier analysis
-        data = []
-        for perf in performances:
-            quiz = Quizzes.query.get(perf.Quizzes_id)
-            if not quiz:
-                continue
-                
-            chapter = Chapters.query.get(quiz.chapter_id)
-            subject = Subject.query.get(chapter.subject_id) if chapter else None
-            
-            data.append({
-                'quiz_id': perf.Quizzes_id,
-                'quiz_name': quiz.quiz_name,
-                'chapter_name': chapter.chapter_name if chapter else 'Unknown',
-                'subject_name': subject.name if subject else 'Unknown',
-                'score': perf.score,
-                'date': perf.attempted_at.strftime('%Y-%m-%d'),
-                'percentile': calculate_percentile(user_id, perf.Quizzes_id) or 0
-            })
+        return jsonify({
+            'scope': scope,
+            'scope_id': scope_id,
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'entries': [{
+                'rank': rank,
+                'user_id': user_id,
+                'username': usernames.get(user_id),
+                'score': round(score, 2)
+            } for rank, user_id, score in entries]
+        }), 200
+    except Exception as e:
+        print(f"Error getting leaderboard: {str(e)}")
+        return jsonify({'message': 'Error getting leaderboard', 'error': str(e)}), 500
+
+@app.route('/api/leaderboards/global/users/<int:user_id>', defaults={'scope': 'global', 'scope_id': 0}, methods=['GET'])
+@app.route('/api/leaderboards/<scope>/<int:scope_id>/users/<int:user_id>', methods=['GET'])
+@jwt_required()
+def get_leaderboard_rank(scope, scope_id, user_id):
+    """A single user's rank on a leaderboard"""
+    try:
+        board = parse_leaderboard(scope, scope_id)
+        if board is None:
+            return jsonify({'message': f"Unknown leaderboard, scope must be one of {', '.join(LEADERBOARD_SCOPES)}"}), 404
         
-        # Create a DataFrame
-        df = pd.DataFrame(data)
-        
-        # Generate a base64 encoded image of subject performance
-        subject_plot_base64 = None
-        if not df.empty:
-            plt.figure(figsize=(10, 6))
-            subject_avg = df.groupby('subject_name')['score'].mean().sort_values(ascending=False)
-            subject_avg.plot(kind='bar', color='skyblue')
-            plt.title('Average Score by Subject')
-            plt.ylabel('Score (%)')
-            plt.xlabel('Subject')
-            plt.tight_layout()
-            
-            # Save plot to a bytes buffer
-            buf = BytesIO()
-            plt.savefig(buf, format='png')
-            buf.seek(0)
-            subject_plot_base64 = base64.b64encode(buf.read()).decode('utf-8')
-            plt.close()
-        
-        # Generate a base64 encoded image of score trend
-        trend_plot_base64 = None
-        if len(df) > 1:
-            plt.figure(figsize=(10, 6))
-            df_sorted = df.sort_values('date')
-            plt.plot(df_sorted['date'], df_sorted['score'], marker='o', linestyle='-', color='green')
-            plt.title('Score Trend Over Time')
-            plt.ylabel('Score (%)')
-            plt.xlabel('Date')
-            plt.grid(True, linestyle='--', alpha=0.7)
-            plt.tight_layout()
-            
-            # Save plot to a bytes buffer
-            buf = BytesIO()
-            plt.savefig(buf, format='png')
-            buf.seek(0)
-            trend_plot_base64 = base64.b64encode(buf.read()).decode('utf-8')
-            plt.close()
-        
-        # Summary statistics
-        avg_score = df['score'].mean()
-        highest_score = df['score'].max()
-        total_quizzes = len(df)
-        avg_percentile = df['percentile'].mean()
-        
-        # Generate HTML content
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>{report_title} for {user.fullname}</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; color: #333; }}
-                .header {{ background-color: #4a6bdf; color: white; padding: 20px; text-align: center; margin-bottom: 30px; }}
-                .section {{ margin-bottom: 30px; }}
-                h1, h2, h3 {{ color: #4a6bdf; }}
-                table {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}
-                th, td {{ padding: 12px 15px; border-bottom: 1px solid #ddd; text-align: left; }}
-                th {{ background-color: #f8f9fa; }}
-                tr:hover {{ background-color: #f1f1f1; }}
-                .summary-cards {{ display: flex; justify-content: space-between; flex-wrap: wrap; margin: 20px 0; }}
-                .card {{ background-color: #f8f9fa; border-radius: 8px; padding: 15px; width: 22%; min-width: 200px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); margin-bottom: 15px; }}
-                .card h3 {{ margin-top: 0; font-size: 16px; }}
-                .card p {{ font-size: 24px; font-weight: bold; color: #4a6bdf; margin: 5px 0; }}
-                .plot-container {{ text-align: center; margin: 30px 0; }}
-                img {{ max-width: 100%; height: auto; }}
-                footer {{ text-align: center; margin-top: 50px; font-size: 12px; color: #666; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>{report_title}</h1>
-                <p>Generated for {user.fullname} on {datetime.now().strftime('%Y-%m-%d')}</p>
-            </div>
-            
-            <div class="section">
-                <h2>Performance Summary</h2>
-                <div class="summary-cards">
-                    <div class="card">
-                        <h3>Average Score</h3>
-                        <p>{avg_score:.1f}%</p>
-                    </div>
-                    <div class="card">
-                        <h3>Highest Score</h3>
-                        <p>{highest_score:.1f}%</p>
-                    </div>
-                    <div class="card">
-                        <h3>Total Quizzes</h3>
-                        <p>{total_quizzes}</p>
-                    </div>
-                    <div class="card">
-                        <h3>Average Percentile</h3>
-                        <p>{avg_percentile:.1f}%</p>
-                    </div>
-                </div>
-            </div>
-            
-            <div class="section">
-                <h2>Performance by Subject</h2>
-                {f'<div class="plot-container"><img src="data:image/png;base64,{subject_plot_base64}" alt="Subject Performance" /></div>' if subject_plot_base64 else '<p>Not enough data to generate subject performance chart.</p>'}
-            </div>
-            
-            <div class="section">
-                <h2>Performance Trend</h2>
-                {f'<div class="plot-container"><img src="data:image/png;base64,{trend_plot_base64}" alt="Score Trend" /></div>' if trend_plot_base64 else '<p>Not enough data to generate performance trend chart.</p>'}
-            </div>
-            
-            <div class="section">
-                <h2>Detailed Quiz Results</h2>
-                <table>
-                    <thead>
-                        <tr>
-                            <th>Date</th>
-                            <th>Subject</th>
-                            <th>Chapter</th>
-                            <th>Quiz</th>
-                            <th>Score</th>
-                            <th>Percentile</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-                        {''.join(f"<tr><td>{row['date']}</td><td>{row['subject_name']}</td><td>{row['chapter_name']}</td><td>{row['quiz_name']}</td><td>{row['score']:.1f}%</td><td>{row['percentile']:.1f}%</td></tr>" for _, row in df.iterrows())}
-                    </tbody>
-                </table>
-            </div>
-            
-            <footer>
-                <p>This report was automatically generated by Quiz Master.</p>
-                <p>&copy; {datetime.now().year} Quiz Master. All rights reserved.</p>
-            </footer>
-        </body>
-        </html>
-        """
+        found = leaderboards.rank(scope, scope_id, user_id)
+        if found is None:
+            return jsonify({'message': 'User has no attempts on this leaderboard'}), 404
+        rank, score, total = found
         
-        return html_content
+        return jsonify({
+            'scope': scope,
+            'scope_id': scope_id,
+            'user_id': user_id,
+            'rank': rank,
+            'score': round(score, 2),
+            'total': total
+        }), 200
+    except Exception as e:
+        print(f"Error getting leaderboard rank: {str(e)}")
+        return jsonify({'message': 'Error getting leaderboard rank', 'error': str(e)}), 500
+
+# Add new functions for report generation
+def parse_report_month(month):
+    """Month number from a number, a month name or an abbreviation"""
+    if isinstance(month, str):
+        if month.isdigit():
+            return int(month)
+        try:
+            return list(calendar.month_name).index(month.title())
+        except ValueError:
+            # Try with month abbreviation
+            return list(calendar.month_abbr).index(month.title()[:3])
+    return int(month)
+
+def report_period(month, year):
+    """(month number, start, end, title) of a calendar month report; end is exclusive"""
+    month_num = parse_report_month(month)
+    start = datetime(int(year), month_num, 1)
+    end = datetime(int(year) + 1, 1, 1) if month_num == 12 else datetime(int(year), month_num + 1, 1)
+    return month_num, start, end, f"Monthly Performance Report - {calendar.month_name[month_num]} {year}"
+
+def build_performance_report_html(user_id, month=None, year=None):
+    """Build the HTML report of user performance, optionally filtered by month"""
+    # Get user info
+    user = RegistrationUser.query.get_or_404(user_id)
+    
+    # Apply time filtering if month is specified
+    if month and year:
+        month_num, start, end, report_title = report_period(month, year)
+    else:
+        start = end = None
+        report_title = "Performance Report"
+    
+    # All attempts in the period in one query, with percentiles from the
+    # in-memory index
+    df = load_report_frame(db.session, user_id, start=start, end=end, percentile_lookup=percentile_index.percentiles)
+    
+    if df.empty:
+        if month and year:
+            return f"<h1>No quiz data available for {calendar.month_name[month_num]} {year}</h1><p>You haven't taken any quizzes during this period.</p>"
+        else:
+            return "<h1>No quiz data available</h1><p>You haven't taken any quizzes yet.</p>"
+    
+    report = summarize_report_frame(df)
+    
+    # Charts come from the shared renderer; unchanged data is served from its cache
+    return build_report_html(user.fullname, report_title, report, report_charts)
+
+def generate_performance_report_html(user_id, month=None, year=None):
+    """Generate an HTML report of user performance, optionally filtered by month"""
+    try:
+        return build_performance_report_html(user_id, month, year)
     except Exception as e:
         print(f"Error generating performance report: {str(e)}")
         import traceback
         traceback.print_exc()
         return f"<h1>Error Generating Report</h1><p>{str(e)}</p>"
 
-def generate_performance_report_pdf(user_id):
-    """Generate a PDF report from the HTML report"""
+class ReportStore:
+    """Generated reports (HTML and PDF bytes) keyed by (user_id, period, latest attempt id).
+
+    The key names the exact data a report was built from, so a stored report
+    is served until the user makes a new attempt. write_submission_batch then
+    drops that user's entries to free the space early. Bounded in bytes, least
+    recently used first.
+    """
+
+    def __init__(self, max_bytes):
+        self._cache = LRUCache(max_bytes=max_bytes, sizeof=lambda artifact: len(artifact[0]) + len(artifact[1] or b''))
+    
+    @staticmethod
+    def key(user_id, month=None, year=None):
+        period = report_period_key(month, year) if month and year else 'all'
+        latest_attempt_id = db.session.query(db.func.max(Performance.id)).filter(
+            Performance.RegistrationUser_id == user_id
+        ).scalar() or 0
+        return (user_id, period, latest_attempt_id)
+    
+    @staticmethod
+    def month_keys(month, year, first_user_id=None, last_user_id=None):
+        """{user_id: key} for a month's reports of every user in an id range, from one grouped query"""
+        period = report_period_key(month, year)
+        query = db.session.query(Performance.RegistrationUser_id, db.func.max(Performance.id)).filter(
+            db.func.typeof(Performance.RegistrationUser_id) == 'integer'
+        )
+        if first_user_id is not None:
+            query = query.filter(Performance.RegistrationUser_id >= first_user_id)
+        if last_user_id is not None:
+            query = query.filter(Performance.RegistrationUser_id <= last_user_id)
+        return {
+            user_id: (user_id, period, latest_attempt_id)
+            for user_id, latest_attempt_id in query.group_by(Performance.RegistrationUser_id)
+        }
+    
+    def lookup(self, key):
+        """(html, pdf bytes or None) stored under key; (None, None) when nothing is"""
+        return self._cache.get(key, (None, None))
+    
+    def put(self, key, html, pdf=None):
+        self._cache.put(key, (html, pdf))
+    
+    def get_or_build(self, user_id, month=None, year=None, with_pdf=False):
+        """(html, pdf bytes or None) for a report, building only what is not stored yet"""
+        key = self.key(user_id, month, year)
+        html, pdf = self.lookup(key)
+        if html is None:
+            html = build_performance_report_html(user_id, month, year)
+        if with_pdf and pdf is None:
+            pdf = pdf_renderer.render(html, timeout=app.config['PDF_RENDER_TIMEOUT'])
+        self.put(key, html, pdf)
+        return html, pdf
+    
+    def invalidate_user(self, user_id):
+        self._cache.discard_where(lambda key: key[0] == user_id)
+    
+    def clear(self):
+        self._cache.clear()
+
+report_store = ReportStore(max_bytes=app.config['REPORT_STORE_MAX_BYTES'])
+
+def generate_performance_report_pdf(user_id, month=None, year=None):
+    """Generate a PDF report from the HTML report; returns the PDF bytes or None"""
     try:
-        html_content = generate_performance_report_html(user_id)
-        
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
-            # Generate PDF
-            HTML(string=html_content).write_pdf(tmp.name)
-            tmp_path = tmp.name
-            
-        # Read the PDF file
-        with open(tmp_path, 'rb') as f:
-            pdf_data = f.read()
-            
-        # Delete temporary file
-        import os
-        os.unlink(tmp_path)
-        
-        return pdf_data
+        # Reuses a stored HTML/PDF for unchanged data; rendering happens in
+        # the renderer pool straight to bytes
+        return report_store.get_or_build(user_id, month, year, with_pdf=True)[1]
+    except RendererBusy:
+        raise
     except Exception as e:
         print(f"Error generating PDF report: {str(e)}")
         import traceback
         traceback.print_exc()
         return None
 
+def report_period_key(month, year):
+    return f"{int(year):04d}-{parse_report_month(month):02d}"
+
+def delivered_report_users(period, first_user_id=None, last_user_id=None):
+    """Ids of the users whose report for period (YYYY-MM) was already sent"""
+    query = db.session.query(ReportDelivery.user_id).filter(ReportDelivery.period == period)
+    if first_user_id is not None:
+        query = query.filter(ReportDelivery.user_id >= first_user_id)
+    if last_user_id is not None:
+        query = query.filter(ReportDelivery.user_id <= last_user_id)
+    return {user_id for user_id, in query}
+
+@retry_on_locked(
+    attempts=app.config['SQLITE_LOCK_RETRIES'],
+    delay=app.config['SQLITE_LOCK_RETRY_DELAY_MS'] / 1000
+)
+def record_report_delivery(period, user_id):
+    try:
+        db.session.execute(sqlite_insert(ReportDelivery).values(
+            period=period, user_id=user_id, sent_at=datetime.utcnow()
+        ).on_conflict_do_nothing())
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+def monthly_report_shards(month, year, shard_size):
+    """
+    Split the users still waiting for a month's report into id ranges.
+
+    Returns [(first_user_id, last_user_id, users), ...] with at most
+    shard_size such users per range: active users with attempts in the month
+    and no delivery recorded yet.
+    """
+    _, start, end, _ = report_period(month, year)
+    delivered = delivered_report_users(report_period_key(month, year))
+    user_ids = [user_id for user_id, in db.session.query(Performance.RegistrationUser_id).join(
+        RegistrationUser, RegistrationUser.id == Performance.RegistrationUser_id
+    ).filter(
+        Performance.attempted_at >= start,
+        Performance.attempted_at < end,
+        RegistrationUser.active == True
+    ).distinct().order_by(Performance.RegistrationUser_id) if user_id not in delivered]
+    return [
+        (user_ids[i], user_ids[min(i + shard_size, len(user_ids)) - 1], min(shard_size, len(user_ids) - i))
+        for i in range(0, len(user_ids), shard_size)
+    ]
+
+def load_monthly_reports(month, year, first_user_id=None, last_user_id=None, exclude=()):
+    """
+    Report data of every active user with attempts in a month.
+
+    Returns (title, iterator of (user, report)); users in exclude are skipped. The month's attempts of all
+    users are read with one query, the score distributions of the quizzes
+    involved are taken from the percentile index in one go, and the figures
+    of every user are computed together (report_data.user_reports). Users
+    without attempts in the month never appear.
+    """
+    _, start, end, title = report_period(month, year)
+    frame = load_period_frame(db.session, start, end, first_user_id, last_user_id)
+    if frame.empty:
+        return title, iter(())
+    add_percentiles(frame, percentile_index.distributions(frame['quiz_id'].unique().tolist()))
+    
+    users = db.session.query(RegistrationUser.id, RegistrationUser.fullname, RegistrationUser.email).filter(
+        RegistrationUser.active == True
+    )
+    if first_user_id is not None:
+        users = users.filter(RegistrationUser.id >= first_user_id)
+    if last_user_id is not None:
+        users = users.filter(RegistrationUser.id <= last_user_id)
+    users = {user.id: user for user in users}
+    
+    return title, (
+        (users[user_id], report) for user_id, report in user_reports(frame)
+        if user_id in users and user_id not in exclude
+    )
+
+def monthly_report_message(user, month_name, year, pdf_data):
+    """The monthly report email with the PDF attached"""
+    msg = Message(
+        subject=f"Quiz Master Monthly Performance Report - {month_name} {year}",
+        recipients=[user.email],
+        body=f"Please find attached your performance report for {month_name} {year}.",
+        html=f"""
+        <html>
+        <body>
+            <h2>Your Monthly Performance Report</h2>
+            <p>Hello {user.fullname},</p>
+            <p>Please find attached your Quiz Master performance report for {month_name} {year}.</p>
+            <p>This report includes a summary of your quiz activities, scores, and comparisons with other students.</p>
+            <p>Thank you for using Quiz Master!</p>
+        </body>
+        </html>
+        """
+    )
+    msg.attach(
+        filename=f"performance_report_{month_name}_{year}.pdf",
+        content_type="application/pdf",
+        data=pdf_data
+    )
+    return msg
+
+def send_monthly_report_emails(month, year, first_user_id=None, last_user_id=None, on_progress=None):
+    """
+    Email the monthly report to every active user who took a quiz that month.
+
+    Report data comes from load_monthly_reports. Reports already in
+    report_store (e.g. downloaded since the last attempt) are mailed as they
+    are; the others are rendered by render_report in the renderer pool while
+    finished PDFs are mailed, with at most PDF_RENDER_MAX_PENDING reports in
+    flight, and stored for later downloads. Every send is recorded
+    in report_delivery straight away and users already recorded are skipped,
+    so the run can be repeated after a crash. on_progress(counts) is called
+    after each finished send. Returns the counts.
+    """
+    started = time.perf_counter()
+    month_name = calendar.month_name[parse_report_month(month)]
+    period = report_period_key(month, year)
+    delivered = delivered_report_users(period, first_user_id, last_user_id)
+    # Keys are read before the report data, so a report never claims newer
+    # attempts than it was built from; a user whose first attempt lands in
+    # between has no key and is simply not stored
+    keys = report_store.month_keys(month, year, first_user_id, last_user_id)
+    title, reports = load_monthly_reports(month, year, first_user_id, last_user_id, exclude=delivered)
+    counts = {'reports': 0, 'successful_sends': 0, 'failed_sends': 0, 'skipped': len(delivered)}
+    pending = {}
+    
+    def send(user, pdf_data):
+        try:
+            mail_pool.send(monthly_report_message(user, month_name, year, pdf_data))
+        except Exception as e:
+            print(f"Error sending monthly report to user {user.id}: {str(e)}")
+            counts['failed_sends'] += 1
+            return
+        counts['successful_sends'] += 1
+        record_report_delivery(period, user.id)
+        if on_progress:
+            on_progress(counts)
+    
+    def finish(futures):
+        for future in futures:
+            user = pending.pop(future)
+            try:
+                html, pdf_data = future.result()
+            except Exception as e:
+                print(f"Error rendering monthly report for user {user.id}: {str(e)}")
+                counts['failed_sends'] += 1
+                continue
+            if user.id in keys:
+                report_store.put(keys[user.id], html, pdf_data)
+            send(user, pdf_data)
+    
+    for user, report in reports:
+        counts['reports'] += 1
+        pdf_data = report_store.lookup(keys[user.id])[1] if user.id in keys else None
+        if pdf_data is not None:
+            send(user, pdf_data)
+            continue
+        while True:
+            if len(pending) >= pdf_renderer.max_pending:
+                finish(wait_futures(pending, return_when=FIRST_COMPLETED).done)
+            try:
+                pending[pdf_renderer.submit(render_report, user.fullname, title, report)] = user
+                break
+            except RendererBusy:
+                # Slots are shared with report downloads in this process
+                if pending:
+                    finish(wait_futures(pending, return_when=FIRST_COMPLETED).done)
+                else:
+                    time.sleep(0.1)
+    finish(wait_futures(pending).done)
+    
+    counts['seconds'] = round(time.perf_counter() - started, 1)
+    print(f"Monthly reports for {month_name} {year}: {counts}")
+    return counts
+
 # Add new routes for reports
 @app.route('/api/user/<int:user_id>/email-report', methods=['POST'])
 # @jwt_required()  # Uncomment after testing
@@ -1848,8 +3484,12 @@ def email_performance_report(user_id):
         print(f"Preparing to send email to: {user.email}")
         print(f"Using mail configuration: {app.config['MAIL_USERNAME']}")
         
-        # Generate HTML report
-        html_content = generate_performance_report_html(user_id)
+        # The stored report serves as both the message body and the PDF attachment
+        html_content, _ = report_store.get_or_build(user_id)
+        try:
+            pdf_data = generate_performance_report_pdf(user_id)
+        except RendererBusy:
+            return jsonify({'message': 'Too many reports are being generated right now, please retry'}), 503
         
         # Create message
         msg = Message(
@@ -1858,8 +3498,7 @@ def email_performance_report(user_id):
             html=html_content
         )
         
-        # Generate PDF attachment
-        pdf_data = generate_performance_report_pdf(user_id)
+        # Attach the PDF
         if pdf_data:
             msg.attach(
                 filename="performance_report.pdf",
@@ -1869,7 +3508,7 @@ def email_performance_report(user_id):
         
         # Send email with specific error handling
         try:
-            mail.send(msg)
+            mail_pool.send(msg)
             print(f"Email sent successfully to {user.email}")
         except Exception as mail_error:
             print(f"Mail sending error: {str(mail_error)}")
@@ -1892,7 +3531,10 @@ def email_performance_report(user_id):
 def download_performance_report(user_id):
     try:
         # Generate PDF
-        pdf_data = generate_performance_report_pdf(user_id)
+        try:
+            pdf_data = generate_performance_report_pdf(user_id)
+        except RendererBusy:
+            return jsonify({'message': 'Too many reports are being generated right now, please retry'}), 503
         
         if not pdf_data:
             return jsonify({'message': 'Error generating PDF report'}), 500
@@ -1913,23 +3555,9 @@ def download_performance_report(user_id):
         return jsonify({'message': 'Error downloading performance report', 'error': str(e)}), 500
 
 # Add this function near the other email-related functions
-def send_quiz_notification_emails(quiz_id):
-    """Send email notifications to all active users about a new quiz"""
-    try:
-        # Get quiz details
-        quiz = Quizzes.query.get_or_404(quiz_id)
-        chapter = Chapters.query.get_or_404(quiz.chapter_id)
-        subject = Subject.query.get_or_404(chapter.subject_id)
-        
-        # Get all active users
-        users = RegistrationUser.query.filter_by(active=True).all()
-        
-        if not users:
-            print("No active users to notify")
-            return
-            
-        # Create message template
-        html_content = f"""
+def quiz_notification_html(quiz, chapter, subject):
+    """Body of the new-quiz notification email"""
+    return f"""
         <html>
         <head>
             <style>
@@ -1958,7 +3586,7 @@ def send_quiz_notification_emails(quiz_id):
                 
                 <p>Don't miss this opportunity to test your knowledge!</p>
                 
-                <a href="http://localhost:8080/quiz/{quiz_id}" class="button">Take Quiz Now</a>
+                <a href="http://localhost:8080/quiz/{quiz.id}" class="button">Take Quiz Now</a>
             </div>
             <div class="footer">
                 <p>This is an automatic notification from Quiz Master. Please do not reply to this email.</p>
@@ -1966,26 +3594,169 @@ def send_quiz_notification_emails(quiz_id):
         </body>
         </html>
         """
-        
-        # Send emails in batches to avoid overwhelming the mail server
-        batch_size = 20
-        for i in range(0, len(users), batch_size):
-            batch_users = users[i:i+batch_size]
-            with app.app_context():
-                msg = Message(
-                    subject=f"New Quiz Available: {quiz.quiz_name}",
-                    recipients=[user.email for user in batch_users],
-                    html=html_content
-                )
-                mail.send(msg)
-                
-            # Small delay between batches
-            import time
-            time.sleep(2)
-            
-        print(f"Sent quiz notification emails to {len(users)} users")
+
+def queue_notification(kind, subject, html, ref_id=None):
+    """
+    Queue an email to every active user in the current transaction.
+
+    Adds the message (or reuses the one already stored for kind/ref_id) and
+    one outbox row per active user with a single INSERT ... SELECT; users
+    who already have a row for the message are skipped, so queuing again
+    only reaches new users. The caller commits. Returns the rows added.
+    """
+    message = None
+    if ref_id is not None:
+        message = NotificationMessage.query.filter_by(kind=kind, ref_id=ref_id).first()
+    if message is None:
+        message = NotificationMessage(kind=kind, ref_id=ref_id, subject=subject, html=html)
+        db.session.add(message)
+        db.session.flush()
+    
+    now = datetime.utcnow()
+    recipients = db.select([
+        db.literal(message.id),
+        RegistrationUser.id,
+        RegistrationUser.email,
+        db.literal('pending'),
+        db.literal(0),
+        db.literal(now, db.DateTime)
+    ]).where(RegistrationUser.active == True)
+    return db.session.execute(sqlite_insert(NotificationOutbox).from_select(
+        ['message_id', 'user_id', 'email', 'status', 'attempts', 'next_attempt_at'], recipients
+    ).on_conflict_do_nothing()).rowcount
+
+def queue_quiz_notification(quiz):
+    """Queue the new-quiz email for the quiz (which may not be committed yet); returns the rows added"""
+    chapter = Chapters.query.get_or_404(quiz.chapter_id)
+    subject = Subject.query.get_or_404(chapter.subject_id)
+    return queue_notification(
+        'new_quiz',
+        f"New Quiz Available: {quiz.quiz_name}",
+        quiz_notification_html(quiz, chapter, subject),
+        ref_id=quiz.id
+    )
+
+@retry_on_locked(
+    attempts=app.config['SQLITE_LOCK_RETRIES'],
+    delay=app.config['SQLITE_LOCK_RETRY_DELAY_MS'] / 1000
+)
+def claim_notifications(limit):
+    """Claim up to limit due outbox rows for this worker; returns them with their message"""
+    try:
+        now = datetime.utcnow()
+        abandoned = now - timedelta(seconds=app.config['NOTIFICATION_CLAIM_TIMEOUT'])
+        claim_id = str(uuid.uuid4())
+        # One UPDATE, so concurrent workers never claim the same row
+        due = db.session.query(NotificationOutbox.id).filter(or_(
+            db.and_(NotificationOutbox.status == 'pending', NotificationOutbox.next_attempt_at <= now),
+            db.and_(NotificationOutbox.status == 'sending', NotificationOutbox.claimed_at < abandoned)
+        )).order_by(NotificationOutbox.id).limit(limit)
+        claimed = NotificationOutbox.query.filter(NotificationOutbox.id.in_(due.subquery())).update({
+            'status': 'sending',
+            'claim_id': claim_id,
+            'claimed_at': now
+        }, synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if not claimed:
+        return []
+    return db.session.query(
+        NotificationOutbox.id, NotificationOutbox.email, NotificationOutbox.attempts,
+        NotificationMessage.subject, NotificationMessage.html
+    ).join(NotificationMessage, NotificationMessage.id == NotificationOutbox.message_id).filter(
+        NotificationOutbox.claim_id == claim_id
+    ).order_by(NotificationOutbox.id).all()
+
+@retry_on_locked(
+    attempts=app.config['SQLITE_LOCK_RETRIES'],
+    delay=app.config['SQLITE_LOCK_RETRY_DELAY_MS'] / 1000
+)
+def record_notification_results(rows, errors):
+    """Mark a claimed batch: sent rows once, failures back to pending with a delay, or failed"""
+    try:
+        now = datetime.utcnow()
+        sent = [row.id for row, error in zip(rows, errors) if error is None]
+        if sent:
+            NotificationOutbox.query.filter(NotificationOutbox.id.in_(sent)).update({
+                'status': 'sent', 'sent_at': now, 'claim_id': None, 'last_error': None
+            }, synchronize_session=False)
+        for row, error in zip(rows, errors):
+            if error is None:
+                continue
+            attempts = row.attempts + 1
+            final = attempts >= app.config['NOTIFICATION_MAX_ATTEMPTS'] or not is_transient(error)
+            NotificationOutbox.query.filter_by(id=row.id).update({
+                'status': 'failed' if final else 'pending',
+                'attempts': attempts,
+                'next_attempt_at': now + timedelta(seconds=app.config['NOTIFICATION_RETRY_DELAY'] * attempts),
+                'claim_id': None,
+                'last_error': str(error)[:500]
+            }, synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+def deliver_notifications():
+    """
+    Send every due outbox row, a batch at a time; returns the counts.
+
+    Each batch is claimed, sent over one pooled SMTP connection and marked
+    in one transaction. Several workers may run this at once. If a worker
+    dies mid-batch, its rows are claimed again after
+    NOTIFICATION_CLAIM_TIMEOUT, so at most that batch can go out twice.
+    """
+    counts = {'sent': 0, 'retrying': 0, 'failed': 0}
+    while True:
+        rows = claim_notifications(app.config['NOTIFICATION_BATCH_SIZE'])
+        if not rows:
+            break
+        errors = mail_pool.send_many([
+            Message(subject=row.subject, recipients=[row.email], html=row.html) for row in rows
+        ])
+        record_notification_results(rows, errors)
+        for row, error in zip(rows, errors):
+            if error is None:
+                counts['sent'] += 1
+            elif row.attempts + 1 >= app.config['NOTIFICATION_MAX_ATTEMPTS'] or not is_transient(error):
+                counts['failed'] += 1
+            else:
+                counts['retrying'] += 1
+    if any(counts.values()):
+        print(f"Delivered notifications: {counts}")
+    return counts
+
+def drain_notification_outbox():
+    with app.app_context():
+        deliver_notifications()
+
+notification_drainer = OutboxDrainer(drain_notification_outbox, interval=app.config['NOTIFICATION_POLL_INTERVAL'])
+atexit.register(notification_drainer.stop)
+
+def dispatch_notifications():
+    """Have the outbox drained: by a Celery worker when available, otherwise by the background thread"""
+    task = celery.tasks.get('celery_worker.deliver_notifications') if celery else None
+    if task is not None and hasattr(task, 'delay'):
+        try:
+            task.delay()
+            return 'celery'
+        except Exception as e:
+            print(f"Could not queue notification delivery, using the background thread: {str(e)}")
+    notification_drainer.wake()
+    return 'thread'
+
+def send_quiz_notification_emails(quiz_id):
+    """Queue the new-quiz email for active users who have not had it yet, then deliver the outbox"""
+    try:
+        queued = queue_quiz_notification(Quizzes.query.get_or_404(quiz_id))
+        db.session.commit()
+        print(f"Queued quiz notification for {queued} users")
+        deliver_notifications()
         return True
     except Exception as e:
+        db.session.rollback()
         print(f"Error sending quiz notification emails: {str(e)}")
         import traceback
         traceback.print_exc()
@@ -1997,18 +3768,13 @@ def send_quiz_notification_emails(quiz_id):
 def admin_notify_quiz(quiz_id):
     """Admin endpoint to manually trigger quiz notifications"""
     try:
-        # Queue the notification task
-        if celery and hasattr(celery.tasks.get('celery_worker.send_quiz_notification'), 'delay'):
-            celery.tasks.get('celery_worker.send_quiz_notification').delay(quiz_id)
-            return jsonify({'message': 'Quiz notification queued successfully'}), 200
-        else:
-            # Fallback to synchronous execution
-            success = send_quiz_notification_emails(quiz_id)
-            if success:
-                return jsonify({'message': 'Quiz notification sent successfully'}), 200
-            else:
-                return jsonify({'message': 'Error sending quiz notifications'}), 500
+        # Only active users who have not had this quiz's email yet are added
+        queued = queue_quiz_notification(Quizzes.query.get_or_404(quiz_id))
+        db.session.commit()
+        dispatch_notifications()
+        return jsonify({'message': 'Quiz notification queued successfully', 'users_queued': queued}), 200
     except Exception as e:
+        db.session.rollback()
         print(f"Error queuing quiz notification: {str(e)}")
         return jsonify({'message': 'Error queuing quiz notification', 'error': str(e)}), 500
 
@@ -2049,6 +3815,52 @@ def trigger_monthly_reports():
             'error': str(e)
         }), 500
 
+@app.route('/api/admin/monthly-reports/<task_id>', methods=['GET'])
+@jwt_required()
+def monthly_reports_progress(task_id):
+    """Progress of a send_monthly_reports run: shard states, running totals and throughput"""
+    if celery is None:
+        return jsonify({'status': 'error', 'message': 'Celery not available'}), 500
+    try:
+        task = celery.AsyncResult(task_id)
+        if task.state != 'SUCCESS' or task.result.get('status') != 'dispatched':
+            return jsonify({'status': task.state.lower(), 'result': task.result if task.state == 'SUCCESS' else None}), 200
+        run = task.result
+        
+        summary = celery.AsyncResult(run['summary_task_id'])
+        if summary.state == 'SUCCESS':
+            return jsonify({'status': 'finished', 'result': summary.result}), 200
+        
+        # Finished shards report their counts, running ones their PROGRESS meta
+        shards = {'pending': 0, 'running': 0, 'finished': 0}
+        totals = {'successful_sends': 0, 'failed_sends': 0, 'skipped': 0}
+        for shard_id in run['shard_task_ids']:
+            shard = celery.AsyncResult(shard_id)
+            if shard.state == 'SUCCESS':
+                shards['finished'] += 1
+            elif shard.state == 'PROGRESS':
+                shards['running'] += 1
+            else:
+                shards['pending'] += 1
+                continue
+            for key in totals:
+                totals[key] += (shard.info or {}).get(key, 0)
+        
+        seconds = max(datetime.utcnow().timestamp() - run['dispatched_at'], 0.001)
+        return jsonify({
+            'status': 'running',
+            'month': run['month'],
+            'year': run['year'],
+            'users': run['users'],
+            'shards': shards,
+            **totals,
+            'seconds': round(seconds, 1),
+            'sends_per_second': round(totals['successful_sends'] / seconds, 1)
+        }), 200
+    except Exception as e:
+        print(f"Error checking monthly reports: {str(e)}")
+        return jsonify({'message': 'Error checking monthly reports', 'error': str(e)}), 500
+
 # Add a new endpoint to send notifications to all users
 @app.route('/api/notifications/send-all', methods=['POST', 'OPTIONS'])
 @jwt_required()
@@ -2068,12 +3880,6 @@ def send_all_notifications():
         days_ahead = data.get('days_ahead', 7)  # Default to next 7 days
         include_quizzes = data.get('include_quizzes', True)
         
-        # Get all active users
-        users = RegistrationUser.query.filter_by(active=True).all()
-        
-        if not users:
-            return jsonify({'message': 'No active users to notify', 'users_notified': 0}), 200
-            
         # Find upcoming quizzes
         upcoming_quizzes = []
         if include_quizzes:
@@ -2086,20 +3892,20 @@ def send_all_notifications():
                 Quizzes.date_of_quiz <= end_date
             ).all()
         
-        # Send the notification emails
-        users_notified = send_bulk_notification_emails(
-            users=users, 
-            subject=subject,
-            message=message,
-            quizzes=upcoming_quizzes
-        )
+        # One outbox row per active user, delivered outside the request
+        users_notified = queue_notification('bulk', subject, bulk_notification_html(message, upcoming_quizzes))
+        db.session.commit()
+        if not users_notified:
+            return jsonify({'message': 'No active users to notify', 'users_notified': 0}), 200
+        dispatch_notifications()
         
         return jsonify({
-            'message': f'Notifications sent successfully to {users_notified} users',
+            'message': f'Notifications queued for {users_notified} users',
             'users_notified': users_notified,
             'quizzes_included': len(upcoming_quizzes) if include_quizzes else 0
         }), 200
     except Exception as e:
+        db.session.rollback()
         print(f"Error sending all notifications: {str(e)}")
         import traceback
         traceback.print_exc()
@@ -2108,29 +3914,28 @@ def send_all_notifications():
             'error': str(e)
         }), 500
 
-def send_bulk_notification_emails(users, subject, message, quizzes=None):
-    """Send email notifications to a list of users"""
-    try:
-        # Build the email HTML content
-        quizzes_html = ""
-        if quizzes and len(quizzes) > 0:
-            quizzes_html = "<h3>Upcoming Quizzes:</h3><ul>"
-            for quiz in quizzes:
-                chapter = Chapters.query.get(quiz.chapter_id)
-                subject_obj = Subject.query.get(chapter.subject_id) if chapter else None
-                
-                quiz_date = quiz.date_of_quiz.strftime('%Y-%m-%d')
-                quizzes_html += f"""
-                <li>
-                    <strong>{quiz.quiz_name}</strong> - {subject_obj.name if subject_obj else 'Unknown Subject'}, 
-                    Chapter: {chapter.chapter_name if chapter else 'Unknown'}<br>
-                    Date: {quiz_date}, Time Limit: {quiz.timing} minutes<br>
-                    <a href="http://localhost:8080/quiz/{quiz.id}" style="color: #4a6bdf;">Take this quiz</a>
-                </li>
-                """
-            quizzes_html += "</ul>"
-        
-        html_content = f"""
+def bulk_notification_html(message, quizzes=None):
+    """Body of an admin notification email, optionally listing upcoming quizzes"""
+    # Build the email HTML content
+    quizzes_html = ""
+    if quizzes and len(quizzes) > 0:
+        quizzes_html = "<h3>Upcoming Quizzes:</h3><ul>"
+        for quiz in quizzes:
+            chapter = Chapters.query.get(quiz.chapter_id)
+            subject_obj = Subject.query.get(chapter.subject_id) if chapter else None
+            
+            quiz_date = quiz.date_of_quiz.strftime('%Y-%m-%d')
+            quizzes_html += f"""
+            <li>
+                <strong>{quiz.quiz_name}</strong> - {subject_obj.name if subject_obj else 'Unknown Subject'}, 
+                Chapter: {chapter.chapter_name if chapter else 'Unknown'}<br>
+                Date: {quiz_date}, Time Limit: {quiz.timing} minutes<br>
+                <a href="http://localhost:8080/quiz/{quiz.id}" style="color: #4a6bdf;">Take this quiz</a>
+            </li>
+            """
+        quizzes_html += "</ul>"
+    
+    return f"""
         <html>
         <head>
             <style>
@@ -2159,37 +3964,6 @@ def send_bulk_notification_emails(users, subject, message, quizzes=None):
         </body>
         </html>
         """
-        
-        # Send emails in batches to avoid overwhelming the mail server
-        batch_size = 20
-        total_sent = 0
-        
-        for i in range(0, len(users), batch_size):
-            batch_users = users[i:i+batch_size]
-            try:
-                with app.app_context():
-                    msg = Message(
-                        subject=subject,
-                        recipients=[user.email for user in batch_users],
-                        html=html_content
-                    )
-                    mail.send(msg)
-                    total_sent += len(batch_users)
-                    print(f"Sent notification batch to {len(batch_users)} users")
-                
-                # Small delay between batches
-                import time
-                time.sleep(2)
-            except Exception as batch_error:
-                print(f"Error sending batch: {str(batch_error)}")
-                # Continue with next batch
-                
-        return total_sent
-    except Exception as e:
-        print(f"Error in send_bulk_notification_emails: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return 0
 
 # Add a new endpoint to toggle user active status
 @app.route('/api/users/<int:user_id>/toggle-status', methods=['PATCH'])
@@ -2224,35 +3998,27 @@ def admin_view_user_progress(user_id):
         # Check if the requested user exists
         user = RegistrationUser.query.get_or_404(user_id)
         
-        # Get all performances for this user
-        performances = Performance.query.filter_by(RegistrationUser_id=user_id).all()
-        
-        results = []
-        for perf in performances:
-            # Get quiz details
-            quiz = Quizzes.query.get(perf.Quizzes_id)
-            if quiz:
-                # Get chapter details
-                chapter = Chapters.query.get(quiz.chapter_id)
-                # Get subject details
-                subject = Subject.query.get(chapter.subject_id) if chapter else None
-                
-                results.append({
-                    'performance_id': perf.id,
-                    'quiz_id': perf.Quizzes_id,
-                    'quiz_name': quiz.quiz_name if quiz else 'Unknown Quiz',
-                    'chapter_name': chapter.chapter_name if chapter else 'Unknown Chapter',
-                    'subject_name': subject.name if subject else 'Unknown Subject',
-                    'score': perf.score,
-                    'attempted_at': perf.attempted_at.strftime('%Y-%m-%d %H:%M:%S'),
-                    'subject_id': chapter.subject_id if chapter else None,
-                    'chapter_id': quiz.chapter_id if quiz else None
-                })
-        
-        # Get summary statistics
-        total_quizzes = len(results)
-        avg_score = sum(perf.score for perf in performances) / total_quizzes if total_quizzes > 0 else 0
-        highest_score = max((perf.score for perf in performances), default=0)
+        try:
+            history_args = parse_history_args()
+        except ValueError:
+            return jsonify({'message': 'Dates must use the YYYY-MM-DD format'}), 400
+        
+        # Quiz, chapter and subject are resolved by the loader's single join
+        rows = load_attempt_history(user_id, start=history_args['start'], end=history_args['end'])
+        results = format_attempt_history(rows)
+        
+        # Get summary statistics; the all-time figures come from user_stats
+        stats = None
+        if history_args['start'] is None and history_args['end'] is None:
+            stats = UserStats.query.get(user_id)
+        if stats is not None:
+            total_quizzes = stats.attempt_count
+            avg_score = stats.average_score
+            highest_score = stats.max_score or 0
+        else:
+            total_quizzes = len(results)
+            avg_score = sum(row['score'] for row in rows) / total_quizzes if total_quizzes > 0 else 0
+            highest_score = max((row['score'] for row in rows), default=0)
         
         return jsonify({
             'user': {
@@ -2281,20 +4047,23 @@ def admin_view_user_progress(user_id):
 def get_quiz_summary():
     """Get overall summary statistics for quizzes"""
     try:
+        # Analytics reads use the read-only pool so long scans never hold up submissions
+        session = analytics_session()
+        
         # Get total number of quizzes
-        total_quizzes = Quizzes.query.count()
+        total_quizzes = session.query(Quizzes).count()
         
-        # Get total number of attempts
-        total_attempts = Scores.query.count()
+        # Attempt totals come from the per-quiz rollup
+        total_attempts, score_sum = session.query(
+            db.func.coalesce(db.func.sum(QuizStats.attempt_count), 0),
+            db.func.coalesce(db.func.sum(QuizStats.score_sum), 0)
+        ).one()
         
         # Get average score
-        average_score = 0
-        if total_attempts > 0:
-            average_score_query = db.session.query(db.func.avg(Performance.score)).scalar()
-            average_score = round(average_score_query or 0, 2)
+        average_score = round(score_sum / total_attempts, 2) if total_attempts > 0 else 0
         
         # Get active users (users who have taken at least one quiz)
-        active_users = db.session.query(Scores.user_id).distinct().count()
+        active_users = session.query(Scores.user_id).distinct().count()
         
         return jsonify({
             'totalQuizzes': total_quizzes,
@@ -2308,35 +4077,73 @@ def get_quiz_summary():
         traceback.print_exc()
         return jsonify({'message': 'Error getting quiz summary', 'error': str(e)}), 500
 
+def most_attempted_from_rollup(session, limit):
+    """Most attempted quizzes from the quiz_stats rollup: one row per quiz, no attempt scan"""
+    return session.query(
+        Quizzes.id,
+        Quizzes.quiz_name,
+        Chapters.chapter_name,
+        Subject.name.label('subject_name'),
+        QuizStats.attempt_count.label('attempts'),
+        (QuizStats.score_sum / QuizStats.attempt_count).label('average_score')
+    ).join(
+        QuizStats, QuizStats.quiz_id == Quizzes.id
+    ).join(
+        Chapters, Quizzes.chapter_id == Chapters.id
+    ).join(
+        Subject, Chapters.subject_id == Subject.id
+    ).filter(
+        QuizStats.attempt_count > 0
+    ).order_by(
+        db.desc(QuizStats.attempt_count)
+    ).limit(limit).all()
+
+def most_attempted_from_attempts(session, limit):
+    """Most attempted quizzes aggregated from Performance.
+
+    Attempts are grouped per quiz in a subquery before the catalogue join, so
+    each quiz joins as a single row and the counts cannot fan out.
+    """
+    per_quiz = session.query(
+        Performance.Quizzes_id.label('quiz_id'),
+        db.func.count(Performance.id).label('attempts'),
+        db.func.avg(Performance.score).label('average_score')
+    ).group_by(
+        Performance.Quizzes_id
+    ).subquery()
+    
+    return session.query(
+        Quizzes.id,
+        Quizzes.quiz_name,
+        Chapters.chapter_name,
+        Subject.name.label('subject_name'),
+        per_quiz.c.attempts,
+        per_quiz.c.average_score
+    ).join(
+        per_quiz, per_quiz.c.quiz_id == Quizzes.id
+    ).join(
+        Chapters, Quizzes.chapter_id == Chapters.id
+    ).join(
+        Subject, Chapters.subject_id == Subject.id
+    ).order_by(
+        db.desc(per_quiz.c.attempts)
+    ).limit(limit).all()
+
 @app.route('/api/admin/most-attempted-quizzes', methods=['GET'])
 @jwt_required()
 def get_most_attempted_quizzes():
     """Get the most attempted quizzes"""
     try:
+        session = analytics_session()
+        
         # Get limit parameter (default to 10)
         limit = request.args.get('limit', 10, type=int)
         
-        # Get quizzes with attempt counts
-        most_attempted = db.session.query(
-            Quizzes.id,
-            Quizzes.quiz_name,
-            Chapters.chapter_name,
-            Subject.name.label('subject_name'),
-            db.func.count(Scores.id).label('attempts'),
-            db.func.avg(Performance.score).label('average_score')
-        ).join(
-            Chapters, Quizzes.chapter_id == Chapters.id
-        ).join(
-            Subject, Chapters.subject_id == Subject.id
-        ).join(
-            Scores, Scores.quiz_id == Quizzes.id
-        ).join(
-            Performance, Performance.Quizzes_id == Quizzes.id
-        ).group_by(
-            Quizzes.id
-        ).order_by(
-            db.desc('attempts')
-        ).limit(limit).all()
+        # Read attempt counts straight from the per-quiz rollup
+        most_attempted = most_attempted_from_rollup(session, limit)
+        if not most_attempted and session.query(Performance.id).first() is not None:
+            # Rollup not backfilled yet (see `flask rebuild-quiz-stats`)
+            most_attempted = most_attempted_from_attempts(session, limit)
         
         result = [{
             'id': quiz.id,
@@ -2359,17 +4166,14 @@ def get_most_attempted_quizzes():
 def get_highest_scores():
     """Get highest scores for each quiz"""
     try:
+        session = analytics_session()
+        
         # Get limit parameter (default to 10)
         limit = request.args.get('limit', 10, type=int)
         
-        # Subquery to get maximum score for each quiz
-        subquery = db.session.query(
-            Performance.Quizzes_id,
-            db.func.max(Performance.score).label('max_score')
-        ).group_by(Performance.Quizzes_id).subquery()
-        
-        # Get the highest scores with user info
-        highest_scores = db.session.query(
+        # The rollup already knows each quiz's maximum; only the matching
+        # attempts are looked up to attach the user
+        highest_scores = session.query(
             Performance.Quizzes_id,
             Performance.RegistrationUser_id.label('user_id'),
             Performance.score,
@@ -2377,9 +4181,9 @@ def get_highest_scores():
             Quizzes.quiz_name,
             RegistrationUser.username
         ).join(
-            subquery, db.and_(
-                Performance.Quizzes_id == subquery.c.Quizzes_id,
-                Performance.score == subquery.c.max_score
+            QuizStats, db.and_(
+                Performance.Quizzes_id == QuizStats.quiz_id,
+                Performance.score == QuizStats.max_score
             )
         ).join(
             Quizzes, Performance.Quizzes_id == Quizzes.id
@@ -2410,34 +4214,30 @@ def get_highest_scores():
 def get_quiz_participation_timeline():
     """Get quiz participation data over time for chart"""
     try:
+        session = analytics_session()
+        
         # Get days parameter (default to 30)
         days = request.args.get('days', 30, type=int)
         
-        # Get scores grouped by date
-        from datetime import datetime, timedelta
-        end_date = datetime.now()
+        granularity = parse_timeline_granularity(days)
+        if granularity is None:
+            return jsonify({'message': 'granularity must be one of day, week, month or auto'}), 400
+        
+        # Attempts are stamped in UTC
+        end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        # Query to count attempts by date
-        participation_data = db.session.query(
-            db.func.date(Scores.time_stamp_of_attempt).label('date'),
-            db.func.count(Scores.id).label('attempts')
-        ).filter(
-            Scores.time_stamp_of_attempt >= start_date,
-            Scores.time_stamp_of_attempt <= end_date
-        ).group_by(
-            'date'
-        ).order_by(
-            'date'
-        ).all()
+        # One pre-aggregated row per period, whatever the attempt volume
+        participation_data = load_activity_timeline(session, start_date, end_date, granularity)
         
         # Format for chart.js
-        labels = [entry.date for entry in participation_data]
+        labels = [entry.period_start.isoformat() for entry in participation_data]
         data = [entry.attempts for entry in participation_data]
         
         return jsonify({
             'labels': labels,
-            'data': data
+            'data': data,
+            'granularity': granularity
         }), 200
     except Exception as e:
         print(f"Error getting quiz participation timeline: {str(e)}")
@@ -2450,38 +4250,42 @@ def get_quiz_participation_timeline():
 def get_subject_performance():
     """Get performance data by subject"""
     try:
+        session = analytics_session()
+        
         # Import the distinct function from SQLAlchemy
         from sqlalchemy import distinct
         
-        # Check if we have the necessary data in the tables first
-        quiz_count = Quizzes.query.count()
-        if quiz_count == 0:
-            # No quizzes in the system, return empty result
-            return jsonify([]), 200
+        subject_performance = analytics_fetch('subject_performance')
+        if subject_performance is None:
+            # Check if we have the necessary data in the tables first
+            quiz_count = session.query(Quizzes).count()
+            if quiz_count == 0:
+                # No quizzes in the system, return empty result
+                return jsonify([]), 200
+                
+            perf_count = session.query(Performance).count()
+            if perf_count == 0:
+                # No performance data, return empty result
+                return jsonify([]), 200
             
-        perf_count = Performance.query.count()
-        if perf_count == 0:
-            # No performance data, return empty result
-            return jsonify([]), 200
-        
-        # Query to get performance by subject - fixed with proper joins
-        subject_performance = db.session.query(
-            Subject.id,
-            Subject.name,
-            db.func.count(db.distinct(Quizzes.id)).label('quizzes'),
-            db.func.avg(Performance.score).label('average_score')
-        ).join(
-            Chapters, Subject.id == Chapters.subject_id
-        ).join(
-            Quizzes, Chapters.id == Quizzes.chapter_id
-        ).join(
-            Performance, Quizzes.id == Performance.Quizzes_id,
-            isouter=True  # Use left outer join to include subjects without performances
-        ).group_by(
-            Subject.id, Subject.name  # Include all non-aggregated columns
-        ).order_by(
-            db.desc('average_score')
-        ).all()
+            # Query to get performance by subject - fixed with proper joins
+            subject_performance = session.query(
+                Subject.id,
+                Subject.name,
+                db.func.count(db.distinct(Quizzes.id)).label('quizzes'),
+                db.func.avg(Performance.score).label('average_score')
+            ).join(
+                Chapters, Subject.id == Chapters.subject_id
+            ).join(
+                Quizzes, Chapters.id == Quizzes.chapter_id
+            ).join(
+                Performance, Quizzes.id == Performance.Quizzes_id,
+                isouter=True  # Use left outer join to include subjects without performances
+            ).group_by(
+                Subject.id, Subject.name  # Include all non-aggregated columns
+            ).order_by(
+                db.desc('average_score')
+            ).all()
         
         # Handle result safely
         result = [{
@@ -2505,23 +4309,23 @@ def get_subject_performance():
 def get_user_statistics():
     """Get overall user statistics"""
     try:
-        # Get total number of users
-        total_users = RegistrationUser.query.count()
+        session = analytics_session()
         
-        # Get active users (users who have taken at least one quiz)
-        active_users = db.session.query(Scores.user_id).distinct().count()
+        # Get total number of users
+        total_users = session.query(RegistrationUser).count()
         
-        # Get total quizzes taken
-        total_quizzes_taken = Scores.query.count()
+        # Active users, attempts and the score total come from the per-user summaries
+        active_users, total_quizzes_taken, score_sum = session.query(
+            db.func.count(UserStats.user_id),
+            db.func.coalesce(db.func.sum(UserStats.attempt_count), 0),
+            db.func.coalesce(db.func.sum(UserStats.score_sum), 0)
+        ).filter(UserStats.attempt_count > 0).one()
         
         # Calculate quizzes per user
         quizzes_per_user = total_quizzes_taken / total_users if total_users > 0 else 0
         
         # Get average score across all performances
-        average_score = 0
-        if total_quizzes_taken > 0:
-            average_score_query = db.session.query(db.func.avg(Performance.score)).scalar()
-            average_score = round(average_score_query or 0, 2)
+        average_score = round(score_sum / total_quizzes_taken, 2) if total_quizzes_taken > 0 else 0
         
         return jsonify({
             'totalUsers': total_users,
@@ -2540,34 +4344,31 @@ def get_user_statistics():
 def get_user_activity_timeline():
     """Get user activity data over time for chart"""
     try:
+        session = analytics_session()
+        
         # Get days parameter (default to 30)
         days = request.args.get('days', 30, type=int)
         
-        # Get user activity grouped by date
-        from datetime import datetime, timedelta
-        end_date = datetime.now()
+        granularity = parse_timeline_granularity(days)
+        if granularity is None:
+            return jsonify({'message': 'granularity must be one of day, week, month or auto'}), 400
+        
+        # Attempts are stamped in UTC
+        end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        # Query to count user logins by date (using Performance table as a proxy)
-        activity_data = db.session.query(
-            db.func.date(Performance.attempted_at).label('date'),
-            db.func.count(db.distinct(Performance.RegistrationUser_id)).label('active_users')
-        ).filter(
-            Performance.attempted_at >= start_date,
-            Performance.attempted_at <= end_date
-        ).group_by(
-            'date'
-        ).order_by(
-            'date'
-        ).all()
+        # Distinct users who attempted a quiz in each period (attempts as a proxy
+        # for logins), read from the activity rollup
+        activity_data = load_activity_timeline(session, start_date, end_date, granularity)
         
         # Format for chart.js
-        labels = [str(entry.date) for entry in activity_data]
+        labels = [entry.period_start.isoformat() for entry in activity_data]
         data = [entry.active_users for entry in activity_data]
         
         return jsonify({
             'labels': labels,
-            'data': data
+            'data': data,
+            'granularity': granularity
         }), 200
     except Exception as e:
         print(f"Error getting user activity timeline: {str(e)}")
@@ -2580,23 +4381,25 @@ def get_user_activity_timeline():
 def get_most_active_users():
     """Get the most active users"""
     try:
+        session = analytics_session()
+        
         # Get limit parameter (default to 10)
         limit = request.args.get('limit', 10, type=int)
         
-        # Get users with quiz counts and latest activity
-        most_active = db.session.query(
+        # Get users with quiz counts and latest activity from their summary rows
+        most_active = session.query(
             RegistrationUser.id,
             RegistrationUser.username,
             RegistrationUser.email,
-            db.func.count(Performance.id).label('quizzes_taken'),
-            db.func.avg(Performance.score).label('average_score'),
-            db.func.max(Performance.attempted_at).label('last_active')
+            UserStats.attempt_count.label('quizzes_taken'),
+            (UserStats.score_sum / UserStats.attempt_count).label('average_score'),
+            UserStats.last_active_at.label('last_active')
         ).join(
-            Performance, RegistrationUser.id == Performance.RegistrationUser_id
-        ).group_by(
-            RegistrationUser.id
+            UserStats, UserStats.user_id == RegistrationUser.id
+        ).filter(
+            UserStats.attempt_count > 0
         ).order_by(
-            db.desc('quizzes_taken')
+            db.desc(UserStats.attempt_count)
         ).limit(limit).all()
         
         result = [{
@@ -2620,23 +4423,27 @@ def get_most_active_users():
 def get_subject_popularity():
     """Get subject popularity among users"""
     try:
+        session = analytics_session()
+        
         # Query to get subject popularity
-        subject_popularity = db.session.query(
-            Subject.id,
-            Subject.name,
-            db.func.count(db.distinct(Quizzes.id)).label('quiz_count'),
-            db.func.count(db.distinct(Performance.RegistrationUser_id)).label('user_count')
-        ).join(
-            Chapters, Subject.id == Chapters.subject_id
-        ).join(
-            Quizzes, Chapters.id == Quizzes.chapter_id
-        ).join(
-            Performance, Quizzes.id == Performance.Quizzes_id
-        ).group_by(
-            Subject.id
-        ).order_by(
-            db.desc('user_count')
-        ).all()
+        subject_popularity = analytics_fetch('subject_popularity')
+        if subject_popularity is None:
+            subject_popularity = session.query(
+                Subject.id,
+                Subject.name,
+                db.func.count(db.distinct(Quizzes.id)).label('quiz_count'),
+                db.func.count(db.distinct(Performance.RegistrationUser_id)).label('user_count')
+            ).join(
+                Chapters, Subject.id == Chapters.subject_id
+            ).join(
+                Quizzes, Chapters.id == Quizzes.chapter_id
+            ).join(
+                Performance, Quizzes.id == Performance.Quizzes_id
+            ).group_by(
+                Subject.id
+            ).order_by(
+                db.desc('user_count')
+            ).all()
         
         result = [{
             'id': subject.id,
@@ -2652,8 +4459,147 @@ def get_subject_popularity():
         traceback.print_exc()
         return jsonify({'message': 'Error getting subject popularity', 'error': str(e)}), 500
 
+# Versioned schema migrations; these replace the bare db.create_all() at startup
+migrations = MigrationRunner(db)
+
+@migrations.migration(1, 'initial schema')
+def create_initial_schema():
+    db.create_all()
+
+@migrations.migration(2, 'scores view over performance')
+def create_scores_view():
+    ensure_attempt_schema()
+
+@migrations.migration(3, 'full-text search index')
+def create_search_index():
+    # Without FTS5 the search endpoint keeps using LIKE; the index can be
+    # created later with `flask rebuild-search-index`
+    ensure_search_index()
+
+@migrations.migration(4, 'performance.Quizzes_id foreign key')
+def add_performance_quiz_foreign_key():
+    if has_foreign_key(db.session, 'performance', 'Quizzes_id', 'quizzes'):
+        return
+    # The scores view reads performance, so it is recreated around the rebuild
+    db.session.execute(text("DROP VIEW IF EXISTS scores"))
+    rebuild_table(db.session, Performance.__table__)
+    db.session.commit()
+    ensure_attempt_schema()
+
+@migrations.migration(5, 'indexes on hot query columns')
+def add_hot_column_indexes():
+    connection = db.session.connection()
+    for model in (Performance, Questions, Chapters, Quizzes):
+        for index in model.__table__.indexes:
+            index.create(bind=connection, checkfirst=True)
+    # Refresh planner statistics so the new indexes are picked up
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+
+@migrations.migration(6, 'daily, weekly and monthly activity rollups')
+def add_activity_rollups():
+    db.create_all()
+    rebuild_activity_rollups()
+
+@migrations.migration(7, 'backfill quiz statistics')
+def backfill_quiz_stats():
+    # Databases from before the rollup existed only had it filled by hand
+    rebuild_quiz_stats()
+
+@migrations.migration(8, 'per-user statistics')
+def add_user_stats():
+    db.create_all()
+    repair_user_stats()
+
+@migrations.migration(9, 'monthly report deliveries')
+def add_report_deliveries():
+    db.create_all()
+
+@migrations.migration(10, 'notification outbox')
+def add_notification_outbox():
+    db.create_all()
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Apply pending schema migrations"""
+    applied = migrations.upgrade()
+    print(f"Applied {len(applied)} migration(s), schema is at version {migrations.current_version()}")
+
+# Tables large enough that a full scan in an analytics query is a regression
+QUERY_PLAN_HOT_TABLES = ('performance', 'questions')
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """EXPLAIN QUERY PLAN every /api/admin analytics query and fail on full scans of hot tables
+
+    Plans depend on the planner statistics, so run this against a database
+    with realistic data that has been ANALYZEd (migration 5 does it once).
+    """
+    sample_args = {}
+    user = RegistrationUser.query.first()
+    if user:
+        sample_args['user_id'] = user.id
+    token = create_access_token(identity='query-plan-check')
+    client = app.test_client()
+    failures = 0
+    
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if not rule.rule.startswith('/api/admin/') or 'GET' not in rule.methods:
+            continue
+        if not set(rule.arguments) <= set(sample_args):
+            print(f"SKIP {rule.rule} (no sample values for {', '.join(sorted(rule.arguments))})")
+            continue
+        url = rule.rule
+        for argument in rule.arguments:
+            url = url.replace(f"<int:{argument}>", str(sample_args[argument]))
+        
+        with StatementRecorder() as recorder:
+            response = client.get(url, headers={'Authorization': f'Bearer {token}'})
+        if response.status_code != 200:
+            print(f"FAIL {url}: HTTP {response.status_code}")
+            failures += 1
+            continue
+        
+        for statement, parameters in recorder.statements:
+            plan = explain_query_plan(db.session, statement, parameters)
+            scans = full_table_scans(plan, QUERY_PLAN_HOT_TABLES)
+            status = 'FAIL' if scans else 'ok  '
+            failures += bool(scans)
+            print(f"{status} {url}: {' | '.join(plan)}")
+    
+    db.session.rollback()
+    if failures:
+        print(f"{failures} query plan regression(s)")
+        raise SystemExit(1)
+    print("All admin analytics queries use indexes on hot tables")
+
+@app.cli.command('rebuild-activity-rollups')
+def rebuild_activity_rollups_command():
+    """Backfill the day/week/month activity rollups from existing attempts"""
+    days = rebuild_activity_rollups()
+    print(f"Rebuilt activity rollups covering {days} days")
+
+@app.cli.command('repair-user-stats')
+def repair_user_stats_command():
+    """Check user_stats against the attempt history and repair any drift"""
+    repaired = repair_user_stats()
+    print(f"Repaired user statistics for {repaired} users")
+
+@app.cli.command('rebuild-leaderboards')
+def rebuild_leaderboards_command():
+    """Rebuild the quiz, chapter, subject and global leaderboards from the attempt history"""
+    boards = leaderboards.rebuild()
+    print(f"Rebuilt {boards} leaderboards ({leaderboards.backend} backend)")
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Rebuild the full-text search index from the database"""
+    if ensure_search_index():
+        rebuild_search_index()
+        print("Rebuilt search index")
+
 if __name__ == '__main__':
     with app.app_context():
         # db.drop_all()
-        db.create_all()
+        migrations.upgrade()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""
+Benchmark outbound mail: one SMTP connection per message versus the pool.
+
+A local aiosmtpd server stands in for the provider; it accepts any login
+(AUTH without TLS) and counts the messages and connections it sees.
+
+- per-message: Flask-Mail's mail.send(), which connects and logs in for
+               every message.
+- pool:        mail_transport.SmtpPool.send(), pool size = threads.
+- limited:     the pool with a rate_limit.RateLimiter of --rate messages/s.
+
+All send from `threads` threads.
+
+--latency adds a delay before every server reply, as a stand-in for the
+round trips (and TLS handshakes) a remote server costs. With --accept the
+server answers 451 to messages beyond that many per second, like a
+provider's throttle; the limiter should settle just under it.
+
+Requires aiosmtpd (pip install aiosmtpd).
+
+Usage:
+    python bench_mail_transport.py [--messages 500] [--threads 2] [--latency 5] [--rate 100] [--accept 50]
+"""
+import argparse
+import asyncio
+import logging
+import socket
+import threading
+import time
+from collections import deque
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import SMTP, AuthResult
+from flask import Flask
+from flask_mail import Mail, Message
+
+from mail_transport import SmtpPool
+from rate_limit import RateLimiter
+
+
+class CountingHandler:
+    def __init__(self, accept=None):
+        self.accept = accept
+        self.reset()
+
+    def reset(self):
+        self.messages = 0
+        self.connections = 0
+        self.rejected = 0
+        self._accepted_at = deque()
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.accept:
+            now = time.monotonic()
+            while self._accepted_at and now - self._accepted_at[0] > 1:
+                self._accepted_at.popleft()
+            if len(self._accepted_at) >= self.accept:
+                self.rejected += 1
+                return '451 4.7.0 Rate limit exceeded, try again later'
+            self._accepted_at.append(now)
+        self.messages += 1
+        return '250 OK'
+
+
+class SlowSMTP(SMTP):
+    latency = 0.0
+
+    async def push(self, status):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return await super().push(status)
+
+    def connection_made(self, transport):
+        self.event_handler.connections += 1
+        super().connection_made(transport)
+
+
+class BenchController(Controller):
+    def factory(self):
+        return SlowSMTP(
+            self.handler,
+            auth_require_tls=False,
+            authenticator=lambda *args: AuthResult(success=True),
+        )
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def make_app(port):
+    app = Flask(__name__)
+    app.config.update(
+        MAIL_SERVER='127.0.0.1',
+        MAIL_PORT=port,
+        MAIL_USE_TLS=False,
+        MAIL_USE_SSL=False,
+        MAIL_USERNAME='bench',
+        MAIL_PASSWORD='bench',
+        MAIL_DEFAULT_SENDER=('Quiz Master', 'bench@example.com'),
+    )
+    return app, Mail(app)
+
+
+def messages(count):
+    return [Message(
+        subject=f"Bench {i}",
+        recipients=[f"user{i}@example.com"],
+        html="<p>Quiz Master benchmark</p>"
+    ) for i in range(count)]
+
+
+def in_threads(app, count, threads, send):
+    failed = []
+
+    def worker(share):
+        with app.app_context():
+            for message in messages(share):
+                try:
+                    send(message)
+                except Exception:
+                    failed.append(message)
+
+    workers = [threading.Thread(target=worker, args=(count // threads,)) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return len(failed)
+
+
+def per_message(app, mail, count, threads):
+    return in_threads(app, count, threads, mail.send)
+
+
+def pooled(app, mail, count, threads, limiter=None):
+    # Short retry delays so the limiter, not the retries, does the pacing
+    pool = SmtpPool(mail, size=threads, retries=10, retry_delay=0.01, limiter=limiter)
+    failed = in_threads(app, count, threads, pool.send)
+    pool.close()
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=5, help='ms before every server reply')
+    parser.add_argument('--rate', type=float, default=100, help='limiter rate, messages/s')
+    parser.add_argument('--accept', type=int, default=None, help='messages/s the server accepts')
+    args = parser.parse_args()
+
+    # aiosmtpd warns about its own deprecated login API on every AUTH
+    logging.getLogger('mail.log').setLevel(logging.ERROR)
+    SlowSMTP.latency = args.latency / 1000
+    handler = CountingHandler(args.accept)
+    port = free_port()
+    controller = BenchController(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+    try:
+        app, mail = make_app(port)
+        count = args.messages - args.messages % args.threads
+        print(f"{count} messages, {args.latency} ms per server reply, server accepts {args.accept or 'any number of'} msg/s")
+        print(f"{'transport':<14}{'s':>8}{'msg/s':>10}{'connections':>14}{'rejected':>10}{'failed':>8}")
+        runs = (
+            ('per-message', per_message),
+            ('pool', pooled),
+            ('limited', lambda *run_args: pooled(*run_args, limiter=RateLimiter(args.rate, burst=args.threads, min_rate=1))),
+        )
+        for name, run in runs:
+            handler.reset()
+            started = time.perf_counter()
+            failed = run(app, mail, count, args.threads)
+            elapsed = time.perf_counter() - started
+            print(f"{name:<14}{elapsed:>8.2f}{handler.messages / elapsed:>10.0f}{handler.connections:>14}"
+                  f"{handler.rejected:>10}{failed:>8}")
+    finally:
+        controller.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark the data side of the month-end report run (no charts, no PDF).
+
+- per-user: the single-report path, one load_report_frame query and summary
+            per user, timed on a sample of users and extrapolated.
+- batch:    load_monthly_reports' path: one query for the whole month,
+            add_percentiles from per-quiz distributions and user_reports
+            over the frame.
+
+Chart drawing and PDF rendering are left out: both paths pay them once per
+active user, in the renderer pool.
+
+Usage:
+    python bench_monthly_reports.py [--users 100000] [--attempts 1000000] [--sample 500]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from report_data import add_percentiles, load_period_frame, load_report_frame, summarize_report_frame, user_reports
+from bench_report_pipeline import SCHEMA
+
+MONTH_START = datetime(2024, 3, 1)
+MONTH_END = datetime(2024, 4, 1)
+
+
+def build(session, users, attempts, quizzes):
+    # The app also indexes attempted_at on its own (ix_performance_attempted_at)
+    for statement in SCHEMA + ["CREATE INDEX ix_performance_attempted_at ON performance (attempted_at)"]:
+        session.execute(text(statement))
+    session.execute(text("INSERT INTO subject (id, name) VALUES (:id, :name)"),
+                    [{'id': i, 'name': f"Subject {i}"} for i in range(1, 11)])
+    session.execute(text("INSERT INTO chapters (id, subject_id, chapter_name) VALUES (:id, :subject_id, :name)"),
+                    [{'id': i, 'subject_id': i % 10 + 1, 'name': f"Chapter {i}"} for i in range(1, 101)])
+    session.execute(text("INSERT INTO quizzes (id, chapter_id, quiz_name) VALUES (:id, :chapter_id, :name)"),
+                    [{'id': i, 'chapter_id': i % 100 + 1, 'name': f"Quiz {i}"} for i in range(1, quizzes + 1)])
+
+    # A quarter of the attempts fall outside the month
+    scores = {}
+    first = MONTH_START - timedelta(days=15)
+    for offset in range(0, attempts, 100000):
+        rows = [{
+            'user_id': random.randint(1, users),
+            'quiz_id': random.randint(1, quizzes),
+            'score': float(random.randint(0, 100)),
+            'attempted_at': (first + timedelta(minutes=random.randint(0, 60 * 24 * 41))).strftime('%Y-%m-%d %H:%M:%S.%f'),
+        } for _ in range(min(100000, attempts - offset))]
+        session.execute(text(
+            "INSERT INTO performance (RegistrationUser_id, Quizzes_id, score, attempted_at) "
+            "VALUES (:user_id, :quiz_id, :score, :attempted_at)"
+        ), rows)
+        for row in rows:
+            scores.setdefault(row['quiz_id'], []).append(row['score'])
+    session.commit()
+    return {quiz_id: sorted(values) for quiz_id, values in scores.items()}
+
+
+def per_user(session, distributions, user_ids):
+    def lookup(pairs):
+        return [round(bisect_left(distributions[q], s) / len(distributions[q]) * 100, 1) for q, s in pairs]
+    reports = 0
+    for user_id in user_ids:
+        frame = load_report_frame(session, user_id, MONTH_START, MONTH_END, percentile_lookup=lookup)
+        if not frame.empty:
+            summarize_report_frame(frame)
+            reports += 1
+    return reports
+
+
+def batch(session, distributions):
+    frame = load_period_frame(session, MONTH_START, MONTH_END)
+    loaded = time.perf_counter()
+    add_percentiles(frame, distributions)
+    reports = sum(1 for _ in user_reports(frame))
+    return len(frame), reports, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--attempts', type=int, default=1000000)
+    parser.add_argument('--quizzes', type=int, default=500)
+    parser.add_argument('--sample', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        with Session(engine) as session:
+            distributions = build(session, args.users, args.attempts, args.quizzes)
+            print(f"{args.users} users, {args.attempts} attempts in total")
+
+            sample = random.sample(range(1, args.users + 1), min(args.sample, args.users))
+            started = time.perf_counter()
+            per_user(session, distributions, sample)
+            per_user_time = (time.perf_counter() - started) / len(sample) * args.users
+
+            started = time.perf_counter()
+            rows, reports, loaded = batch(session, distributions)
+            finished = time.perf_counter()
+
+            print(f"{rows} attempts in the month, {reports} users with a report")
+            print(f"{'path':<24}{'s':>10}")
+            print(f"{'per-user (extrapolated)':<24}{per_user_time:>10.1f}")
+            print(f"{'batch':<24}{finished - started:>10.1f}")
+            print(f"{'  of which query':<24}{loaded - started:>10.1f}")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark the /api/admin/most-attempted-quizzes query shapes on a synthetic
+SQLite database (default 10^6 attempts).
+
+- fan-out:   the original query, joining Scores and Performance to Quizzes at
+             the same time. Every Scores row of a quiz pairs with every
+             Performance row of it, so `attempts` is inflated to n^2 and the
+             work grows quadratically with a quiz's popularity.
+- subquery:  attempts grouped per quiz before the catalogue join
+             (most_attempted_from_attempts), linear in the number of attempts.
+- rollup:    the quiz_stats read used by the endpoint (most_attempted_from_rollup),
+             independent of the number of attempts.
+
+The fan-out query is stopped after --fanout-budget seconds; its inflated
+count is shown for the single most attempted quiz instead.
+
+Usage:
+    python bench_most_attempted.py [--attempts 1000000] [--quizzes 2000] [--fanout-budget 30]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+SCHEMA = """
+CREATE TABLE subject (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE chapters (id INTEGER PRIMARY KEY, subject_id INTEGER NOT NULL, chapter_name TEXT NOT NULL);
+CREATE TABLE quizzes (id INTEGER PRIMARY KEY, chapter_id INTEGER NOT NULL, quiz_name TEXT NOT NULL);
+CREATE TABLE performance (
+    id INTEGER PRIMARY KEY,
+    RegistrationUser_id INTEGER NOT NULL,
+    Quizzes_id INTEGER NOT NULL REFERENCES quizzes (id),
+    score FLOAT NOT NULL,
+    attempted_at DATETIME NOT NULL
+);
+CREATE INDEX ix_performance_quiz_score ON performance (Quizzes_id, score);
+CREATE INDEX ix_chapters_subject_id ON chapters (subject_id);
+CREATE INDEX ix_quizzes_chapter_id ON quizzes (chapter_id);
+CREATE VIEW scores AS
+    SELECT id, Quizzes_id AS quiz_id, RegistrationUser_id AS user_id,
+           attempted_at AS time_stamp_of_attempt, CAST(score AS INTEGER) AS total_scored
+    FROM performance;
+CREATE TABLE quiz_stats (
+    quiz_id INTEGER PRIMARY KEY,
+    attempt_count INTEGER NOT NULL,
+    score_sum FLOAT NOT NULL
+);
+"""
+
+FANOUT_SQL = """
+    SELECT quizzes.id, quizzes.quiz_name, chapters.chapter_name, subject.name AS subject_name,
+           count(scores.id) AS attempts, avg(performance.score) AS average_score
+    FROM quizzes
+    JOIN chapters ON quizzes.chapter_id = chapters.id
+    JOIN subject ON chapters.subject_id = subject.id
+    JOIN scores ON scores.quiz_id = quizzes.id
+    JOIN performance ON performance.Quizzes_id = quizzes.id
+    {where}
+    GROUP BY quizzes.id
+    ORDER BY attempts DESC
+    LIMIT 10
+"""
+
+SUBQUERY_SQL = """
+    SELECT quizzes.id, quizzes.quiz_name, chapters.chapter_name, subject.name AS subject_name,
+           per_quiz.attempts, per_quiz.average_score
+    FROM quizzes
+    JOIN (SELECT Quizzes_id AS quiz_id, count(id) AS attempts, avg(score) AS average_score
+          FROM performance GROUP BY Quizzes_id) AS per_quiz ON per_quiz.quiz_id = quizzes.id
+    JOIN chapters ON quizzes.chapter_id = chapters.id
+    JOIN subject ON chapters.subject_id = subject.id
+    ORDER BY per_quiz.attempts DESC
+    LIMIT 10
+"""
+
+ROLLUP_SQL = """
+    SELECT quizzes.id, quizzes.quiz_name, chapters.chapter_name, subject.name AS subject_name,
+           quiz_stats.attempt_count AS attempts, quiz_stats.score_sum / quiz_stats.attempt_count AS average_score
+    FROM quizzes
+    JOIN quiz_stats ON quiz_stats.quiz_id = quizzes.id
+    JOIN chapters ON quizzes.chapter_id = chapters.id
+    JOIN subject ON chapters.subject_id = subject.id
+    WHERE quiz_stats.attempt_count > 0
+    ORDER BY quiz_stats.attempt_count DESC
+    LIMIT 10
+"""
+
+
+def build(path, attempts, quizzes):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO subject (id, name) VALUES (?, ?)", ((i, f"Subject {i}") for i in range(1, 21)))
+    conn.executemany("INSERT INTO chapters (id, subject_id, chapter_name) VALUES (?, ?, ?)",
+                     ((i, i % 20 + 1, f"Chapter {i}") for i in range(1, 201)))
+    conn.executemany("INSERT INTO quizzes (id, chapter_id, quiz_name) VALUES (?, ?, ?)",
+                     ((i, i % 200 + 1, f"Quiz {i}") for i in range(1, quizzes + 1)))
+    # Skewed popularity: low quiz ids are attempted far more often
+    conn.execute("""
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+        INSERT INTO performance (RegistrationUser_id, Quizzes_id, score, attempted_at)
+        SELECT abs(random()) % 20000 + 1,
+               CAST(? * (abs(random()) % 1000000 / 1000000.0) * (abs(random()) % 1000000 / 1000000.0) AS INTEGER) + 1,
+               abs(random()) % 101,
+               datetime('now', '-' || (abs(random()) % 365) || ' days')
+        FROM n
+    """, (attempts, quizzes))
+    conn.execute("""
+        INSERT INTO quiz_stats (quiz_id, attempt_count, score_sum)
+        SELECT Quizzes_id, count(*), sum(score) FROM performance GROUP BY Quizzes_id
+    """)
+    conn.commit()
+    conn.execute("ANALYZE")
+    return conn
+
+
+def timed(conn, sql, params=(), budget=None):
+    if budget is not None:
+        deadline = time.perf_counter() + budget
+        # Returning non-zero from the progress handler interrupts the query
+        conn.set_progress_handler(lambda: time.perf_counter() > deadline, 100000)
+    started = time.perf_counter()
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    except sqlite3.OperationalError as e:
+        if 'interrupted' not in str(e):
+            raise
+        rows = None
+    finally:
+        conn.set_progress_handler(None, 0)
+    return time.perf_counter() - started, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--attempts', type=int, default=1000000)
+    parser.add_argument('--quizzes', type=int, default=2000)
+    parser.add_argument('--fanout-budget', type=float, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        conn = build(os.path.join(tmp, 'bench.db'), args.attempts, args.quizzes)
+        print(f"Built {args.attempts} attempts over {args.quizzes} quizzes in {time.perf_counter() - started:.1f}s")
+
+        subquery_time, subquery_rows = timed(conn, SUBQUERY_SQL)
+        rollup_time, rollup_rows = timed(conn, ROLLUP_SQL)
+        fanout_time, fanout_rows = timed(conn, FANOUT_SQL.format(where=''), budget=args.fanout_budget)
+
+        top_quiz, true_attempts = subquery_rows[0][0], subquery_rows[0][4]
+        _, top_fanout = timed(conn, FANOUT_SQL.format(where='WHERE quizzes.id = ?'), (top_quiz,))
+
+        print(f"{'query':<10}{'seconds':>12}  top quiz attempts")
+        fanout_label = f"{fanout_time:.3f}" if fanout_rows is not None else f">{args.fanout_budget:g}"
+        print(f"{'fan-out':<10}{fanout_label:>12}  {top_fanout[0][4]} (quiz {top_quiz}, true count {true_attempts})")
+        print(f"{'subquery':<10}{subquery_time:>12.3f}  {true_attempts}")
+        print(f"{'rollup':<10}{rollup_time:>12.4f}  {rollup_rows[0][4]}")
+        # Ties may come back in either order, so compare the counts
+        assert [row[4] for row in subquery_rows] == [row[4] for row in rollup_rows]
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
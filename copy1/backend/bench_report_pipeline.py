@@ -0,0 +1,145 @@
+"""
+Benchmark the data side of the performance report (no charts, no PDF) for a
+user with many attempts.
+
+- rows:    the previous pipeline: attempts read as dicts, a DataFrame built
+           from them and the results table rendered with df.iterrows().
+- frame:   report_data: one query straight into a DataFrame, vectorized
+           summary and column-wise rendering of the table rows.
+
+Percentiles come from per-quiz sorted score lists in both cases, as with the
+in-memory QuizPercentileIndex.
+
+Usage:
+    python bench_report_pipeline.py [--attempts 1000] [--others 100000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from report_data import load_report_frame, render_report_rows, summarize_report_frame
+
+SCHEMA = [
+    "CREATE TABLE subject (id INTEGER PRIMARY KEY, name TEXT NOT NULL)",
+    "CREATE TABLE chapters (id INTEGER PRIMARY KEY, subject_id INTEGER NOT NULL, chapter_name TEXT NOT NULL)",
+    "CREATE TABLE quizzes (id INTEGER PRIMARY KEY, chapter_id INTEGER NOT NULL, quiz_name TEXT NOT NULL)",
+    """CREATE TABLE performance (
+        id INTEGER PRIMARY KEY,
+        RegistrationUser_id INTEGER NOT NULL,
+        Quizzes_id INTEGER NOT NULL,
+        score FLOAT NOT NULL,
+        attempted_at DATETIME NOT NULL
+    )""",
+    "CREATE INDEX ix_performance_user_attempted ON performance (RegistrationUser_id, attempted_at)",
+]
+
+
+def build(session, attempts, others, quizzes):
+    for statement in SCHEMA:
+        session.execute(text(statement))
+    session.execute(text("INSERT INTO subject (id, name) VALUES (:id, :name)"),
+                    [{'id': i, 'name': f"Subject {i}"} for i in range(1, 11)])
+    session.execute(text("INSERT INTO chapters (id, subject_id, chapter_name) VALUES (:id, :subject_id, :name)"),
+                    [{'id': i, 'subject_id': i % 10 + 1, 'name': f"Chapter {i}"} for i in range(1, 101)])
+    session.execute(text("INSERT INTO quizzes (id, chapter_id, quiz_name) VALUES (:id, :chapter_id, :name)"),
+                    [{'id': i, 'chapter_id': i % 100 + 1, 'name': f"Quiz {i}"} for i in range(1, quizzes + 1)])
+    started = datetime(2024, 1, 1)
+    rows = [{
+        'user_id': 1 if i < attempts else random.randint(2, 5000),
+        'quiz_id': random.randint(1, quizzes),
+        'score': float(random.randint(0, 100)),
+        'attempted_at': (started + timedelta(minutes=random.randint(0, 525600))).strftime('%Y-%m-%d %H:%M:%S.%f'),
+    } for i in range(attempts + others)]
+    session.execute(text(
+        "INSERT INTO performance (RegistrationUser_id, Quizzes_id, score, attempted_at) "
+        "VALUES (:user_id, :quiz_id, :score, :attempted_at)"
+    ), rows)
+    session.commit()
+
+    scores = {}
+    for row in rows:
+        scores.setdefault(row['quiz_id'], []).append(row['score'])
+    return {quiz_id: sorted(values) for quiz_id, values in scores.items()}
+
+
+def percentile_lookup(index):
+    def lookup(pairs):
+        return [round(bisect_left(index[quiz_id], score) / len(index[quiz_id]) * 100, 1) for quiz_id, score in pairs]
+    return lookup
+
+
+def rows_pipeline(session, lookup):
+    result = session.execute(text(
+        "SELECT p.id, p.Quizzes_id, p.score, p.attempted_at, q.quiz_name, c.chapter_name, s.name "
+        "FROM performance p JOIN quizzes q ON q.id = p.Quizzes_id "
+        "LEFT JOIN chapters c ON c.id = q.chapter_id LEFT JOIN subject s ON s.id = c.subject_id "
+        "WHERE p.RegistrationUser_id = 1 ORDER BY p.id"
+    ))
+    attempts = [{
+        'performance_id': row[0], 'quiz_id': row[1], 'score': row[2],
+        'attempted_at': datetime.strptime(row[3], '%Y-%m-%d %H:%M:%S.%f'),
+        'quiz_name': row[4], 'chapter_name': row[5], 'subject_name': row[6],
+    } for row in result]
+    percentiles = dict(zip((a['performance_id'] for a in attempts), lookup((a['quiz_id'], a['score']) for a in attempts)))
+    df = pd.DataFrame([{
+        'quiz_name': a['quiz_name'], 'chapter_name': a['chapter_name'], 'subject_name': a['subject_name'],
+        'score': a['score'], 'date': a['attempted_at'].strftime('%Y-%m-%d'),
+        'percentile': percentiles.get(a['performance_id']) or 0,
+    } for a in attempts])
+    df.groupby('subject_name')['score'].mean().sort_values(ascending=False)
+    df.sort_values('date')
+    (df['score'].mean(), df['score'].max(), len(df), df['percentile'].mean())
+    return ''.join(
+        f"<tr><td>{row['date']}</td><td>{row['subject_name']}</td><td>{row['chapter_name']}</td>"
+        f"<td>{row['quiz_name']}</td><td>{row['score']:.1f}%</td><td>{row['percentile']:.1f}%</td></tr>"
+        for _, row in df.iterrows()
+    )
+
+
+def frame_pipeline(session, lookup):
+    frame = load_report_frame(session, 1, percentile_lookup=lookup)
+    summarize_report_frame(frame)
+    return render_report_rows(frame)
+
+
+def timed(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = func()
+        best = min(best, time.perf_counter() - started)
+    return best, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--attempts', type=int, default=1000)
+    parser.add_argument('--others', type=int, default=100000)
+    parser.add_argument('--quizzes', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        with Session(engine) as session:
+            lookup = percentile_lookup(build(session, args.attempts, args.others, args.quizzes))
+            print(f"User with {args.attempts} attempts, {args.others} attempts by others, best of {args.repeat} runs")
+            rows_time, rows_html = timed(lambda: rows_pipeline(session, lookup), args.repeat)
+            frame_time, frame_html = timed(lambda: frame_pipeline(session, lookup), args.repeat)
+            assert rows_html == frame_html
+            print(f"{'pipeline':<10}{'ms':>10}")
+            print(f"{'rows':<10}{rows_time * 1000:>10.1f}")
+            print(f"{'frame':<10}{frame_time * 1000:>10.1f}")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
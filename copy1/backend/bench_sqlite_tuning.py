@@ -0,0 +1,149 @@
+"""
+Benchmark concurrent quiz submissions against SQLite with and without the
+db_engine tuning (WAL, synchronous, cache_size, mmap_size, busy timeout and a
+separate read-only pool for analytics scans).
+
+Each submit is one transaction inserting a performance row and upserting the
+quiz's stats row, which is what write_submission_batch does per attempt. A
+reader thread runs an analytics-style aggregate in a loop meanwhile.
+
+Usage:
+    python bench_sqlite_tuning.py [--writers 8] [--seconds 10] [--seed-rows 200000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from db_engine import SQLITE_DEFAULTS, apply_pragmas, is_locked_error, sqlite_pragmas
+
+SCHEMA = """
+CREATE TABLE performance (
+    id INTEGER PRIMARY KEY,
+    RegistrationUser_id INTEGER NOT NULL,
+    Quizzes_id INTEGER NOT NULL,
+    score FLOAT NOT NULL,
+    attempted_at DATETIME NOT NULL
+);
+CREATE TABLE quiz_stats (
+    quiz_id INTEGER PRIMARY KEY,
+    attempt_count INTEGER NOT NULL,
+    score_sum FLOAT NOT NULL
+);
+"""
+
+SUBMIT_SQL = (
+    "INSERT INTO performance (RegistrationUser_id, Quizzes_id, score, attempted_at) "
+    "VALUES (?, ?, ?, datetime('now'))",
+    "INSERT INTO quiz_stats (quiz_id, attempt_count, score_sum) VALUES (?, 1, ?) "
+    "ON CONFLICT(quiz_id) DO UPDATE SET attempt_count = attempt_count + 1, "
+    "score_sum = score_sum + excluded.score_sum",
+)
+
+ANALYTICS_SQL = (
+    "SELECT Quizzes_id, count(*), avg(score), count(DISTINCT RegistrationUser_id) "
+    "FROM performance GROUP BY Quizzes_id ORDER BY 2 DESC LIMIT 10"
+)
+
+
+def seed(path, rows, quizzes):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany(
+        "INSERT INTO performance (RegistrationUser_id, Quizzes_id, score, attempted_at) "
+        "VALUES (?, ?, ?, datetime('now'))",
+        ((random.randint(1, 5000), random.randint(1, quizzes), random.uniform(0, 100)) for _ in range(rows))
+    )
+    conn.commit()
+    conn.close()
+
+
+def connect(path, tuned, read_only=False):
+    if tuned:
+        conn = sqlite3.connect(path, timeout=SQLITE_DEFAULTS['SQLITE_BUSY_TIMEOUT_MS'] / 1000, check_same_thread=False)
+        apply_pragmas(conn, sqlite_pragmas(SQLITE_DEFAULTS))
+        if read_only:
+            apply_pragmas(conn, [('query_only', 'ON')])
+    else:
+        # sqlite3 defaults: rollback journal, 5 second busy wait
+        conn = sqlite3.connect(path, check_same_thread=False)
+    return conn
+
+
+def run(path, tuned, writers, seconds, quizzes):
+    stop = threading.Event()
+    counts = {'submits': 0, 'locked': 0, 'scans': 0}
+    latencies = []
+    lock = threading.Lock()
+
+    def writer():
+        conn = connect(path, tuned)
+        done, locked, waits = 0, 0, []
+        while not stop.is_set():
+            quiz_id, score = random.randint(1, quizzes), random.uniform(0, 100)
+            started = time.perf_counter()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(SUBMIT_SQL[0], (random.randint(1, 5000), quiz_id, score))
+                conn.execute(SUBMIT_SQL[1], (quiz_id, score))
+                conn.execute("COMMIT")
+                done += 1
+                waits.append(time.perf_counter() - started)
+            except sqlite3.OperationalError as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                if not is_locked_error(e):
+                    raise
+                locked += 1
+        conn.close()
+        with lock:
+            counts['submits'] += done
+            counts['locked'] += locked
+            latencies.extend(waits)
+
+    def reader():
+        conn = connect(path, tuned, read_only=True)
+        scans = 0
+        while not stop.is_set():
+            conn.execute(ANALYTICS_SQL).fetchall()
+            scans += 1
+        conn.close()
+        with lock:
+            counts['scans'] += scans
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)] + [threading.Thread(target=reader)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0
+    return counts['submits'] / seconds, counts['locked'], counts['scans'], p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--seed-rows', type=int, default=200000)
+    parser.add_argument('--quizzes', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.writers} writers + 1 analytics reader, {args.seconds:g}s per run, {args.seed_rows} seeded attempts")
+        print(f"{'mode':<10}{'submits/s':>12}{'locked':>10}{'scans':>10}{'p99 ms':>10}")
+        for tuned in (False, True):
+            path = os.path.join(tmp, f"bench_{'tuned' if tuned else 'default'}.db")
+            seed(path, args.seed_rows, args.quizzes)
+            rate, locked, scans, p99 = run(path, tuned, args.writers, args.seconds, args.quizzes)
+            print(f"{'tuned' if tuned else 'default':<10}{rate:>12.0f}{locked:>10}{scans:>10}{p99:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
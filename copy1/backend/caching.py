@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Small thread-safe LRU cache shared by the in-process caches in app.py.
+
+    Entries are evicted least-recently-used first once either bound is
+    exceeded: max_entries (number of keys) or max_bytes (sum of sizeof(value)).
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, sizeof=len):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        size = self._sizeof(value) if self.max_bytes is not None else 0
+        with self._lock:
+            # A single value larger than the whole budget is never stored
+            if self.max_bytes is not None and size > self.max_bytes:
+                self._remove(key)
+                return
+            self._remove(key)
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._total_bytes += size
+            self._evict()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            value = self._entries[key]
+            self._remove(key)
+            return value
+
+    def discard_where(self, predicate):
+        """Remove every key for which predicate(key) is true"""
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def _remove(self, key):
+        if key in self._entries:
+            del self._entries[key]
+            self._total_bytes -= self._sizes.pop(key)
+
+    def _evict(self):
+        while self._entries and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries) or
+            (self.max_bytes is not None and self._total_bytes > self.max_bytes)
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
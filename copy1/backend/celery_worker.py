@@ -32,6 +32,21 @@ def make_celery(app_name):
             'schedule': crontab(minute=0, hour=2, day_of_month=1),
             'args': (None, None),  # Will use current month/year
         },
+        'compact-activity-rollups': {
+            'task': 'celery_worker.compact_activity_rollups',
+            # Run daily at 00:30, once yesterday's rollups are final
+            'schedule': crontab(minute=30, hour=0),
+        },
+        'repair-user-stats': {
+            'task': 'celery_worker.repair_user_stats',
+            # Nightly consistency check of the per-user summaries
+            'schedule': crontab(minute=0, hour=1),
+        },
+        'deliver-notifications': {
+            'task': 'celery_worker.deliver_notifications',
+            # Picks up outbox rows due for a retry
+            'schedule': crontab(),
+        },
     }
     
     return celery
@@ -68,7 +83,8 @@ def process_login(user_id, timestamp):
 def send_quiz_notification(self, quiz_id):
     """
     Send notifications to all users about a new quiz.
-    This task has retry capability to handle temporary failures.
+    Queues the quiz's email in the outbox for users who have not had it and
+    delivers the outbox, so a retry never sends an email twice.
     """
     try:
         print(f"[CELERY] Starting quiz notification task for quiz ID {quiz_id}")
@@ -117,99 +133,66 @@ def send_quiz_notification(self, quiz_id):
 
 @celery.task(name="celery_worker.send_monthly_reports")
 def send_monthly_reports(month=None, year=None):
-    """Send monthly performance reports to all users"""
+    """
+    Send monthly performance reports to all users.
+
+    The users still waiting for the month's report are split into id ranges
+    of MONTHLY_REPORT_SHARD_SIZE; each range is one send_monthly_report_shard
+    task, and the group is summarized by summarize_monthly_reports once all
+    shards are done (a chord). Sends are checkpointed per user, so running
+    the task again for the same month only sends what is missing.
+    """
     try:
-        print(f"Starting monthly report task for {month}/{year}")
-        
         # If month/year not specified, use previous month
         if not month or not year:
-            from datetime import datetime, timedelta
-            # Get first day of current month
-            today = datetime.today()
-            first_day = datetime(today.year, today.month, 1)
-            # Go back one day to get the last day of previous month
+            from datetime import timedelta
+            # Go back one day from the first of this month
+            first_day = datetime.utcnow().replace(day=1)
             last_month = first_day - timedelta(days=1)
             month = last_month.month
             year = last_month.year
         
-        # Import required modules from app.py
-        from app import generate_performance_report_html, generate_performance_report_pdf, RegistrationUser, mail, Message
-        from flask import current_app
+        print(f"Starting monthly report task for {month}/{year}")
         
-        # Get all active users
-        with current_app.app_context():
-            users = RegistrationUser.query.filter_by(active=True).all()
-            
-            if not users:
-                print("No active users to send reports to")
-                return {"status": "success", "message": "No active users to send reports to"}
-            
-            # Get month name
-            import calendar
-            month_name = calendar.month_name[month]
-            
-            # Send reports in batches
-            batch_size = 10
-            successful_sends = 0
-            failed_sends = 0
-            
-            for i in range(0, len(users), batch_size):
-                batch_users = users[i:i+batch_size]
-                
-                for user in batch_users:
-                    try:
-                        # Generate PDF report for this user
-                        pdf_data = generate_performance_report_pdf(user.id, month, year)
-                        
-                        if not pdf_data:
-                            print(f"No data for user {user.id} in {month_name} {year}")
-                            continue
-                        
-                        # Create email
-                        msg = Message(
-                            subject=f"Quiz Master Monthly Performance Report - {month_name} {year}",
-                            recipients=[user.email],
-                            body=f"Please find attached your performance report for {month_name} {year}.",
-                            html=f"""
-                            <html>
-                            <body>
-                                <h2>Your Monthly Performance Report</h2>
-                                <p>Hello {user.fullname},</p>
-                                <p>Please find attached your Quiz Master performance report for {month_name} {year}.</p>
-                                <p>This report includes a summary of your quiz activities, scores, and comparisons with other students.</p>
-                                <p>Thank you for using Quiz Master!</p>
-                            </body>
-                            </html>
-                            """
-                        )
-                        
-                        # Attach PDF
-                        msg.attach(
-                            filename=f"performance_report_{month_name}_{year}.pdf",
-                            content_type="application/pdf",
-                            data=pdf_data
-                        )
-                        
-                        # Send email
-                        mail.send(msg)
-                        successful_sends += 1
-                        
-                    except Exception as e:
-                        print(f"Error sending monthly report to user {user.id}: {str(e)}")
-                        failed_sends += 1
-                
-                # Small delay between batches
-                import time
-                time.sleep(5)
-            
-            print(f"Monthly reports task completed. Success: {successful_sends}, Failed: {failed_sends}")
+        from app import app, monthly_report_shards
+        from celery import chord
+        from celery.utils import uuid
+        
+        with app.app_context():
+            shards = monthly_report_shards(month, year, app.config['MONTHLY_REPORT_SHARD_SIZE'])
+        
+        if not shards:
+            print(f"No monthly reports left to send for {month}/{year}")
             return {
                 "status": "success",
                 "month": month,
                 "year": year,
-                "successful_sends": successful_sends,
-                "failed_sends": failed_sends
+                "shards": 0,
+                "users": 0,
+                "message": "No reports left to send"
             }
+        
+        dispatched_at = datetime.utcnow().timestamp()
+        # Shard task ids are chosen here so progress can be looked up per shard
+        shard_task_ids = [uuid() for _ in shards]
+        header = [
+            send_monthly_report_shard.s(month, year, first, last).set(task_id=task_id)
+            for (first, last, _), task_id in zip(shards, shard_task_ids)
+        ]
+        summary = chord(header)(summarize_monthly_reports.s(month, year, dispatched_at))
+        
+        users = sum(size for _, _, size in shards)
+        print(f"Dispatched {len(shards)} monthly report shards for {users} users")
+        return {
+            "status": "dispatched",
+            "month": month,
+            "year": year,
+            "shards": len(shards),
+            "users": users,
+            "dispatched_at": dispatched_at,
+            "summary_task_id": summary.id,
+            "shard_task_ids": shard_task_ids
+        }
             
     except Exception as e:
         print(f"Error in monthly reports task: {str(e)}")
@@ -222,6 +205,143 @@ def send_monthly_reports(month=None, year=None):
             "error": str(e)
         }
 
+@celery.task(name="celery_worker.send_monthly_report_shard", bind=True, acks_late=True)
+def send_monthly_report_shard(self, month, year, first_user_id, last_user_id):
+    """
+    Send the monthly reports of the users with first_user_id <= id <= last_user_id.
+
+    Acknowledged only when done, so a shard lost with its worker is run
+    again; users recorded as delivered are skipped. Progress is published as
+    the PROGRESS state of this task.
+    """
+    started = datetime.utcnow()
+    shard = {"first_user_id": first_user_id, "last_user_id": last_user_id}
+    try:
+        from app import app, send_monthly_report_emails
+        
+        def progress(counts):
+            self.update_state(state='PROGRESS', meta={**shard, **counts})
+        
+        with app.app_context():
+            counts = send_monthly_report_emails(month, year, first_user_id, last_user_id, on_progress=progress)
+        
+        return {
+            "status": "success",
+            **shard,
+            **counts,
+            "sends_per_second": round(counts['successful_sends'] / max(counts['seconds'], 0.001), 1)
+        }
+    except Exception as e:
+        print(f"[CELERY] Error in monthly report shard {first_user_id}-{last_user_id}: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        # Returned rather than raised so the chord still summarizes the run
+        return {
+            "status": "error",
+            **shard,
+            "seconds": round((datetime.utcnow() - started).total_seconds(), 1),
+            "error": str(e)
+        }
+
+@celery.task(name="celery_worker.summarize_monthly_reports")
+def summarize_monthly_reports(results, month, year, dispatched_at):
+    """Chord callback: totals and throughput of a monthly report run"""
+    totals = {"reports": 0, "successful_sends": 0, "failed_sends": 0, "skipped": 0}
+    for result in results:
+        for key in totals:
+            totals[key] += result.get(key, 0)
+    failed_shards = [
+        {"first_user_id": result["first_user_id"], "last_user_id": result["last_user_id"], "error": result["error"]}
+        for result in results if result["status"] != "success"
+    ]
+    seconds = round(datetime.utcnow().timestamp() - dispatched_at, 1)
+    
+    print(f"Monthly reports task completed. Success: {totals['successful_sends']}, Failed: {totals['failed_sends']}, "
+          f"failed shards: {len(failed_shards)}")
+    return {
+        # Re-running send_monthly_reports for the month picks up what is missing
+        "status": "success" if not failed_shards else "partial",
+        "month": month,
+        "year": year,
+        "shards": len(results),
+        "failed_shards": failed_shards,
+        **totals,
+        "seconds": seconds,
+        "sends_per_second": round(totals['successful_sends'] / max(seconds, 0.001), 1)
+    }
+
+@celery.task(name="celery_worker.deliver_notifications")
+def deliver_notifications():
+    """Send the due rows of the notification outbox"""
+    try:
+        from app import app, deliver_notifications as deliver
+        
+        with app.app_context():
+            counts = deliver()
+        
+        return {
+            "status": "success",
+            **counts,
+            "processed_at": datetime.utcnow().isoformat()
+        }
+    except Exception as e:
+        print(f"[CELERY] Error delivering notifications: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return {
+            "status": "error",
+            "error": str(e)
+        }
+
+@celery.task(name="celery_worker.compact_activity_rollups")
+def compact_activity_rollups():
+    """Prune the per-user membership rows of closed activity rollup periods"""
+    try:
+        from app import app, compact_activity_rollups as compact
+        
+        with app.app_context():
+            removed = compact()
+        
+        print(f"[CELERY] Compacted activity rollups, removed {removed} membership rows")
+        return {
+            "status": "success",
+            "removed": removed,
+            "processed_at": datetime.utcnow().isoformat()
+        }
+    except Exception as e:
+        print(f"[CELERY] Error compacting activity rollups: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return {
+            "status": "error",
+            "error": str(e)
+        }
+
+@celery.task(name="celery_worker.repair_user_stats")
+def repair_user_stats():
+    """Check user_stats against the attempt history and repair any drift"""
+    try:
+        from app import app, repair_user_stats as repair
+        
+        with app.app_context():
+            repaired = repair()
+        
+        if repaired:
+            print(f"[CELERY] Repaired user statistics for {repaired} users")
+        return {
+            "status": "success",
+            "repaired": repaired,
+            "processed_at": datetime.utcnow().isoformat()
+        }
+    except Exception as e:
+        print(f"[CELERY] Error repairing user statistics: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return {
+            "status": "error",
+            "error": str(e)
+        }
+
 if __name__ == '__main__':
     print("Starting Celery worker")
     celery.start()
\ No newline at end of file
@@ -0,0 +1,189 @@
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+# Defaults applied by configure_sqlite(); every key can be overridden in app.config
+SQLITE_DEFAULTS = {
+    'SQLITE_TUNING_ENABLED': True,
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_CACHE_SIZE_KB': 64 * 1024,
+    'SQLITE_MMAP_SIZE': 256 * 1024 * 1024,
+    'SQLITE_BUSY_TIMEOUT_MS': 5000,
+    'SQLITE_WRITE_POOL_SIZE': 5,
+    'SQLITE_READ_POOL_SIZE': 4,
+    'SQLITE_LOCK_RETRIES': 5,
+    'SQLITE_LOCK_RETRY_DELAY_MS': 50,
+}
+
+_pragma_lock = threading.Lock()
+_pragmas = {}
+
+
+def sqlite_pragmas(config):
+    """Per-connection PRAGMA statements for the given config, in execution order"""
+    return [
+        # busy_timeout goes first so switching the journal mode waits for
+        # other connections instead of failing with "database is locked"
+        ('busy_timeout', int(config['SQLITE_BUSY_TIMEOUT_MS'])),
+        ('journal_mode', config['SQLITE_JOURNAL_MODE']),
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        # A negative cache_size is a budget in KiB rather than in pages
+        ('cache_size', -int(config['SQLITE_CACHE_SIZE_KB'])),
+        ('mmap_size', int(config['SQLITE_MMAP_SIZE'])),
+    ]
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas:
+            if name == 'journal_mode':
+                # The journal mode is stored in the database file; changing it
+                # needs an exclusive lock, so only ask when it differs
+                current = cursor.execute("PRAGMA journal_mode").fetchone()[0]
+                if current.lower() == str(value).lower():
+                    continue
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # Registered for every engine; only sqlite connections are touched and
+    # only once configure_sqlite() has stored the pragmas to use
+    if _pragmas and isinstance(dbapi_connection, sqlite3.Connection):
+        apply_pragmas(dbapi_connection, _pragmas['write'])
+
+
+def configure_sqlite(app):
+    """
+    Fill in the SQLite tuning defaults and the matching engine options.
+
+    Must run before SQLAlchemy(app) so SQLALCHEMY_ENGINE_OPTIONS is in place
+    when the engine is created. Does nothing for non-sqlite databases or when
+    SQLITE_TUNING_ENABLED is false.
+    """
+    for key, value in SQLITE_DEFAULTS.items():
+        app.config.setdefault(key, value)
+
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite') or not app.config['SQLITE_TUNING_ENABLED']:
+        return
+
+    with _pragma_lock:
+        _pragmas['write'] = sqlite_pragmas(app.config)
+
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    connect_args = options.setdefault('connect_args', {})
+    # sqlite3's own busy handler, in seconds, waits out short write locks
+    connect_args.setdefault('timeout', app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000)
+    # Pooled connections are handed between request and writer threads
+    connect_args.setdefault('check_same_thread', False)
+    # SQLAlchemy 1.4 opens a fresh connection per checkout for sqlite files
+    # (NullPool); a QueuePool keeps the page cache and mmap across requests
+    options.setdefault('poolclass', QueuePool)
+    options.setdefault('pool_size', app.config['SQLITE_WRITE_POOL_SIZE'])
+
+
+def is_locked_error(error):
+    message = str(getattr(error, 'orig', error)).lower()
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+def retry_on_locked(attempts, delay):
+    """
+    Retry the wrapped write when SQLite reports the database as locked.
+
+    The busy timeout already waits for short locks; this covers the rarer
+    case where it expires. The wrapped function must roll back its own
+    session on failure. Waits grow linearly from `delay` seconds.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(1, attempts + 1):
+                try:
+                    return func(*args, **kwargs)
+                except OperationalError as e:
+                    if attempt == attempts or not is_locked_error(e):
+                        raise
+                    print(f"Database locked in {func.__name__}, retry {attempt}/{attempts - 1}")
+                    time.sleep(delay * attempt)
+        return wrapper
+    return decorator
+
+
+class ReadOnlySessions:
+    """
+    Sessions on a separate pool of read-only SQLite connections.
+
+    The admin analytics endpoints read through this so their long scans do not
+    hold connections from the main pool. With WAL enabled readers never block
+    the writer; `PRAGMA query_only` makes sure these connections never write.
+    Falls back to the main Flask-SQLAlchemy session when tuning is disabled,
+    the pool size is 0 or the database is not sqlite.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()
+        self._engine = None
+        self._registry = None
+        self._disabled = False
+
+    def _build(self, app):
+        engine = self.db.get_engine(app)
+        config = app.config
+        if (engine.dialect.name != 'sqlite' or not config['SQLITE_TUNING_ENABLED'] or
+                not config['SQLITE_READ_POOL_SIZE'] or engine.url.database in (None, '', ':memory:')):
+            self._disabled = True
+            return
+
+        # Same file as the main engine (Flask-SQLAlchemy already made the path absolute)
+        self._engine = create_engine(
+            engine.url,
+            poolclass=QueuePool,
+            pool_size=config['SQLITE_READ_POOL_SIZE'],
+            max_overflow=config['SQLITE_READ_POOL_SIZE'],
+            connect_args={
+                'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000,
+                'check_same_thread': False,
+            },
+        )
+
+        @event.listens_for(self._engine, 'connect')
+        def _set_query_only(dbapi_connection, connection_record):
+            apply_pragmas(dbapi_connection, [('query_only', 'ON')])
+
+        self._registry = scoped_session(sessionmaker(bind=self._engine, autoflush=False))
+
+    def session(self, app):
+        """The read-only session for the current thread (or db.session as fallback)"""
+        if self._registry is None and not self._disabled:
+            with self._lock:
+                if self._registry is None and not self._disabled:
+                    self._build(app)
+        if self._disabled:
+            return self.db.session
+        return self._registry()
+
+    def remove(self, exception=None):
+        if self._registry is not None:
+            self._registry.remove()
+
+    def dispose(self):
+        with self._lock:
+            if self._engine is not None:
+                self._registry.remove()
+                self._engine.dispose()
+            self._engine = None
+            self._registry = None
+            self._disabled = False
@@ -0,0 +1,104 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class WriterBusy(Exception):
+    """Raised when the submission queue is full and the write was not accepted"""
+
+
+class GroupCommitWriter:
+    """
+    Funnels writes from many request threads through one writer thread.
+
+    Callers hand an item to submit() and block until it is durable. The writer
+    collects whatever arrives within `max_wait` seconds (up to `max_batch`
+    items) and passes the batch to `handler`, which must write all of it in a
+    single transaction and return one result per item. If a batch fails, its
+    items are retried one at a time so a single bad item cannot fail the
+    others.
+    """
+
+    def __init__(self, handler, max_batch=200, max_wait=0.005, queue_size=1000, name='group-commit-writer'):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = False
+
+    def submit(self, item, timeout=None):
+        """Queue an item and wait until it is committed; returns the handler's result"""
+        future = self.submit_async(item)
+        return future.result(timeout=timeout)
+
+    def submit_async(self, item):
+        """Queue an item and return a Future resolved once it is committed"""
+        if self._stopping:
+            raise WriterBusy(f"{self.name} is shutting down")
+        self._ensure_started()
+        future = Future()
+        try:
+            self._queue.put_nowait((item, future))
+        except queue.Full:
+            raise WriterBusy(f"{self.name} queue is full")
+        return future
+
+    def stop(self, timeout=5):
+        """Stop accepting items, flush what is queued and wait for the writer to exit"""
+        self._stopping = True
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put((None, None))
+            self._thread.join(timeout)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect_batch(self):
+        item, future = self._queue.get()
+        if future is None:
+            return None
+        batch = [(item, future)]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item, future = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if future is None:
+                # Stop marker: write what we have, then exit on the next loop
+                self._queue.put((None, None))
+                break
+            batch.append((item, future))
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                return
+            self._write(batch)
+
+    def _write(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            results = self.handler(items)
+        except Exception as batch_error:
+            if len(batch) == 1:
+                batch[0][1].set_exception(batch_error)
+                return
+            print(f"[{self.name}] Batch of {len(batch)} failed ({batch_error}), retrying items individually")
+            for item, future in batch:
+                self._write([(item, future)])
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
@@ -0,0 +1,464 @@
+import random
+import threading
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Board scopes. A quiz board ranks each user's best score on that quiz; the
+# chapter, subject and global boards rank the sum of a user's best scores
+# over the quizzes they contain, so retaking a quiz only counts if it improves.
+SCOPES = ('quiz', 'chapter', 'subject', 'global')
+GLOBAL_BOARD = ('global', 0)
+
+
+def board_keys(quiz_id, chapter_id, subject_id):
+    """(quiz board, [total boards]) an attempt at a quiz contributes to"""
+    totals = [GLOBAL_BOARD]
+    if chapter_id is not None:
+        totals.append(('chapter', chapter_id))
+    if subject_id is not None:
+        totals.append(('subject', subject_id))
+    return ('quiz', quiz_id), totals
+
+
+def aggregate_boards(rows):
+    """Build every board from (user_id, quiz_id, chapter_id, subject_id, best_score) rows"""
+    boards = {}
+    for user_id, quiz_id, chapter_id, subject_id, best_score in rows:
+        quiz_board, totals = board_keys(quiz_id, chapter_id, subject_id)
+        boards.setdefault(quiz_board, {})[user_id] = best_score
+        for key in totals:
+            members = boards.setdefault(key, {})
+            members[user_id] = members.get(user_id, 0) + best_score
+    return boards
+
+
+class _Node:
+    __slots__ = ('key', 'forward', 'span')
+
+    def __init__(self, key, level):
+        self.key = key
+        self.forward = [None] * level
+        # span[i]: number of positions the level-i link jumps over
+        self.span = [0] * level
+
+
+class SkipList:
+    """
+    Indexable skiplist of unique, comparable keys.
+
+    Same layout as a Redis sorted set: every link also stores how many
+    positions it skips, so insert, remove, rank and positional lookup are
+    all O(log n) expected.
+    """
+
+    MAX_LEVEL = 32
+    P = 0.25
+
+    def __init__(self):
+        self._head = _Node(None, self.MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _random_level(self):
+        level = 1
+        while level < self.MAX_LEVEL and random.random() < self.P:
+            level += 1
+        return level
+
+    def insert(self, key):
+        update = [None] * self.MAX_LEVEL
+        rank = [0] * self.MAX_LEVEL
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            rank[i] = 0 if i == self._level - 1 else rank[i + 1]
+            while node.forward[i] is not None and node.forward[i].key < key:
+                rank[i] += node.span[i]
+                node = node.forward[i]
+            update[i] = node
+
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                update[i] = self._head
+                self._head.span[i] = self._size
+            self._level = level
+
+        new = _Node(key, level)
+        for i in range(level):
+            new.forward[i] = update[i].forward[i]
+            update[i].forward[i] = new
+            new.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = rank[0] - rank[i] + 1
+        for i in range(level, self._level):
+            update[i].span[i] += 1
+        self._size += 1
+
+    def remove(self, key):
+        update = [None] * self.MAX_LEVEL
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                node = node.forward[i]
+            update[i] = node
+
+        node = node.forward[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for i in range(self._level):
+            if update[i].forward[i] is node:
+                update[i].span[i] += node.span[i] - 1
+                update[i].forward[i] = node.forward[i]
+            else:
+                update[i].span[i] -= 1
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+
+    def rank(self, key):
+        """0-based position of key"""
+        traversed = 0
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key <= key:
+                traversed += node.span[i]
+                node = node.forward[i]
+            if node is not self._head and node.key == key:
+                return traversed - 1
+        raise KeyError(key)
+
+    def slice(self, start, count):
+        """Up to `count` keys from 0-based position `start` on"""
+        if start < 0 or start >= self._size or count <= 0:
+            return []
+        target = start + 1
+        traversed = 0
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and traversed + node.span[i] <= target:
+                traversed += node.span[i]
+                node = node.forward[i]
+            if traversed == target:
+                break
+
+        keys = []
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.forward[0]
+        return keys
+
+
+class _Descending:
+    """Wraps a value so that it sorts in reverse"""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __ne__(self, other):
+        return self.value != other.value
+
+    def __lt__(self, other):
+        return self.value > other.value
+
+    def __le__(self, other):
+        return self.value >= other.value
+
+    def __gt__(self, other):
+        return self.value < other.value
+
+    def __ge__(self, other):
+        return self.value <= other.value
+
+
+def order_key(member, score):
+    # ZREVRANGE order: best score first, ties by member string descending
+    return (-score, _Descending(str(member)))
+
+
+class _MemoryBoard:
+    """One board: member -> score plus the members ordered best first (ties as in Redis)"""
+
+    def __init__(self):
+        self.scores = {}
+        self.order = SkipList()
+
+    def set(self, member, score):
+        old = self.scores.get(member)
+        if old is not None:
+            self.order.remove(order_key(member, old))
+        self.scores[member] = score
+        self.order.insert(order_key(member, score))
+
+
+class MemoryLeaderboardStore:
+    """Boards held in this process; every worker process keeps (and rebuilds) its own copy"""
+
+    name = 'memory'
+    shared = False
+
+    def __init__(self):
+        self._boards = {}
+        self._ready = False
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._ready
+
+    def clear_ready(self):
+        self._ready = False
+
+    def record_best(self, board, totals, member, score):
+        with self._lock:
+            quiz_board = self._boards.setdefault(board, _MemoryBoard())
+            old = quiz_board.scores.get(member)
+            if old is not None and old >= score:
+                return False
+            quiz_board.set(member, score)
+            delta = score - (old or 0)
+            for key in totals:
+                total_board = self._boards.setdefault(key, _MemoryBoard())
+                total_board.set(member, total_board.scores.get(member, 0) + delta)
+            return True
+
+    def replace(self, boards):
+        built = {}
+        for key, members in boards.items():
+            board = _MemoryBoard()
+            for member, score in members.items():
+                board.set(member, score)
+            built[key] = board
+        with self._lock:
+            self._boards = built
+            self._ready = True
+
+    def size(self, key):
+        with self._lock:
+            board = self._boards.get(key)
+            return len(board.scores) if board else 0
+
+    def rank(self, key, member):
+        with self._lock:
+            board = self._boards.get(key)
+            if board is None or member not in board.scores:
+                return None
+            score = board.scores[member]
+            return board.order.rank(order_key(member, score)), score
+
+    def top(self, key, offset, count):
+        with self._lock:
+            board = self._boards.get(key)
+            if board is None:
+                return []
+            return [(int(member.value), -negated) for negated, member in board.order.slice(offset, count)]
+
+
+# Set a user's best quiz score only if it improved and add the improvement to
+# the total boards, atomically. KEYS = quiz board, total boards; ARGV = member, score
+RECORD_BEST_SCRIPT = """
+local old = redis.call('ZSCORE', KEYS[1], ARGV[1])
+local score = tonumber(ARGV[2])
+if old and tonumber(old) >= score then
+    return 0
+end
+redis.call('ZADD', KEYS[1], score, ARGV[1])
+local delta = score - (tonumber(old) or 0)
+for i = 2, #KEYS do
+    redis.call('ZINCRBY', KEYS[i], delta, ARGV[1])
+end
+return 1
+"""
+
+
+class RedisLeaderboardStore:
+    """Boards as Redis sorted sets, shared by every worker process"""
+
+    name = 'redis'
+    shared = True
+
+    def __init__(self, client, prefix='leaderboard'):
+        self.client = client
+        self.prefix = prefix
+        self._record_best = client.register_script(RECORD_BEST_SCRIPT)
+
+    def _key(self, key, prefix=None):
+        scope, scope_id = key
+        return f"{prefix or self.prefix}:{scope}:{scope_id}"
+
+    @property
+    def ready(self):
+        return bool(self.client.exists(f"{self.prefix}:ready"))
+
+    def clear_ready(self):
+        self.client.delete(f"{self.prefix}:ready")
+
+    def record_best(self, board, totals, member, score):
+        keys = [self._key(board)] + [self._key(key) for key in totals]
+        return bool(self._record_best(keys=keys, args=[member, repr(float(score))]))
+
+    def replace(self, boards):
+        # Fill staging keys first, then swap them in with one MULTI/EXEC
+        staging = f"{self.prefix}:staging"
+        pipe = self.client.pipeline(transaction=False)
+        for key, members in boards.items():
+            staged = self._key(key, staging)
+            pipe.delete(staged)
+            if members:
+                pipe.zadd(staged, {str(member): score for member, score in members.items()})
+        pipe.execute()
+
+        live = [name for name in self.client.scan_iter(match=f"{self.prefix}:*", count=1000)
+                if not name.startswith(f"{staging}:") and name != f"{self.prefix}:ready"]
+        pipe = self.client.pipeline(transaction=True)
+        if live:
+            pipe.delete(*live)
+        for key, members in boards.items():
+            if members:
+                pipe.rename(self._key(key, staging), self._key(key))
+        pipe.set(f"{self.prefix}:ready", 1)
+        pipe.execute()
+
+    def size(self, key):
+        return self.client.zcard(self._key(key))
+
+    def rank(self, key, member):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zrevrank(self._key(key), str(member))
+        pipe.zscore(self._key(key), str(member))
+        rank, score = pipe.execute()
+        if rank is None:
+            return None
+        return rank, score
+
+    def top(self, key, offset, count):
+        if count <= 0:
+            return []
+        entries = self.client.zrevrange(self._key(key), offset, offset + count - 1, withscores=True)
+        return [(int(member), score) for member, score in entries]
+
+
+class Leaderboards:
+    """
+    Quiz, chapter, subject and global leaderboards.
+
+    Kept in Redis sorted sets when Redis is reachable (backend 'redis' or
+    'auto'), otherwise in in-process skiplists. The boards are built from the
+    attempt history on first use and updated per committed attempt by
+    record(); rebuild() rereads the history at any time.
+
+    In-process boards only see the attempts recorded by their own process, so
+    reads first replay the attempts committed since the last replay, at most
+    every `sync_interval` seconds, and rebuild the boards once they are
+    `max_age` seconds old (catalogue deletes in other processes). record()
+    ignores scores that are not a new best, so replays are idempotent.
+
+    `loader(after_id)` returns (rows, upto): the best score per (user, quiz)
+    over the attempts with after_id < id <= upto as (user_id, quiz_id,
+    chapter_id, subject_id, best_score) rows, and upto, the highest attempt
+    id it covered.
+    """
+
+    def __init__(self, loader=None, sync_interval=5, max_age=300):
+        self.loader = loader
+        self.sync_interval = sync_interval
+        self.max_age = max_age
+        self.store = MemoryLeaderboardStore()
+        self._lock = threading.Lock()
+        self._synced_upto = 0  # highest attempt id replayed into the boards
+        self._synced_at = 0
+        self._built_at = 0
+
+    @property
+    def backend(self):
+        return self.store.name
+
+    def configure(self, backend='auto', redis_url=None, prefix='leaderboard'):
+        """Pick the store; 'auto' uses Redis when it answers a PING, memory otherwise"""
+        if backend not in ('auto', 'redis', 'memory'):
+            raise ValueError(f"Unknown leaderboard backend {backend!r}")
+        self.store = MemoryLeaderboardStore()
+        if backend == 'memory':
+            return self.backend
+
+        try:
+            if redis is None:
+                raise RuntimeError('redis is not installed')
+            client = redis.Redis.from_url(redis_url, decode_responses=True, socket_connect_timeout=1, socket_timeout=2)
+            client.ping()
+            self.store = RedisLeaderboardStore(client, prefix)
+        except Exception as e:
+            if backend == 'redis':
+                raise
+            print(f"Leaderboards kept in memory, Redis is not available: {e}")
+        return self.backend
+
+    def record(self, user_id, quiz_id, chapter_id, subject_id, score):
+        """Apply one attempt; returns True when it improved the user's best on the quiz"""
+        quiz_board, totals = board_keys(quiz_id, chapter_id, subject_id)
+        return self.store.record_best(quiz_board, totals, user_id, score)
+
+    def rebuild(self):
+        """Rebuild every board from the attempt history; returns the number of boards"""
+        rows, upto = self.loader(0)
+        boards = aggregate_boards(rows)
+        self.store.replace(boards)
+        # Attempts committed while the history was read may have been applied
+        # to the old boards only; record() ignores scores that are not a new
+        # best, so replaying everything newer than `upto` is safe
+        self._replay(upto)
+        self._built_at = self._synced_at
+        return len(boards)
+
+    def _replay(self, after_id):
+        newer, upto = self.loader(after_id)
+        for user_id, quiz_id, chapter_id, subject_id, best_score in newer:
+            self.record(user_id, quiz_id, chapter_id, subject_id, best_score)
+        self._synced_upto = upto
+        self._synced_at = time.monotonic()
+
+    def _expired(self):
+        return not self.store.shared and time.monotonic() - self._built_at >= self.max_age
+
+    def _sync_due(self):
+        return not self.store.shared and time.monotonic() - self._synced_at >= self.sync_interval
+
+    def invalidate(self):
+        """Drop the boards so the next read rebuilds them (after catalogue deletes)"""
+        self.store.clear_ready()
+
+    def ensure_loaded(self):
+        if self.store.ready and not self._sync_due():
+            return
+        with self._lock:
+            if not self.store.ready or self._expired():
+                self.rebuild()
+            elif self._sync_due():
+                self._replay(self._synced_upto)
+
+    def top(self, scope, scope_id, offset=0, count=20):
+        """(total, [(rank, user_id, score), ...]) for one page of a board; ranks are 1-based"""
+        self.ensure_loaded()
+        key = (scope, scope_id)
+        entries = self.store.top(key, offset, count)
+        return self.store.size(key), [(offset + i + 1, member, score) for i, (member, score) in enumerate(entries)]
+
+    def rank(self, scope, scope_id, user_id):
+        """(rank, score, total) of one user on a board, or None if the user is not on it"""
+        self.ensure_loaded()
+        key = (scope, scope_id)
+        found = self.store.rank(key, user_id)
+        if found is None:
+            return None
+        position, score = found
+        return position + 1, score, self.store.size(key)
@@ -0,0 +1,146 @@
+import os
+import smtplib
+import threading
+import time
+
+from flask_mail import Connection
+
+
+def is_throttle(error):
+    """True for 4xx replies, which the limiter treats as the server asking us to slow down"""
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    return False
+
+
+def is_transient(error):
+    """True for failures worth another try on a new connection: drops, socket errors and 4xx replies"""
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)) or is_throttle(error):
+        return True
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)
+
+
+class SmtpPool:
+    """
+    A small pool of open, authenticated SMTP connections for one process.
+
+    Flask-Mail's mail.send() connects, negotiates TLS and logs in for every
+    message. The pool keeps up to `size` Flask-Mail Connections open and
+    lends them out per send, so consecutive messages share one session.
+    Connections idle for more than max_idle seconds are closed rather than
+    reused, as servers drop idle clients. Transient failures (is_transient)
+    are retried up to `retries` times with a growing delay, on a new
+    connection unless the server merely answered 4xx; other failures leave
+    the connection open and are reported for that message only. After a fork the
+    pool starts empty, since the inherited sockets belong to the parent.
+
+    With a limiter (rate_limit.RateLimiter) every attempt first takes one
+    token per recipient, and 4xx replies lower the limiter's rate.
+    """
+
+    def __init__(self, mail, size=2, max_idle=60, retries=3, retry_delay=1.0, limiter=None):
+        self.mail = mail
+        self.limiter = limiter
+        self.size = size
+        self.max_idle = max_idle
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.connections_opened = 0
+        self._reset_state()
+
+    def _reset_state(self):
+        self._idle = []  # (connection, time it was last used)
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _open(self):
+        connection = Connection(self.mail).__enter__()
+        self.connections_opened += 1
+        return connection
+
+    @staticmethod
+    def _close(connection):
+        if connection is None or connection.host is None:
+            return
+        try:
+            connection.host.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.host.close()
+
+    def _acquire(self):
+        if self._pid != os.getpid():
+            self._reset_state()
+        self._slots.acquire()
+        stale = []
+        connection = None
+        with self._lock:
+            while self._idle and connection is None:
+                candidate, last_used = self._idle.pop()
+                if time.monotonic() - last_used > self.max_idle:
+                    stale.append(candidate)
+                else:
+                    connection = candidate
+        for candidate in stale:
+            self._close(candidate)
+        # None: a connection is opened on the first send
+        return connection
+
+    def _release(self, connection):
+        if connection is not None:
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+        self._slots.release()
+
+    def _deliver(self, connection, message):
+        # Returns the connection to keep using (None if it was dropped) and the error, if any
+        for attempt in range(self.retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire(len(message.send_to))
+            try:
+                if connection is None:
+                    connection = self._open()
+                connection.send(message)
+                return connection, None
+            except Exception as e:
+                if self.limiter is not None and is_throttle(e):
+                    self.limiter.throttled()
+                if not is_transient(e):
+                    return connection, e
+                if not is_throttle(e) or getattr(e, 'smtp_code', None) == 421:
+                    # The session is gone or closing; other 4xx replies leave it usable
+                    self._close(connection)
+                    connection = None
+                if attempt == self.retries:
+                    return None, e
+                print(f"Transient mail error, retry {attempt + 1}/{self.retries}: {str(e)}")
+                time.sleep(self.retry_delay * (attempt + 1))
+
+    def send_many(self, messages):
+        """Send Flask-Mail Messages in turn over one pooled connection; returns each message's error or None"""
+        errors = []
+        connection = self._acquire()
+        try:
+            for message in messages:
+                connection, error = self._deliver(connection, message)
+                errors.append(error)
+        finally:
+            self._release(connection)
+        return errors
+
+    def send(self, message):
+        """Send one Flask-Mail Message, raising its error like mail.send()"""
+        error = self.send_many([message])[0]
+        if error is not None:
+            raise error
+
+    def close(self):
+        """Close the idle connections (connections on loan are returned open)"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close(connection)
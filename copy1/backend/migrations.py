@@ -0,0 +1,148 @@
+import re
+from datetime import datetime
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateTable
+
+
+class MigrationRunner:
+    """
+    Minimal versioned schema migrations for the SQLite database.
+
+    Migrations are plain functions registered with @runner.migration(version,
+    name) and applied in version order. Each applied version is recorded in
+    the schema_migrations table, so upgrade() only runs what is pending.
+    A migration may commit on its own; its version is recorded afterwards,
+    so every migration must be safe to re-run if it fails half way.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._migrations = {}
+
+    def migration(self, version, name):
+        def decorator(func):
+            if version in self._migrations:
+                raise ValueError(f"Duplicate migration version {version}")
+            self._migrations[version] = (name, func)
+            return func
+        return decorator
+
+    @property
+    def latest_version(self):
+        return max(self._migrations, default=0)
+
+    def _ensure_table(self):
+        self.db.session.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, "
+            "name VARCHAR(100) NOT NULL, "
+            "applied_at DATETIME NOT NULL)"
+        ))
+        self.db.session.commit()
+
+    def applied_versions(self):
+        self._ensure_table()
+        return {row[0] for row in self.db.session.execute(text("SELECT version FROM schema_migrations"))}
+
+    def current_version(self):
+        return max(self.applied_versions(), default=0)
+
+    def pending(self):
+        applied = self.applied_versions()
+        return [(version, self._migrations[version][0]) for version in sorted(self._migrations) if version not in applied]
+
+    def upgrade(self):
+        """Apply every pending migration; returns the list of versions applied"""
+        applied = []
+        for version, name in self.pending():
+            print(f"Applying migration {version}: {name}")
+            try:
+                self._migrations[version][1]()
+                self.db.session.execute(
+                    text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                    {'version': version, 'name': name, 'applied_at': datetime.utcnow()}
+                )
+                self.db.session.commit()
+            except Exception:
+                self.db.session.rollback()
+                print(f"Migration {version} ({name}) failed")
+                raise
+            applied.append(version)
+        return applied
+
+
+def has_foreign_key(session, table, column, referred_table):
+    for row in session.execute(text(f"PRAGMA foreign_key_list({table})")).mappings():
+        if row['from'] == column and row['table'] == referred_table:
+            return True
+    return False
+
+
+def rebuild_table(session, table):
+    """
+    Recreate `table` from its SQLAlchemy definition, keeping its rows.
+
+    SQLite cannot add a constraint to an existing table, so this follows the
+    documented rebuild procedure: create the new table under a temporary name,
+    copy the rows, drop the old table, rename and recreate the indexes. Views
+    over the table must be dropped by the caller first and recreated after.
+    """
+    temp_name = f"{table.name}_rebuild"
+    connection = session.connection()
+    columns = ', '.join(f'"{column.name}"' for column in table.columns)
+
+    # Same DDL as the model, only under the temporary name
+    create_sql = str(CreateTable(table).compile(dialect=connection.dialect))
+    create_sql = re.sub(rf'^\s*CREATE TABLE "?{table.name}"?', f'CREATE TABLE "{temp_name}"', create_sql, count=1)
+
+    session.execute(text(f'DROP TABLE IF EXISTS "{temp_name}"'))
+    session.execute(text(create_sql))
+    session.execute(text(f'INSERT INTO "{temp_name}" ({columns}) SELECT {columns} FROM "{table.name}"'))
+    session.execute(text(f'DROP TABLE "{table.name}"'))
+    session.execute(text(f'ALTER TABLE "{temp_name}" RENAME TO "{table.name}"'))
+    for index in table.indexes:
+        index.create(bind=connection, checkfirst=True)
+
+
+class StatementRecorder:
+    """Collects the SELECT statements run on any engine while active (used by the query plan check)"""
+
+    def __init__(self):
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        event.listen(Engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(Engine, 'before_cursor_execute', self._record)
+
+
+def explain_query_plan(session, statement, parameters=()):
+    """The detail column of EXPLAIN QUERY PLAN for a raw DBAPI statement"""
+    cursor = session.connection().connection.cursor()
+    try:
+        return [row[3] for row in cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+    finally:
+        cursor.close()
+
+
+def full_table_scans(plan, tables):
+    """
+    Plan steps that read every row of one of `tables` without an index.
+
+    Index scans ("SCAN t USING INDEX ...", "USING COVERING INDEX ...") are not
+    reported, nor are scans of other (small) tables.
+    """
+    scans = []
+    for detail in plan:
+        match = re.match(r'SCAN (?:TABLE )?(\w+)(.*)', detail)
+        if match and match.group(1) in tables and 'USING' not in match.group(2):
+            scans.append(detail)
+    return scans
@@ -0,0 +1,53 @@
+import threading
+
+
+class OutboxDrainer:
+    """
+    Background thread that drains an outbox when there is no Celery worker.
+
+    drain() is called when the thread is woken (wake(), after new rows were
+    committed) and every `interval` seconds otherwise, so rows waiting for a
+    retry are picked up too. drain() must be safe to run in several processes
+    at once; the outbox rows themselves are claimed in the database.
+    """
+
+    def __init__(self, drain, interval=30, name='notification-outbox'):
+        self.drain = drain
+        self.interval = interval
+        self.name = name
+        self._wake = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = False
+
+    def wake(self):
+        """Drain as soon as possible (starting the thread on first use)"""
+        if self._stopping:
+            return
+        self._ensure_started()
+        self._wake.set()
+
+    def stop(self, timeout=5):
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopping:
+                return
+            try:
+                self.drain()
+            except Exception as e:
+                print(f"[{self.name}] Error draining the outbox: {str(e)}")
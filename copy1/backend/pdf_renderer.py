@@ -0,0 +1,232 @@
+import logging
+import multiprocessing
+import sys
+import threading
+import types
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing import context as mp_context
+
+logger = logging.getLogger(__name__)
+
+# Print rules for the report PDFs, on top of the report's own inline styles.
+# Compiled once per process together with the font configuration.
+PDF_STYLESHEET = """
+    @page { size: A4; margin: 15mm; }
+    .plot-container, tr { page-break-inside: avoid; }
+"""
+
+_font_config = None
+_stylesheets = None
+
+
+def _load_weasyprint():
+    global _font_config, _stylesheets
+    if _stylesheets is None:
+        from weasyprint import CSS
+        try:
+            from weasyprint.text.fonts import FontConfiguration
+        except ImportError:
+            # WeasyPrint < 53
+            from weasyprint.fonts import FontConfiguration
+        _font_config = FontConfiguration()
+        _stylesheets = [CSS(string=PDF_STYLESHEET, font_config=_font_config)]
+
+
+def html_to_pdf(html):
+    """Render an HTML document to PDF bytes in the current process (no temporary files)"""
+    from weasyprint import HTML
+    _load_weasyprint()
+    return HTML(string=html).write_pdf(stylesheets=_stylesheets, font_config=_font_config)
+
+
+_charts = None
+
+
+def render_report(fullname, title, report):
+    """Draw the charts, fill in the report template and render the PDF, all in the calling process; returns (html, pdf bytes)"""
+    global _charts
+    from report_charts import ReportCharts
+    from report_html import build_report_html
+    if _charts is None:
+        _charts = ReportCharts(max_entries=64)
+    html = build_report_html(fullname, title, report, _charts)
+    return html, html_to_pdf(html)
+
+
+def _init_worker():
+    # A first small document loads Pango and the system fonts, so the
+    # first real report does not pay for it
+    html_to_pdf('<p>Quiz Master</p>')
+
+
+_main_lock = threading.Lock()
+
+
+@contextmanager
+def _without_main_module():
+    # Forkserver and spawn children re-import the parent's __main__ (all of
+    # app.py under `python app.py`) unless it has no file to import. The
+    # renderer processes only need this module, so they are started while
+    # __main__ is an empty stand-in.
+    with _main_lock:
+        main = sys.modules['__main__']
+        sys.modules['__main__'] = types.ModuleType('__main__')
+        try:
+            yield
+        finally:
+            sys.modules['__main__'] = main
+
+
+class _MainlessStart:
+    def start(self):
+        with _without_main_module():
+            super().start()
+
+
+class _SpawnRendererProcess(_MainlessStart, mp_context.SpawnProcess):
+    pass
+
+
+class _SpawnRendererContext(mp_context.SpawnContext):
+    Process = _SpawnRendererProcess
+
+
+_renderer_contexts = {'spawn': _SpawnRendererContext}
+
+if hasattr(mp_context, 'ForkServerContext'):
+    class _ForkServerRendererProcess(_MainlessStart, mp_context.ForkServerProcess):
+        pass
+
+    class _ForkServerRendererContext(mp_context.ForkServerContext):
+        Process = _ForkServerRendererProcess
+
+    _renderer_contexts['forkserver'] = _ForkServerRendererContext
+
+
+def renderer_context(start_method):
+    """A multiprocessing context ('forkserver' or 'spawn') whose processes skip importing __main__"""
+    context = _renderer_contexts[start_method]()
+    if start_method == 'forkserver':
+        # The (shared) fork server preloads this module rather than nothing
+        context.set_forkserver_preload([__name__])
+    return context
+
+
+class RendererBusy(Exception):
+    """Raised when max_pending PDFs are already waiting for a renderer process"""
+
+
+class PdfRenderer:
+    """
+    Renders PDFs in a bounded pool of worker processes.
+
+    WeasyPrint is pure CPU work and holds the GIL, so rendering in a request
+    thread stalls every other request of that worker. The pool is started on
+    first use; each process loads WeasyPrint, the font configuration and
+    PDF_STYLESHEET once. At most max_pending documents may be queued or
+    rendering; further submissions raise RendererBusy. With processes=0, or
+    when the pool cannot be started (e.g. inside a daemonic process),
+    documents are rendered inline.
+
+    The pool is started lazily, from a process that by then runs writer and
+    drainer threads, so its processes are not forked from it: the default
+    'forkserver' forks them from a single-threaded server process ('spawn'
+    where forkserver is not available). The rendering functions import
+    nothing from app.py, so the processes are started without re-importing
+    the parent's __main__ (renderer_context).
+    """
+
+    def __init__(self, processes=2, max_pending=16, start_method='forkserver'):
+        self.processes = processes
+        self.max_pending = max_pending
+        self.start_method = start_method
+        self._executor = None
+        self._inline = processes <= 0
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        if self._executor is None and not self._inline:
+            with self._lock:
+                if self._executor is None and not self._inline:
+                    if multiprocessing.current_process().daemon:
+                        # e.g. a Celery prefork worker: daemonic processes may not have children
+                        logger.warning("PDF renderer running in a daemonic process, rendering inline")
+                        self._inline = True
+                        return None
+                    try:
+                        methods = multiprocessing.get_all_start_methods()
+                        context = renderer_context(self.start_method if self.start_method in methods else 'spawn')
+                        self._executor = ProcessPoolExecutor(
+                            max_workers=self.processes,
+                            mp_context=context,
+                            initializer=_init_worker
+                        )
+                    except Exception as e:
+                        logger.warning("PDF renderer pool unavailable, rendering inline: %s", e)
+                        self._inline = True
+        return self._executor
+
+    @staticmethod
+    def _run_inline(func, args):
+        # Run now and hand back a finished future
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _fall_back_inline(self, error):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._inline = True
+        logger.warning("PDF renderer processes could not be started, rendering inline: %s", error)
+        if executor is not None:
+            try:
+                executor.shutdown(wait=False)
+            except Exception:
+                pass
+
+    def submit(self, func, *args):
+        """Queue func(*args) (html_to_pdf or render_report); returns a Future with its result"""
+        executor = self._pool()
+        if executor is None:
+            return self._run_inline(func, args)
+        if not self._slots.acquire(blocking=False):
+            raise RendererBusy(f"{self.max_pending} PDFs are already being rendered")
+        try:
+            future = executor.submit(func, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            raise
+        except Exception as e:
+            # The worker processes are only started here, on submit
+            self._slots.release()
+            self._fall_back_inline(e)
+            return self._run_inline(func, args)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def render(self, html, timeout=None):
+        """Render a document to PDF bytes, in the pool when it is running"""
+        try:
+            return self.submit(html_to_pdf, html).result(timeout=timeout)
+        except BrokenProcessPool:
+            # A renderer process died (e.g. killed for memory); start a fresh pool next time
+            self.reset()
+            raise
+
+    def reset(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def stop(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
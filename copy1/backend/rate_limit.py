@@ -0,0 +1,181 @@
+import threading
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class MemoryTokenBucket:
+    """Token bucket for the threads of one process"""
+
+    name = 'memory'
+
+    def __init__(self, max_rate, capacity):
+        self.max_rate = max_rate
+        self.capacity = capacity
+        self._rate = max_rate
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def take(self, tokens, increase):
+        """Take tokens and raise the rate by increase per token; returns 0, or the seconds to wait first"""
+        with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                return (tokens - self._tokens) / self._rate
+            self._tokens -= tokens
+            self._rate = min(self.max_rate, self._rate + increase * tokens)
+            return 0
+
+    def slow_down(self, factor, min_rate):
+        """Scale the rate by factor (not below min_rate) and drop the saved-up burst; returns the new rate"""
+        with self._lock:
+            self._refill()
+            self._rate = max(min_rate, self._rate * factor)
+            self._tokens = 0
+            return self._rate
+
+
+# Refill from the time of the last call, then take ARGV[3] tokens if there
+# are enough. KEYS = bucket hash; ARGV = max rate, capacity, tokens, rate
+# increase per token, expiry (ms). Returns the seconds to wait (0 = taken).
+TAKE_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'rate', 'tokens', 'updated')
+local max_rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local wanted = tonumber(ARGV[3])
+local rate = tonumber(state[1]) or max_rate
+local tokens = tonumber(state[2]) or capacity
+tokens = math.min(capacity, tokens + (now - (tonumber(state[3]) or now)) * rate)
+local wait = 0
+if tokens >= wanted then
+    tokens = tokens - wanted
+    rate = math.min(max_rate, rate + tonumber(ARGV[4]) * wanted)
+else
+    wait = (wanted - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'rate', rate, 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], ARGV[5])
+return tostring(wait)
+"""
+
+# KEYS = bucket hash; ARGV = max rate, factor, min rate. Returns the new rate.
+SLOW_DOWN_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate')) or tonumber(ARGV[1])
+rate = math.max(tonumber(ARGV[3]), rate * tonumber(ARGV[2]))
+redis.call('HSET', KEYS[1], 'rate', rate, 'tokens', 0, 'updated', now)
+return tostring(rate)
+"""
+
+
+class RedisTokenBucket:
+    """Token bucket in a Redis hash, shared by every worker process; Redis' clock is the only clock"""
+
+    name = 'redis'
+
+    def __init__(self, client, key, max_rate, capacity):
+        self.client = client
+        self.key = key
+        self.max_rate = max_rate
+        self.capacity = capacity
+        self._take = client.register_script(TAKE_SCRIPT)
+        self._slow_down = client.register_script(SLOW_DOWN_SCRIPT)
+
+    @property
+    def rate(self):
+        return float(self.client.hget(self.key, 'rate') or self.max_rate)
+
+    def take(self, tokens, increase):
+        # The bucket is forgotten once it would be full again anyway
+        expiry_ms = int(self.capacity / self.max_rate * 1000) + 60000
+        return float(self._take(keys=[self.key], args=[
+            repr(float(self.max_rate)), repr(float(self.capacity)), repr(float(tokens)), repr(float(increase)), expiry_ms
+        ]))
+
+    def slow_down(self, factor, min_rate):
+        return float(self._slow_down(keys=[self.key], args=[
+            repr(float(self.max_rate)), repr(float(factor)), repr(float(min_rate))
+        ]))
+
+
+class RateLimiter:
+    """
+    Adaptive token-bucket limit for outbound mail (tokens = recipients).
+
+    Sends are allowed at up to max_rate tokens per second with bursts of up to
+    `burst`. When the server pushes back (a 4xx reply) throttled() multiplies
+    the rate by `backoff`, down to min_rate, and every token taken afterwards
+    adds `recovery` * max_rate back, so the rate settles just under what the
+    provider accepts. The bucket lives in memory or, to share one limit
+    between all workers, in Redis.
+    """
+
+    def __init__(self, max_rate, burst, min_rate, backoff=0.7, recovery=0.01):
+        self.max_rate = max_rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.backoff = backoff
+        self.recovery = recovery
+        self.bucket = MemoryTokenBucket(max_rate, burst)
+
+    @property
+    def backend(self):
+        return self.bucket.name
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def configure(self, backend='auto', redis_url=None, key='mail:rate'):
+        """Pick the bucket; 'auto' uses Redis when it answers a PING, memory otherwise"""
+        if backend not in ('auto', 'redis', 'memory'):
+            raise ValueError(f"Unknown rate limit backend {backend!r}")
+        self.bucket = MemoryTokenBucket(self.max_rate, self.burst)
+        if backend == 'memory':
+            return self.backend
+
+        try:
+            if redis is None:
+                raise RuntimeError('redis is not installed')
+            client = redis.Redis.from_url(redis_url, socket_connect_timeout=1, socket_timeout=2)
+            client.ping()
+            self.bucket = RedisTokenBucket(client, key, self.max_rate, self.burst)
+        except Exception as e:
+            if backend == 'redis':
+                raise
+            print(f"Mail rate limit kept in memory, Redis is not available: {e}")
+        return self.backend
+
+    def acquire(self, tokens=1):
+        """Block until tokens may be spent"""
+        # A message to more recipients than the burst waits for a full bucket
+        tokens = min(tokens, self.burst)
+        while True:
+            wait = self.bucket.take(tokens, self.recovery * self.max_rate)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def throttled(self):
+        """The server asked us to slow down"""
+        rate = self.bucket.slow_down(self.backoff, self.min_rate)
+        print(f"Mail server is throttling, sending at {rate:.2f} recipients/s")
+        return rate
@@ -0,0 +1,103 @@
+import base64
+import hashlib
+import threading
+from io import BytesIO
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.dates import AutoDateLocator, ConciseDateFormatter
+from matplotlib.figure import Figure
+
+from caching import LRUCache
+
+# Shared look of the report charts (the old pyplot defaults, made explicit)
+CHART_SIZE = (10, 6)
+CHART_DPI = 100
+
+
+class ReportCharts:
+    """
+    Renders the performance report charts as base64 PNGs without pyplot.
+
+    Each chart kind has one Figure on its own Agg canvas, created on first use
+    and cleared and redrawn for every chart, so the figure, axes and font
+    setup are paid once per process. Matplotlib's text and font caches are
+    not thread-safe, so drawing is serialized by a lock; finished images are
+    cached by a hash of the plotted data and served without taking it.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024):
+        self.cache = LRUCache(max_entries=max_entries, max_bytes=max_bytes)
+        self._figures = {}
+        self._lock = threading.Lock()
+        self.rendered = 0
+
+    @staticmethod
+    def data_key(kind, labels, values):
+        digest = hashlib.sha256(kind.encode())
+        for label in labels:
+            digest.update(str(label).encode())
+            digest.update(b'\0')
+        digest.update(np.ascontiguousarray(values, dtype=float).tobytes())
+        return digest.hexdigest()
+
+    def _figure(self, kind):
+        if kind not in self._figures:
+            figure = Figure(figsize=CHART_SIZE, dpi=CHART_DPI)
+            FigureCanvasAgg(figure)
+            figure.add_subplot()
+            self._figures[kind] = figure
+        figure = self._figures[kind]
+        figure.axes[0].clear()
+        return figure, figure.axes[0]
+
+    def _render(self, key, kind, draw):
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            # Another thread may have drawn the same data while we waited
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            figure, axes = self._figure(kind)
+            draw(axes)
+            figure.tight_layout()
+            buf = BytesIO()
+            figure.savefig(buf, format='png')
+            self.rendered += 1
+        image = base64.b64encode(buf.getvalue()).decode('utf-8')
+        self.cache.put(key, image)
+        return image
+
+    def subject_averages(self, subjects, averages):
+        """Bar chart of the average score per subject"""
+        subjects = [str(subject) for subject in subjects]
+        averages = np.asarray(averages, dtype=float)
+
+        def draw(axes):
+            axes.bar(subjects, averages, color='skyblue')
+            axes.set_title('Average Score by Subject')
+            axes.set_ylabel('Score (%)')
+            axes.set_xlabel('Subject')
+            axes.tick_params(axis='x', labelrotation=90)
+
+        return self._render(self.data_key('subject_averages', subjects, averages), 'subject_averages', draw)
+
+    def score_trend(self, attempted_at, scores):
+        """Line chart of scores over attempt time (attempted_at as datetime64 values)"""
+        attempted_at = np.asarray(attempted_at, dtype='datetime64[s]')
+        scores = np.asarray(scores, dtype=float)
+
+        def draw(axes):
+            axes.plot(attempted_at, scores, marker='o', linestyle='-', color='green')
+            locator = AutoDateLocator()
+            axes.xaxis.set_major_locator(locator)
+            axes.xaxis.set_major_formatter(ConciseDateFormatter(locator))
+            axes.set_title('Score Trend Over Time')
+            axes.set_ylabel('Score (%)')
+            axes.set_xlabel('Date')
+            axes.grid(True, linestyle='--', alpha=0.7)
+
+        key = self.data_key('score_trend', [], np.concatenate([attempted_at.astype('int64').astype(float), scores]))
+        return self._render(key, 'score_trend', draw)
@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import DateTime, bindparam, text
+
+# One row per attempt with the quiz, chapter and subject resolved, by user then attempt
+REPORT_SQL = """
+    SELECT p.RegistrationUser_id AS user_id,
+           p.id AS performance_id,
+           p.Quizzes_id AS quiz_id,
+           p.score,
+           p.attempted_at,
+           q.quiz_name,
+           c.chapter_name,
+           s.name AS subject_name
+    FROM performance p
+    JOIN quizzes q ON q.id = p.Quizzes_id
+    LEFT JOIN chapters c ON c.id = q.chapter_id
+    LEFT JOIN subject s ON s.id = c.subject_id
+    WHERE {where}
+    ORDER BY p.RegistrationUser_id, p.id
+"""
+
+REPORT_COLUMNS = ['user_id', 'performance_id', 'quiz_id', 'score', 'attempted_at', 'quiz_name', 'chapter_name', 'subject_name']
+
+
+def _read_attempts(session, conditions, params):
+    # Typed so the bounds are formatted like the stored attempted_at values
+    statement = text(REPORT_SQL.format(where=' AND '.join(conditions) or '1 = 1')).bindparams(
+        *(bindparam(name, type_=DateTime) for name in ('start', 'end') if name in params)
+    )
+    result = session.execute(statement, params)
+    frame = pd.DataFrame.from_records(result.fetchall(), columns=REPORT_COLUMNS)
+
+    # SQLite hands DATETIME back as text, with or without microseconds;
+    # cutting to whole seconds gives one fixed format to parse
+    stamps = frame['attempted_at'].astype(str).str.slice(0, 19)
+    frame['attempted_at'] = pd.to_datetime(stamps, format='%Y-%m-%d %H:%M:%S')
+    frame['date'] = stamps.str.slice(0, 10)
+    frame['score'] = frame['score'].astype(float)
+    frame['percentile'] = 0.0
+    return frame
+
+
+def _period_conditions(start, end, params):
+    conditions = []
+    if start is not None:
+        conditions.append('p.attempted_at >= :start')
+        params['start'] = start
+    if end is not None:
+        conditions.append('p.attempted_at < :end')
+        params['end'] = end
+    return conditions
+
+
+def load_report_frame(session, user_id, start=None, end=None, percentile_lookup=None):
+    """
+    A user's attempts as a DataFrame, read with a single query.
+
+    start/end bound attempted_at (end is exclusive). Adds the derived columns
+    the report needs: `attempted_at` as datetime64, `date` (YYYY-MM-DD) and
+    `percentile`, filled by percentile_lookup([(quiz_id, score), ...]) when
+    given (missing percentiles become 0).
+    """
+    params = {'user_id': user_id}
+    conditions = ['p.RegistrationUser_id = :user_id'] + _period_conditions(start, end, params)
+    frame = _read_attempts(session, conditions, params)
+
+    if percentile_lookup is not None and len(frame):
+        values = percentile_lookup(zip(frame['quiz_id'].tolist(), frame['score'].tolist()))
+        frame['percentile'] = np.nan_to_num(np.array(values, dtype=float))
+    return frame
+
+
+def load_period_frame(session, start, end, first_user_id=None, last_user_id=None):
+    """Every user's attempts with start <= attempted_at < end, optionally for a user id range, in one query"""
+    params = {}
+    conditions = _period_conditions(start, end, params)
+    if first_user_id is not None:
+        conditions.append('p.RegistrationUser_id >= :first_user_id')
+        params['first_user_id'] = first_user_id
+    if last_user_id is not None:
+        conditions.append('p.RegistrationUser_id <= :last_user_id')
+        params['last_user_id'] = last_user_id
+    return _read_attempts(session, conditions, params)
+
+
+def add_percentiles(frame, distributions):
+    """
+    Fill frame['percentile'] from per-quiz score distributions.
+
+    distributions maps quiz_id -> all scores of that quiz in ascending order.
+    Each quiz's rows are looked up with one np.searchsorted call, giving the
+    share of attempts that scored strictly lower, as the live index does.
+    """
+    scores = frame['score'].to_numpy()
+    percentiles = np.zeros(len(frame))
+    for quiz_id, positions in frame.groupby('quiz_id').indices.items():
+        distribution = np.asarray(distributions.get(quiz_id, ()), dtype=float)
+        if len(distribution):
+            lower = np.searchsorted(distribution, scores[positions], side='left')
+            percentiles[positions] = lower / len(distribution) * 100
+    frame['percentile'] = np.round(percentiles, 1)
+    return frame
+
+
+def _text(column):
+    # Attempts whose chapter or subject is gone read 'Unknown'
+    return np.asarray(column.fillna('Unknown').to_numpy(), dtype=str)
+
+
+def report_row_strings(frame):
+    """One <tr> per attempt of the detailed results table, built column-wise with numpy string ops"""
+    cells = [
+        _text(frame['date']),
+        _text(frame['subject_name']),
+        _text(frame['chapter_name']),
+        _text(frame['quiz_name']),
+        np.char.mod('%.1f%%', frame['score'].to_numpy()),
+        np.char.mod('%.1f%%', frame['percentile'].to_numpy()),
+    ]
+    rows = np.char.add('<tr><td>', cells[0])
+    for column in cells[1:]:
+        rows = np.char.add(np.char.add(rows, '</td><td>'), column)
+    return np.char.add(rows, '</td></tr>')
+
+
+def render_report_rows(frame):
+    """The <tr> rows of the detailed results table"""
+    if frame.empty:
+        return ''
+    return ''.join(report_row_strings(frame).tolist())
+
+
+def user_reports(frame):
+    """
+    Yield (user_id, report) for every user in a frame ordered by user id.
+
+    The figures are computed for the whole frame at once and each user only
+    takes array slices. A report holds the summary figures, the subject
+    averages (best first), the score trend in time order and the rendered
+    table rows; it is picklable so it can be sent to the PDF renderer.
+    """
+    if frame.empty:
+        return
+    user_ids = frame['user_id'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, user_ids[1:] != user_ids[:-1]])
+    ends = np.r_[starts[1:], len(user_ids)]
+    counts = ends - starts
+
+    scores = frame['score'].to_numpy()
+    percentiles = frame['percentile'].to_numpy()
+    average_scores = np.add.reduceat(scores, starts) / counts
+    highest_scores = np.maximum.reduceat(scores, starts)
+    average_percentiles = np.add.reduceat(percentiles, starts) / counts
+    rows = report_row_strings(frame)
+
+    # Attempts of deleted chapters/subjects have no subject and are left out
+    subject_average = frame[frame['subject_name'].notna()].groupby(['user_id', 'subject_name'])['score'].mean().reset_index()
+    subject_average = subject_average.sort_values(['user_id', 'score'], ascending=[True, False], kind='mergesort')
+    subject_users = subject_average['user_id'].to_numpy()
+    subject_names = subject_average['subject_name'].to_numpy()
+    subject_scores = subject_average['score'].to_numpy()
+
+    # Same user blocks as the frame, each in attempt time order
+    times = frame['attempted_at'].to_numpy().astype('datetime64[s]')
+    trend_order = np.lexsort((times.astype('int64'), user_ids))
+    trend_times = times[trend_order]
+    trend_scores = scores[trend_order]
+
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        user_id = int(user_ids[start])
+        low, high = np.searchsorted(subject_users, [user_id, user_id + 1])
+        yield user_id, {
+            'average_score': float(average_scores[i]),
+            'highest_score': float(highest_scores[i]),
+            'total_quizzes': int(counts[i]),
+            'average_percentile': float(average_percentiles[i]),
+            'subject_names': subject_names[low:high].tolist(),
+            'subject_averages': subject_scores[low:high],
+            'trend_times': trend_times[start:end],
+            'trend_scores': trend_scores[start:end],
+            'rows_html': ''.join(rows[start:end].tolist()),
+        }
+
+
+def summarize_report_frame(frame):
+    """The report of a single user's non-empty frame (see user_reports)"""
+    return next(user_reports(frame))[1]
@@ -0,0 +1,110 @@
+from datetime import datetime
+
+
+def draw_report_charts(charts, report):
+    """(subject chart, trend chart) of a report as base64 PNGs, None where there is too little data"""
+    subject_chart = None
+    if len(report['subject_names']):
+        subject_chart = charts.subject_averages(report['subject_names'], report['subject_averages'])
+    trend_chart = None
+    if len(report['trend_scores']) > 1:
+        trend_chart = charts.score_trend(report['trend_times'], report['trend_scores'])
+    return subject_chart, trend_chart
+
+
+def build_report_html(fullname, title, report, charts):
+    """The complete performance report document for one user's report data"""
+    subject_chart, trend_chart = draw_report_charts(charts, report)
+    return render_report_html(fullname, title, report, subject_chart, trend_chart)
+
+
+def render_report_html(fullname, title, report, subject_chart=None, trend_chart=None):
+    """Fill in the report template; the charts are base64 encoded PNGs"""
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <title>{title} for {fullname}</title>
+        <style>
+            body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; color: #333; }}
+            .header {{ background-color: #4a6bdf; color: white; padding: 20px; text-align: center; margin-bottom: 30px; }}
+            .section {{ margin-bottom: 30px; }}
+            h1, h2, h3 {{ color: #4a6bdf; }}
+            table {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}
+            th, td {{ padding: 12px 15px; border-bottom: 1px solid #ddd; text-align: left; }}
+            th {{ background-color: #f8f9fa; }}
+            tr:hover {{ background-color: #f1f1f1; }}
+            .summary-cards {{ display: flex; justify-content: space-between; flex-wrap: wrap; margin: 20px 0; }}
+            .card {{ background-color: #f8f9fa; border-radius: 8px; padding: 15px; width: 22%; min-width: 200px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); margin-bottom: 15px; }}
+            .card h3 {{ margin-top: 0; font-size: 16px; }}
+            .card p {{ font-size: 24px; font-weight: bold; color: #4a6bdf; margin: 5px 0; }}
+            .plot-container {{ text-align: center; margin: 30px 0; }}
+            img {{ max-width: 100%; height: auto; }}
+            footer {{ text-align: center; margin-top: 50px; font-size: 12px; color: #666; }}
+        </style>
+    </head>
+    <body>
+        <div class="header">
+            <h1>{title}</h1>
+            <p>Generated for {fullname} on {datetime.now().strftime('%Y-%m-%d')}</p>
+        </div>
+        
+        <div class="section">
+            <h2>Performance Summary</h2>
+            <div class="summary-cards">
+                <div class="card">
+                    <h3>Average Score</h3>
+                    <p>{report['average_score']:.1f}%</p>
+                </div>
+                <div class="card">
+                    <h3>Highest Score</h3>
+                    <p>{report['highest_score']:.1f}%</p>
+                </div>
+                <div class="card">
+                    <h3>Total Quizzes</h3>
+                    <p>{report['total_quizzes']}</p>
+                </div>
+                <div class="card">
+                    <h3>Average Percentile</h3>
+                    <p>{report['average_percentile']:.1f}%</p>
+                </div>
+            </div>
+        </div>
+        
+        <div class="section">
+            <h2>Performance by Subject</h2>
+            {f'<div class="plot-container"><img src="data:image/png;base64,{subject_chart}" alt="Subject Performance" /></div>' if subject_chart else '<p>Not enough data to generate subject performance chart.</p>'}
+        </div>
+        
+        <div class="section">
+            <h2>Performance Trend</h2>
+            {f'<div class="plot-container"><img src="data:image/png;base64,{trend_chart}" alt="Score Trend" /></div>' if trend_chart else '<p>Not enough data to generate performance trend chart.</p>'}
+        </div>
+        
+        <div class="section">
+            <h2>Detailed Quiz Results</h2>
+            <table>
+                <thead>
+                    <tr>
+                        <th>Date</th>
+                        <th>Subject</th>
+                        <th>Chapter</th>
+                        <th>Quiz</th>
+                        <th>Score</th>
+                        <th>Percentile</th>
+                    </tr>
+                </thead>
+                <tbody>
+                    {report['rows_html']}
+                </tbody>
+            </table>
+        </div>
+        
+        <footer>
+            <p>This report was automatically generated by Quiz Master.</p>
+            <p>&copy; {datetime.now().year} Quiz Master. All rights reserved.</p>
+        </footer>
+    </body>
+    </html>
+    """
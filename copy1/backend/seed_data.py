@@ -1,11 +1,18 @@
-from app import db, Role, RegistrationUser, Subject, Chapters, Quizzes, Questions, Scores, Performance
+from app import app, db, Role, RegistrationUser, Subject, Chapters, Quizzes, Questions, migrations, write_submission_batch
+from sqlalchemy import text
 from werkzeug.security import generate_password_hash
 from datetime import datetime
 
 def seed_data():
-    # Drop all tables and recreate them
+    # Drop all tables and rebuild the schema through the migrations
+    # (scores is a view over performance; scores_legacy and search_index are not models)
+    db.session.execute(text("DROP VIEW IF EXISTS scores"))
+    db.session.execute(text("DROP TABLE IF EXISTS scores_legacy"))
+    db.session.execute(text("DROP TABLE IF EXISTS search_index"))
+    db.session.execute(text("DROP TABLE IF EXISTS schema_migrations"))
+    db.session.commit()
     db.drop_all()
-    db.create_all()
+    migrations.upgrade()
 
     # Seed Roles
     admin_role = Role(name="admin", description="Administrator role")
@@ -75,6 +82,7 @@ def seed_data():
         option2="4",
         option3="5",
         option4="6",
+        correct_option="4",
         marks=5
     )
     physics_question = Questions(
@@ -84,42 +92,22 @@ def seed_data():
         option2="150,000 km/s",
         option3="450,000 km/s",
         option4="600,000 km/s",
+        correct_option="300,000 km/s",
         marks=10
     )
     db.session.add_all([algebra_question, physics_question])
     db.session.commit()  # Commit questions
 
-    # Seed Scores
-    algebra_score = Scores(
-        quiz_id=algebra_quiz.id,
-        user_id=regular_user.id,
-        total_scored=5
-    )
-    physics_score = Scores(
-        quiz_id=physics_quiz.id,
-        user_id=regular_user.id,
-        total_scored=10
-    )
-    db.session.add_all([algebra_score, physics_score])
-    db.session.commit()  # Commit scores
-
-    # Seed Performance
-    algebra_performance = Performance(
-        user_id=regular_user.id,
-        quiz_id=algebra_quiz.id,
-        score=5.0,
-        attempted_at=datetime.utcnow()
-    )
-    physics_performance = Performance(
-        user_id=regular_user.id,
-        quiz_id=physics_quiz.id,
-        score=10.0,
-        attempted_at=datetime.utcnow()
-    )
-    db.session.add_all([algebra_performance, physics_performance])
-    db.session.commit()  # Commit performance
+    # Seed attempts the way submit_quiz records them, so the quiz_stats,
+    # activity and user_stats rollups include them (the scores view is
+    # derived from performance)
+    write_submission_batch([
+        {'user_id': regular_user.id, 'quiz_id': algebra_quiz.id, 'score': 5.0, 'attempted_at': datetime.utcnow()},
+        {'user_id': regular_user.id, 'quiz_id': physics_quiz.id, 'score': 10.0, 'attempted_at': datetime.utcnow()}
+    ])
 
     print("Database seeded successfully!")
 
 if __name__ == "__main__":
-    seed_data()
+    with app.app_context():
+        seed_data()